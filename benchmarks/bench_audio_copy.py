@@ -0,0 +1,110 @@
+"""
+Benchmark of the memory that is copied when audio is passed through the
+AudioDispatcherModule and played back.
+
+One second of speech is dispatched into chunks of 10 ms and consumed by several
+subscribers the way a SpeakerModule does. The memory allocated by the zero-copy
+audio path is compared to the previous path that sliced and padded bytes
+objects and converted every chunk with bytes() before playback.
+
+Usage:
+    $ python benchmarks/bench_audio_copy.py [--subscribers 3]
+"""
+
+import argparse
+import tracemalloc
+
+import numpy as np
+
+from retico.core.audio.common import SpeechIU, DispatchedAudioIU
+from retico.core.audio.io import AudioDispatcherModule
+
+
+def legacy_dispatch(dispatcher, input_iu):
+    """The chunking of the AudioDispatcherModule before the zero-copy path."""
+    cur_width = dispatcher.target_chunk_size * dispatcher.sample_width
+    chunks = []
+    for i in range(0, input_iu.nframes, dispatcher.target_chunk_size):
+        cur_pos = i * dispatcher.sample_width
+        data = input_iu.raw_audio[cur_pos : cur_pos + cur_width]
+        distance = cur_width - len(data)
+        data += b"\0" * distance
+        current_iu = DispatchedAudioIU()
+        current_iu.set_audio(
+            data,
+            dispatcher.target_chunk_size,
+            dispatcher.rate,
+            dispatcher.sample_width,
+        )
+        chunks.append(current_iu)
+    return chunks
+
+
+def zero_copy_dispatch(dispatcher, input_iu):
+    dispatcher.process_iu(input_iu)
+    chunks = dispatcher.audio_buffer
+    dispatcher.audio_buffer = []
+    return chunks
+
+
+def copied_bytes(raw_audio, source):
+    """Return the number of bytes of raw_audio that are not shared with the
+    source audio."""
+    if np.shares_memory(np.frombuffer(raw_audio, np.uint8), source):
+        return 0
+    return len(raw_audio)
+
+
+def measure(dispatch, rate, subscribers, copy_on_playback):
+    sample_width = 2
+    dispatcher = AudioDispatcherModule(
+        target_chunk_size=int(rate * 0.01), rate=rate, sample_width=sample_width
+    )
+    input_iu = SpeechIU()
+    # Slightly more than one second, so that the last chunk has to be padded
+    nframes = rate + rate // 200
+    input_iu.set_audio(b"\1" * nframes * sample_width, nframes, rate, sample_width)
+    input_iu.dispatch = True
+
+    tracemalloc.start()
+    chunks = dispatch(dispatcher, input_iu)
+    played = []
+    for _ in range(subscribers):
+        for chunk in chunks:
+            if copy_on_playback:
+                # bytes() of a bytes object does not copy, the slicing did.
+                played.append(bytes(chunk.raw_audio))
+            else:
+                played.append(chunk.raw_audio)
+    allocated, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    source = np.frombuffer(input_iu.raw_audio, np.uint8)
+    copied = sum(copied_bytes(chunk.raw_audio, source) for chunk in chunks)
+    duration = nframes / rate
+    return copied / duration, allocated / duration
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--subscribers", type=int, default=3)
+    args = parser.parse_args()
+
+    print("The allocated bytes include the IU objects of every chunk.")
+    print("rate  | path      | audio bytes/s | copied bytes/s | allocated bytes/s")
+    for rate in [16000, 48000]:
+        for label, dispatch, copy_on_playback in [
+            ("legacy", legacy_dispatch, True),
+            ("zero-copy", zero_copy_dispatch, False),
+        ]:
+            copied, allocated = measure(
+                dispatch, rate, args.subscribers, copy_on_playback
+            )
+            print(
+                "%5d | %9s | %13d | %14d | %17d"
+                % (rate, label, rate * 2, copied, allocated)
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+"""
+Benchmark of the event dispatch of modules.
+
+The shared event dispatcher (asynchronous and synchronous subscriptions) is
+compared to the previous behavior that started a new thread for every callback
+on every event. A module calls EVENT_PROCESS_IU as fast as possible to measure
+the number of events per second (the latency then includes the backlog of the
+callbacks). Then the events are called at a fixed rate (like 10 ms audio chunks)
+to measure the latency until the callback is called.
+
+Usage:
+    $ python benchmarks/bench_events.py [--n_events 5000] [--n_callbacks 2]
+        [--rate 1000]
+"""
+
+import argparse
+import statistics
+import threading
+import time
+
+from retico.core import abstract
+
+
+class EventModule(abstract.AbstractModule):
+    @staticmethod
+    def name():
+        return "Event Module"
+
+    @staticmethod
+    def description():
+        return "A module that only calls events."
+
+    @staticmethod
+    def input_ius():
+        return []
+
+    @staticmethod
+    def output_iu():
+        return None
+
+
+class ThreadEventModule(EventModule):
+    """The event module with the previous thread-per-callback event_call."""
+
+    def event_call(self, event_name, data={}):
+        for subscription in self.events.get(event_name, []):
+            threading.Thread(
+                target=subscription.callback, args=(self, event_name, data)
+            ).start()
+
+
+class Recorder:
+    def __init__(self, n_events):
+        self.n_events = n_events
+        self.latencies = []
+        self.mutex = threading.Lock()
+        self.done = threading.Event()
+
+    def callback(self, module, event_name, data):
+        latency = time.perf_counter() - data["t"]
+        with self.mutex:
+            self.latencies.append(latency)
+            if len(self.latencies) >= self.n_events:
+                self.done.set()
+
+
+def measure(module_class, n_events, n_callbacks, sync, interval=0):
+    module = module_class()
+    recorders = [Recorder(n_events) for _ in range(n_callbacks)]
+    for recorder in recorders:
+        module.event_subscribe(
+            module.EVENT_PROCESS_IU, recorder.callback, sync=sync, maxsize=0
+        )
+    start = time.perf_counter()
+    for _ in range(n_events):
+        module.event_call(module.EVENT_PROCESS_IU, {"t": time.perf_counter()})
+        if interval:
+            time.sleep(interval)
+    for recorder in recorders:
+        recorder.done.wait(30)
+    duration = time.perf_counter() - start
+    latencies = [l for r in recorders for l in r.latencies]
+    return n_events / duration, latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--n_events", type=int, default=5000)
+    parser.add_argument("--n_callbacks", type=int, default=2)
+    parser.add_argument("--rate", type=int, default=1000)
+    args = parser.parse_args()
+
+    variants = [
+        ("thread", ThreadEventModule, False),
+        ("pool", EventModule, False),
+        ("sync", EventModule, True),
+    ]
+    for title, interval in [
+        ("as fast as possible", 0),
+        ("%d events/s" % args.rate, 1 / args.rate),
+    ]:
+        print(title)
+        print("dispatch | events/s | mean (ms) | median (ms) | max (ms)")
+        for label, module_class, sync in variants:
+            rate, lat = measure(
+                module_class, args.n_events, args.n_callbacks, sync, interval
+            )
+            lat = [l * 1000 for l in lat]
+            print(
+                "%8s | %8d | %9.3f | %11.3f | %8.3f"
+                % (label, rate, statistics.mean(lat), statistics.median(lat), max(lat))
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+"""
+Benchmark of the allocation of high-rate IUs.
+
+AudioIU, DispatchedAudioIU and VadIU are created every 10 ms per stream. Their
+attributes are now stored in slots, the mutex of an IU is created when it is
+first used and the meta data of the IU it is grounded in is shared with it.
+They are compared to the same IUs with the previous layout (a
+__dict__, an eager threading.Lock, a _processed_list and a copy of the meta
+data of grounded_in per IU). Reported are the IUs created per second and the
+bytes per IU (without the audio, which is shared).
+
+Usage:
+    $ python benchmarks/bench_iu_alloc.py [--n 100000]
+"""
+
+import argparse
+import gc
+import threading
+import time
+import tracemalloc
+
+from retico.core import abstract, clock
+from retico.core.audio.common import AudioIU, DispatchedAudioIU, as_audio_buffer
+from retico.agent.common import VadIU
+
+CHUNK = bytes(960)  # 10 ms of 48 kHz 16 bit audio
+
+
+class LegacyIU:
+    """The previous layout of an IncrementalUnit"""
+
+    def __init__(self, creator=None, iuid=0, previous_iu=None, grounded_in=None, payload=None, **kwargs):
+        self.creator = creator
+        self.iuid = iuid
+        self._history = None
+        self._history_index = None
+        self._previous = abstract._link(previous_iu)
+        self._grounded = abstract._link(grounded_in)
+        self._processed_list = []
+        self.payload = payload
+        self.mutex = threading.Lock()
+        self.committed = False
+        self.revoked = False
+        self.meta_data = {}
+        if grounded_in:
+            self.meta_data = {**grounded_in.meta_data}
+        self.created_at = clock.get_clock().time()
+
+
+class LegacyAudioIU(LegacyIU):
+    def __init__(self, rate=None, nframes=None, sample_width=None, raw_audio=None, **kwargs):
+        super().__init__(payload=raw_audio, **kwargs)
+        self.raw_audio = as_audio_buffer(raw_audio)
+        self.rate = rate
+        self.nframes = nframes
+        self.sample_width = sample_width
+
+
+class LegacyDispatchedAudioIU(LegacyAudioIU):
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.completion = 0.0
+        self.is_dispatching = False
+
+
+class LegacyVadIU(LegacyIU):
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.is_speaking = False
+        self.silence_time = 0
+
+
+def create(iu_class, n, grounded_in):
+    ius = []
+    previous_iu = None
+    kwargs = {}
+    if iu_class in (AudioIU, LegacyAudioIU, DispatchedAudioIU, LegacyDispatchedAudioIU):
+        kwargs = {"rate": 48000, "nframes": 480, "sample_width": 2, "raw_audio": CHUNK}
+    for i in range(n):
+        previous_iu = iu_class(iuid=i, previous_iu=previous_iu, grounded_in=grounded_in, **kwargs)
+        ius.append(previous_iu)
+    return ius
+
+
+def measure(iu_class, n, grounded_in):
+    gc.collect()
+    start = time.perf_counter()
+    create(iu_class, n, grounded_in)
+    rate = n / (time.perf_counter() - start)
+
+    gc.collect()
+    tracemalloc.start()
+    ius = create(iu_class, n, grounded_in)
+    held, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del ius
+    return rate, held / n
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--n", type=int, default=100000)
+    args = parser.parse_args()
+
+    # The IUs are grounded in an IU with meta data (e.g. from a simulation)
+    legacy_source = LegacyIU()
+    legacy_source.meta_data = {"speaker": "user", "dialogue": 12, "turn": 3}
+    source = VadIU()
+    source.meta_data = dict(legacy_source.meta_data)
+
+    print("IU | legacy (IUs/s) | slots (IUs/s) | legacy (bytes/IU) | slots (bytes/IU)")
+    for name, legacy_class, iu_class in [
+        ("AudioIU", LegacyAudioIU, AudioIU),
+        ("DispatchedAudioIU", LegacyDispatchedAudioIU, DispatchedAudioIU),
+        ("VadIU", LegacyVadIU, VadIU),
+    ]:
+        legacy_rate, legacy_bytes = measure(legacy_class, args.n, legacy_source)
+        rate, n_bytes = measure(iu_class, args.n, source)
+        print(
+            "%s | %.0f | %.0f | %.0f | %.0f"
+            % (name, legacy_rate, rate, legacy_bytes, n_bytes)
+        )
+
+
+if __name__ == "__main__":
+    main()
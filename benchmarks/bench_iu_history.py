@@ -0,0 +1,137 @@
+"""
+Benchmark of the IU links through module histories against linked IU chains.
+
+A chain of modules (microphone -> VAD -> ASR -> NLU) produces one IU per 10 ms
+of audio, each grounded in the latest IU of the previous module. Previously, an
+IU referenced its previous IU and the IU it is grounded in directly and every
+new IU walked both chains to cut them at a depth of 10. Now, the links are
+indices into the fixed-capacity IU history of the creating module. The time to
+create an IU at the end of the chain and the memory held by the IUs after the
+pipeline ran (with only the latest IUs referenced) are reported.
+
+Usage:
+    $ python benchmarks/bench_iu_history.py [--steps 5000]
+        [--history_sizes 16 64 256]
+"""
+
+import argparse
+import gc
+import time
+import tracemalloc
+
+from retico.core import abstract
+
+CHUNK_BYTES = 960  # 10 ms of 48 kHz 16 bit audio
+MODULES = ["microphone", "vad", "asr", "nlu"]
+
+
+class ChainIU(abstract.IncrementalUnit):
+    @staticmethod
+    def type():
+        return "Chain IU"
+
+
+class LinkedIU(ChainIU):
+    """An IU with the previous links to other IUs"""
+
+    MAX_DEPTH = 10
+    previous_iu = None
+    grounded_in = None
+
+    def __init__(self, creator=None, iuid=0, previous_iu=None, grounded_in=None, **kwargs):
+        super().__init__(creator=creator, iuid=iuid, **kwargs)
+        self.previous_iu = previous_iu
+        self.grounded_in = grounded_in
+        if grounded_in:
+            self.meta_data = {**grounded_in.meta_data}
+        self._remove_old_links()
+
+    def _remove_old_links(self):
+        current_depth = 0
+        previous_iu = self.previous_iu
+        while previous_iu:
+            if current_depth == self.MAX_DEPTH:
+                previous_iu.previous_iu = None
+            previous_iu = previous_iu.previous_iu
+            current_depth += 1
+        current_depth = 0
+        grounded_in = self.grounded_in
+        while grounded_in:
+            if current_depth == self.MAX_DEPTH:
+                grounded_in.grounded_in = None
+            grounded_in = grounded_in.grounded_in
+            current_depth += 1
+
+
+def chain_module(name, iu_class, history_size):
+    class ChainModule(abstract.AbstractModule):
+        @staticmethod
+        def name():
+            return name
+
+        @staticmethod
+        def description():
+            return "A module of the benchmark chain."
+
+        @staticmethod
+        def input_ius():
+            return [ChainIU]
+
+        @staticmethod
+        def output_iu():
+            return iu_class
+
+    return ChainModule(history_size=history_size)
+
+
+def run(iu_class, history_size, steps, trace):
+    modules = [chain_module(name, iu_class, history_size) for name in MODULES]
+    gc.collect()
+    if trace:
+        tracemalloc.start()
+    last_time = 0.0
+    for _ in range(steps):
+        grounded_in = None
+        for i, module in enumerate(modules):
+            start = time.perf_counter()
+            iu = module.create_iu(grounded_in)
+            if i == len(modules) - 1:
+                last_time += time.perf_counter() - start
+            iu.payload = bytes(CHUNK_BYTES) if i == 0 else i
+            grounded_in = iu
+    held = 0
+    if trace:
+        gc.collect()
+        held, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    return last_time / steps * 1e6, held / 1024, modules
+
+
+def measure(iu_class, history_size, steps):
+    """The time per IU (without tracing) and the memory held"""
+    t, _, _ = run(iu_class, history_size, steps, trace=False)
+    _, held, modules = run(iu_class, history_size, steps, trace=True)
+    return t, held, modules
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--steps", type=int, default=5000)
+    parser.add_argument("--history_sizes", type=int, nargs="+", default=[16, 64, 256])
+    args = parser.parse_args()
+
+    print("links | create IU (us) | memory held (KiB)")
+    # The linked IUs are kept in a history of size 1 (the latest IU)
+    t, held, _ = measure(LinkedIU, 1, args.steps)
+    print("linked chains (depth 10) | %.2f | %.0f" % (t, held))
+    for history_size in args.history_sizes:
+        t, held, modules = measure(ChainIU, history_size, args.steps)
+        estimate = sum(m.iu_history.stats()["bytes"] for m in modules) / 1024
+        print(
+            "history (%d IUs) | %.2f | %.0f (estimated by stats(): %.0f)"
+            % (history_size, t, held, estimate)
+        )
+
+
+if __name__ == "__main__":
+    main()
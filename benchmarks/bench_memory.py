@@ -0,0 +1,75 @@
+"""
+Benchmark of the dialog context queries of the agent memory.
+
+FC_EOT and FC_Predict query the dialog text on every ASR update. Previously,
+Memory.get_dialog_text sorted all turns and merged them again on every call;
+now the merged dialog text is updated when a turn is added. The time per query
+is reported for dialogs of different lengths.
+
+Usage:
+    $ python benchmarks/bench_memory.py [--turns 10 100 1000] [--queries 1000]
+"""
+
+import argparse
+import time
+
+from retico.agent.memory import AgentState, Memory, UserState
+from retico.agent.utils import clean_whitespace
+
+
+def sorted_dialog_text(memory):
+    """The previous Memory.get_dialog_text"""
+    turns = memory.turns_agent + memory.turns_user
+    turns.sort(key=lambda x: x.start_time)
+    dialog = []
+    utt = turns[0].utterance
+    last_name = turns[0].name
+    for t in turns[1:]:
+        if t.utterance == "":
+            continue
+        if t.name == last_name:
+            utt = utt + " " + clean_whitespace(t.utterance)
+        else:
+            dialog.append(clean_whitespace(utt))
+            utt = clean_whitespace(t.utterance)
+            last_name = t.name
+    dialog.append(clean_whitespace(utt))
+    return dialog, last_name
+
+
+def dialog(n_turns):
+    memory = Memory()
+    for i in range(n_turns):
+        state = AgentState() if i % 2 == 0 else UserState()
+        state.utterance = "this is utterance number %d of the dialog" % i
+        state.start_time = float(i)
+        state.finalize()
+        memory.update(state, agent=i % 2 == 0)
+    return memory
+
+
+def per_query(function, queries):
+    start = time.perf_counter()
+    for _ in range(queries):
+        function()
+    return (time.perf_counter() - start) / queries * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--turns", type=int, nargs="+", default=[10, 100, 1000])
+    parser.add_argument("--queries", type=int, default=1000)
+    args = parser.parse_args()
+
+    print("turns | sorted (us) | get_dialog_text (us) | get_context_window (us)")
+    for n_turns in args.turns:
+        memory = dialog(n_turns)
+        assert sorted_dialog_text(memory) == memory.get_dialog_text()
+        t_sorted = per_query(lambda: sorted_dialog_text(memory), args.queries)
+        t_text = per_query(memory.get_dialog_text, args.queries)
+        t_window = per_query(memory.get_context_window, args.queries)
+        print("%d | %.1f | %.1f | %.1f" % (n_turns, t_sorted, t_text, t_window))
+
+
+if __name__ == "__main__":
+    main()
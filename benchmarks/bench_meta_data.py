@@ -0,0 +1,117 @@
+"""
+Benchmark of the meta data propagation along grounded_in.
+
+In a simulation network, the NLG module sets the meta data of SimulationData
+(dialogue act, concepts, transcription, audio, ...) and every IU derived from
+it inherits it: the audio chunks of the AudioDispatcherModule, the IUs of the
+NetworkModule and the IUs of the SimulatedASRModule and SimulatedEoTModule.
+Previously, every derived IU copied the dict of the IU it is grounded in; now,
+the meta data is shared along grounded_in and only the written keys are stored
+per IU. Reported are the time to derive the IUs of one chunk and the memory
+held by the meta data per chunk.
+
+Usage:
+    $ python benchmarks/bench_meta_data.py [--chunks 20000] [--concepts 8]
+"""
+
+import argparse
+import gc
+import time
+import tracemalloc
+
+from retico.core import abstract
+
+CHUNK = bytes(960)  # 10 ms of 48 kHz 16 bit audio
+
+
+class SimulatedIU(abstract.IncrementalUnit):
+    @staticmethod
+    def type():
+        return "Simulated IU"
+
+
+class CopiedIU(SimulatedIU):
+    """An IU that copies the meta data of grounded_in (the previous behavior)"""
+
+    __slots__ = ("_copied",)
+
+    def __init__(self, grounded_in=None, **kwargs):
+        super().__init__(**kwargs)
+        self._copied = {}
+        if grounded_in:
+            self._copied = {**grounded_in._copied}
+
+    @property
+    def meta_data(self):
+        return self._copied
+
+    @meta_data.setter
+    def meta_data(self, meta_data):
+        self._copied = meta_data
+
+
+def generate_meta(n_concepts):
+    """Meta data like SimulationData.generate_meta"""
+    return {
+        "dialogue_act": "provide_info",
+        "concepts": {"concept_%d" % i: "value %d" % i for i in range(n_concepts)},
+        "raw_audio": bytes(48000),
+        "frame_rate": 48000,
+        "sample_width": 2,
+        "transcription": "the table is booked for four people at seven",
+        "confidence": 0.9,
+        "audio_file_path": "/data/audio/utterance_0001.wav",
+        "csv_file_path": "/data/csv/dialogue_0001.csv",
+        "csv_row": 12,
+        "message_data": "provide_info:table",
+    }
+
+
+def fan_out(iu_class, source, chunks):
+    """Derive the IUs of the dispatcher, the network, the ASR and the EoT"""
+    chunk_ius = []
+    for _ in range(chunks):
+        chunk = iu_class(grounded_in=source, payload=CHUNK)
+        network = iu_class(grounded_in=chunk)
+        asr = iu_class(grounded_in=network)
+        asr.payload = asr.meta_data.get("transcription")
+        eot = iu_class(grounded_in=network)
+        eot.payload = eot.meta_data["dialogue_act"]
+        chunk_ius.append((chunk, network, asr, eot))
+    return chunk_ius
+
+
+def measure(iu_class, n_concepts, chunks):
+    source = iu_class()
+    source.meta_data = generate_meta(n_concepts)
+    source.meta_data["concepts"] = dict(source.meta_data["concepts"])
+
+    gc.collect()
+    start = time.perf_counter()
+    fan_out(iu_class, source, chunks)
+    t = (time.perf_counter() - start) / chunks * 1e6
+
+    gc.collect()
+    tracemalloc.start()
+    ius = fan_out(iu_class, source, chunks)
+    held, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del ius
+    return t, held / chunks
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--chunks", type=int, default=20000)
+    parser.add_argument("--concepts", type=int, default=8)
+    args = parser.parse_args()
+
+    print("meta data | time per chunk (us) | memory per chunk (bytes)")
+    t, held = measure(CopiedIU, args.concepts, args.chunks)
+    print("copied dict | %.2f | %.0f" % (t, held))
+    t, held = measure(SimulatedIU, args.concepts, args.chunks)
+    print("copy-on-write | %.2f | %.0f" % (t, held))
+
+
+if __name__ == "__main__":
+    main()
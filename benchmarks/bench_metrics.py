@@ -0,0 +1,127 @@
+"""
+Benchmark of the live metrics of the modules of a network.
+
+A source produces an IU every 10 ms for a fast module and a slow module that
+needs 15 ms per IU and reads from a bounded left buffer that drops the oldest
+IU. While the network runs, the metrics are scraped from the Prometheus
+endpoint and the table of the terminal dashboard is printed at the end, so
+that the overloaded module can be seen. The cost of the counters per processed
+IU and the time to scrape the endpoint are reported.
+
+Usage:
+    $ python benchmarks/bench_metrics.py [--duration 3] [--slow_time 0.015]
+"""
+
+import argparse
+import time
+import urllib.request
+
+from retico.core import abstract, metrics
+
+SOURCE_TIME = 0.01
+
+
+class TickIU(abstract.IncrementalUnit):
+    @staticmethod
+    def type():
+        return "Tick IU"
+
+
+class TickSourceModule(abstract.AbstractProducingModule):
+    @staticmethod
+    def name():
+        return "Tick Source"
+
+    @staticmethod
+    def description():
+        return "A module that produces an IU every 10 ms."
+
+    @staticmethod
+    def output_iu():
+        return TickIU
+
+    def process_iu(self, input_iu):
+        time.sleep(SOURCE_TIME)
+        return self.create_iu()
+
+
+class WorkModule(abstract.AbstractModule):
+    @staticmethod
+    def name():
+        return "Work Module"
+
+    @staticmethod
+    def description():
+        return "A module that needs a fixed time per IU."
+
+    @staticmethod
+    def input_ius():
+        return [TickIU]
+
+    @staticmethod
+    def output_iu():
+        return TickIU
+
+    def __init__(self, work_time=0.0, **kwargs):
+        super().__init__(**kwargs)
+        self.work_time = work_time
+
+    def process_iu(self, input_iu):
+        if self.work_time:
+            time.sleep(self.work_time)
+        return self.create_iu(input_iu)
+
+
+def counter_cost(n):
+    """The time per IU spent on timing process_iu and counting it"""
+    counters = metrics.ModuleMetrics()
+    start = time.perf_counter()
+    for _ in range(n):
+        t = time.perf_counter()
+        counters.processed(time.perf_counter() - t)
+        counters.appended()
+    return (time.perf_counter() - start) / n * 1e9
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--duration", type=float, default=3.0)
+    parser.add_argument("--slow_time", type=float, default=0.015)
+    args = parser.parse_args()
+
+    print("counters per IU: %.0f ns" % counter_cost(200000))
+
+    source = TickSourceModule()
+    fast = WorkModule(0.001)
+    slow = WorkModule(args.slow_time)
+    source.subscribe(fast)
+    source.subscribe(slow, maxsize=10, overflow=abstract.IncrementalQueue.DROP_OLDEST)
+    modules = [source, fast, slow]
+
+    server = metrics.MetricsServer(modules, port=0)
+    server.start()
+    url = "http://127.0.0.1:%d/metrics" % server.port
+    for module in modules:
+        module.run()
+    scrapes = []
+    end = time.monotonic() + args.duration
+    while time.monotonic() < end:
+        start = time.perf_counter()
+        with urllib.request.urlopen(url) as response:
+            text = response.read().decode()
+        scrapes.append(time.perf_counter() - start)
+        time.sleep(0.25)
+    for module in modules:
+        module.stop()
+    server.stop()
+
+    print(
+        "%d scrapes of %d lines: %.2f ms per scrape"
+        % (len(scrapes), len(text.splitlines()), sum(scrapes) / len(scrapes) * 1000)
+    )
+    print()
+    print(metrics.format_table(metrics.collect(modules)))
+
+
+if __name__ == "__main__":
+    main()
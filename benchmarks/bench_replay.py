@@ -0,0 +1,170 @@
+"""
+Benchmark of the recording and the replay of a module network.
+
+A microphone-like source produces an AudioIU every 10 ms for a VAD-like module
+that produces a text IU whenever the energy of the audio changes, which is
+consumed by a turn-taking-like module. The network is recorded for some time
+and the recording is replayed into a new instance of the network in real time
+on a VirtualClock (twice) and as fast as possible. Reported are the cost of
+the recording per IU, the size of the recording, the time a replay takes and
+whether the IUs that entered the last module are identical to the recording.
+
+Usage:
+    $ python benchmarks/bench_replay.py [--duration 2]
+"""
+
+import argparse
+import os
+import struct
+import tempfile
+import time
+
+from retico.core import abstract, clock, replay
+from retico.core.audio.common import AudioIU
+from retico.core.text.common import TextIU
+
+CHUNK_TIME = 0.01
+RATE = 16000
+
+
+class SineSourceModule(abstract.AbstractProducingModule):
+    @staticmethod
+    def name():
+        return "Sine Source"
+
+    @staticmethod
+    def description():
+        return "A module that produces 10 ms of loud or silent audio."
+
+    @staticmethod
+    def output_iu():
+        return AudioIU
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.n = 0
+
+    def process_iu(self, input_iu):
+        clock.get_clock().sleep(CHUNK_TIME)
+        self.n += 1
+        amplitude = 8000 if (self.n // 37) % 2 else 10
+        nframes = int(RATE * CHUNK_TIME)
+        samples = [amplitude * (1 if i % 16 < 8 else -1) for i in range(nframes)]
+        output_iu = self.create_iu()
+        output_iu.set_audio(struct.pack("<%dh" % nframes, *samples), nframes, RATE, 2)
+        return output_iu
+
+
+class EnergyModule(abstract.AbstractModule):
+    @staticmethod
+    def name():
+        return "Energy"
+
+    @staticmethod
+    def description():
+        return "A module that reports changes between speech and silence."
+
+    @staticmethod
+    def input_ius():
+        return [AudioIU]
+
+    @staticmethod
+    def output_iu():
+        return TextIU
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.speaking = False
+
+    def process_iu(self, input_iu):
+        first = struct.unpack_from("<h", input_iu.raw_audio)[0]
+        speaking = abs(first) > 100
+        if speaking == self.speaking:
+            return None
+        self.speaking = speaking
+        output_iu = self.create_iu(input_iu)
+        output_iu.payload = "speech" if speaking else "silence"
+        return output_iu
+
+
+class TurnModule(abstract.AbstractConsumingModule):
+    @staticmethod
+    def name():
+        return "Turn"
+
+    @staticmethod
+    def description():
+        return "A module that consumes the speech changes."
+
+    @staticmethod
+    def input_ius():
+        return [TextIU]
+
+    def process_iu(self, input_iu):
+        return None
+
+
+def network():
+    modules = [SineSourceModule(), EnergyModule(), TurnModule()]
+    modules[0].subscribe(modules[1])
+    modules[1].subscribe(modules[2])
+    return modules
+
+
+def turn_stream(replayer):
+    return [iu.payload for _, _, iu in replayer.stream("Turn")]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--duration", type=float, default=2.0)
+    args = parser.parse_args()
+
+    path = tempfile.mkdtemp()
+    modules = network()
+    recorder = replay.Recorder(modules, os.path.join(path, "live"))
+    recorder.start()
+    for module in modules:
+        module.run()
+    time.sleep(args.duration)
+    for module in modules:
+        module.stop()
+    time.sleep(0.1)
+    recorder.stop()
+
+    original = replay.Replayer(os.path.join(path, "live"))
+    size = sum(
+        os.path.getsize(os.path.join(path, "live", f))
+        for f in (replay.STREAM_FILE, replay.CHUNK_FILE)
+    )
+    start = time.perf_counter()
+    for _ in range(1000):
+        recorder._record(modules[1], "process_iu", {"iu": modules[0].latest_iu()})
+    cost = (time.perf_counter() - start) / 1000 * 1e6
+    print(
+        "recorded %d IUs in %.1f s: %.0f KiB, %.1f us per IU entering a module"
+        % (len(original), original.duration, size / 1024, cost)
+    )
+
+    print("replay | time (s) | IUs fed | identical stream of Turn")
+    for name, speed, virtual in [
+        ("real time, VirtualClock", 1.0, True),
+        ("real time, VirtualClock", 1.0, True),
+        ("as fast as possible", None, False),
+    ]:
+        clock.set_clock(clock.VirtualClock() if virtual else clock.WallClock())
+        modules = network()
+        recorder = replay.Recorder(modules, os.path.join(path, "replay"))
+        recorder.start()
+        start = time.perf_counter()
+        fed = original.replay(modules, speed=speed, settle_time=0.1)
+        t = time.perf_counter() - start
+        recorder.stop()
+        replayed = replay.Replayer(os.path.join(path, "replay"))
+        identical = turn_stream(replayed) == turn_stream(original)
+        print("%s | %.2f | %d | %s" % (name, t, fed, identical))
+    clock.set_clock(clock.WallClock())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+"""
+Benchmark of the in-process audio conversion against sox and ffmpeg.
+
+For utterances of typical lengths, the conversions of the TTS modules are timed:
+resampling the 16 kHz PCM audio of Amazon Polly to the 48 kHz of the agent
+(previously `sox` on a temporary WAV file) and decoding a 22.05 kHz WAV file of
+Mary TTS to 44.1 kHz PCM (previously `ffmpeg` with temporary files). The
+subprocess path is only measured if the executable is installed.
+
+Usage:
+    $ python benchmarks/bench_resample.py [--durations 1 2 3 4 5]
+        [--repetitions 10]
+"""
+
+import argparse
+import os
+import shutil
+import statistics
+import subprocess
+import tempfile
+import time
+import wave
+
+import numpy as np
+
+from retico.core.audio import convert
+
+
+def speech_like(duration, rate, seed=0):
+    rng = np.random.default_rng(seed)
+    t = np.arange(int(duration * rate)) / rate
+    signal = sum(np.sin(2 * np.pi * f * t) / (i + 1) for i, f in enumerate([180, 360, 720, 1500]))
+    signal *= 0.3 * (1 + np.sin(2 * np.pi * 3 * t)) / 2
+    signal += 0.01 * rng.standard_normal(len(t))
+    return convert.to_pcm(signal)
+
+
+def write_wav(path, raw_audio, rate):
+    with wave.open(path, "wb") as wav_file:
+        wav_file.setnchannels(1)
+        wav_file.setsampwidth(2)
+        wav_file.setframerate(rate)
+        wav_file.writeframes(raw_audio)
+
+
+def read_wav(path):
+    with wave.open(path, "rb") as wav_file:
+        return wav_file.readframes(wav_file.getnframes())
+
+
+def sox_resample(raw_audio, rate_in, rate_out, tmp):
+    """The previous AmazonTTSModule.resample_sox"""
+    wav_path = os.path.join(tmp, "tts.wav")
+    tmp_path = os.path.join(tmp, "tts_tmp.wav")
+    write_wav(wav_path, raw_audio, rate_in)
+    subprocess.call(["sox", wav_path, "-r", str(rate_out), tmp_path])
+    shutil.move(tmp_path, wav_path)
+    return read_wav(wav_path)
+
+
+def ffmpeg_convert(wav_data, rate_out, tmp):
+    """The previous MaryTTS.convert_audio"""
+    in_path = os.path.join(tmp, "tmp_mtts.wav")
+    out_path = os.path.join(tmp, "tmp.wav")
+    with open(in_path, "wb") as f:
+        f.write(wav_data)
+    subprocess.call(
+        ["ffmpeg", "-i", in_path, "-acodec", "pcm_s16le", "-ar", str(rate_out), out_path, "-y"],
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    raw_audio = read_wav(out_path)
+    os.remove(in_path)
+    os.remove(out_path)
+    return raw_audio
+
+
+def timed(function, repetitions):
+    times = []
+    for _ in range(repetitions):
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+    return statistics.median(times) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--durations", type=float, nargs="+", default=[1, 2, 3, 4, 5])
+    parser.add_argument("--repetitions", type=int, default=10)
+    args = parser.parse_args()
+
+    has_sox = shutil.which("sox") is not None
+    has_ffmpeg = shutil.which("ffmpeg") is not None
+
+    with tempfile.TemporaryDirectory() as tmp:
+        print("conversion | duration (s) | in-process (ms) | subprocess (ms)")
+        for duration in args.durations:
+            polly = speech_like(duration, 16000)
+            t_numpy = timed(lambda: convert.resample_pcm(polly, 16000, 48000), args.repetitions)
+            t_sox = "n/a"
+            if has_sox:
+                t_sox = "%.1f" % timed(lambda: sox_resample(polly, 16000, 48000, tmp), args.repetitions)
+            print("resample 16k->48k | %.1f | %.1f | %s" % (duration, t_numpy, t_sox))
+
+        for duration in args.durations:
+            mary = convert.encode_wav(speech_like(duration, 22050), 22050)
+            t_numpy = timed(lambda: convert.convert_wav(mary, 44100), args.repetitions)
+            t_ffmpeg = "n/a"
+            if has_ffmpeg:
+                t_ffmpeg = "%.1f" % timed(lambda: ffmpeg_convert(mary, 44100, tmp), args.repetitions)
+            print("wav 22.05k->44.1k | %.1f | %.1f | %s" % (duration, t_numpy, t_ffmpeg))
+
+    if not (has_sox and has_ffmpeg):
+        print("sox/ffmpeg not installed: the subprocess path was not measured")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,232 @@
+"""
+Benchmark of the threaded and the asyncio runtime on an agent-like pipeline.
+
+The pipeline mirrors the speech path of the Agent: a text source (the CNS),
+a TTS module with a simulated blocking cloud request, an audio dispatcher, a
+consumer of the dispatched audio and a timed dialog loop (the FrontalCortex).
+In the threaded runtime every module and the timed loops run in their own
+threads. In the asyncio runtime the modules are AsyncModules that run on one
+event loop together with the dialog loop and the blocking TTS request is
+awaited in the executor of the loop.
+
+The number of threads during the run and the end-to-end latency from the
+creation of a text IU until the consumer receives the first dispatched chunk
+of its audio are reported.
+
+Usage:
+    $ python benchmarks/bench_runtime.py [--n_utterances 30] [--tts_delay 0.05]
+"""
+
+import argparse
+import asyncio
+import statistics
+import threading
+import time
+
+from retico.core import abstract, aio
+from retico.core.audio.common import SpeechIU, DispatchedAudioIU
+from retico.core.audio.io import AudioDispatcherModule, AsyncAudioDispatcherModule
+
+RATE = 16000
+SAMPLE_WIDTH = 2
+CHUNK_TIME = 0.01
+LOOP_TIME = 0.01
+
+
+class TextIU(abstract.IncrementalUnit):
+    @staticmethod
+    def type():
+        return "Benchmark Text IU"
+
+
+class TextSourceModule(abstract.AbstractModule):
+    @staticmethod
+    def name():
+        return "Benchmark Text Source"
+
+    @staticmethod
+    def description():
+        return "A module that only serves as the provider of a queue."
+
+    @staticmethod
+    def input_ius():
+        return []
+
+    @staticmethod
+    def output_iu():
+        return TextIU
+
+
+class FakeTTSModule(abstract.AbstractModule):
+    @staticmethod
+    def name():
+        return "Fake TTS Module"
+
+    @staticmethod
+    def description():
+        return "A module that simulates a blocking cloud TTS request."
+
+    @staticmethod
+    def input_ius():
+        return [TextIU]
+
+    @staticmethod
+    def output_iu():
+        return SpeechIU
+
+    def __init__(self, tts_delay, **kwargs):
+        super().__init__(**kwargs)
+        self.tts_delay = tts_delay
+
+    def synthesize(self, text):
+        time.sleep(self.tts_delay)
+        return b"\0" * int(RATE * 0.2) * SAMPLE_WIDTH
+
+    def make_speech_iu(self, input_iu, raw_audio):
+        output_iu = self.create_iu(input_iu)
+        output_iu.set_audio(raw_audio, len(raw_audio) // SAMPLE_WIDTH, RATE, SAMPLE_WIDTH)
+        output_iu.dispatch = True
+        return output_iu
+
+    def process_iu(self, input_iu):
+        return self.make_speech_iu(input_iu, self.synthesize(input_iu.payload))
+
+
+class AsyncFakeTTSModule(aio.AsyncModule, FakeTTSModule):
+    async def process_iu(self, input_iu):
+        raw_audio = await self.run_blocking(self.synthesize, input_iu.payload)
+        return self.make_speech_iu(input_iu, raw_audio)
+
+
+class LatencyModule(abstract.AbstractConsumingModule):
+    @staticmethod
+    def name():
+        return "Latency Module"
+
+    @staticmethod
+    def description():
+        return "A module that records the time until audio is dispatched."
+
+    @staticmethod
+    def input_ius():
+        return [DispatchedAudioIU]
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.latencies = []
+        self.last_speech = None
+        self.received = threading.Event()
+
+    def process_iu(self, input_iu):
+        speech_iu = input_iu.grounded_in
+        if input_iu.is_dispatching and speech_iu is not self.last_speech:
+            self.last_speech = speech_iu
+            self.latencies.append(time.perf_counter() - speech_iu.grounded_in.created)
+            self.received.set()
+
+
+class AsyncLatencyModule(aio.AsyncModule, LatencyModule):
+    pass
+
+
+class DialogLoop:
+    """A timed loop that only polls a flag, like the FrontalCortex."""
+
+    def __init__(self):
+        self.running = True
+        self.steps = 0
+
+    def loop(self):
+        while self.running:
+            time.sleep(LOOP_TIME)
+            self.steps += 1
+
+    async def loop_async(self):
+        while self.running:
+            await asyncio.sleep(LOOP_TIME)
+            self.steps += 1
+
+
+def build(runtime, tts_delay, runner=None):
+    chunk_size = int(CHUNK_TIME * RATE)
+    source = TextSourceModule()
+    if runtime == "asyncio":
+        tts = AsyncFakeTTSModule(tts_delay, runner=runner)
+        dispatcher = AsyncAudioDispatcherModule(
+            chunk_size, rate=RATE, sample_width=SAMPLE_WIDTH, runner=runner
+        )
+        consumer = AsyncLatencyModule(runner=runner)
+    else:
+        tts = FakeTTSModule(tts_delay)
+        dispatcher = AudioDispatcherModule(
+            chunk_size, rate=RATE, sample_width=SAMPLE_WIDTH
+        )
+        consumer = LatencyModule()
+    source.subscribe(tts)
+    tts.subscribe(dispatcher)
+    dispatcher.subscribe(consumer)
+    return source, [tts, dispatcher, consumer], consumer
+
+
+def measure(runtime, n_utterances, tts_delay):
+    threads_before = threading.active_count()
+    runner = aio.EventLoopRunner() if runtime == "asyncio" else None
+    source, modules, consumer = build(runtime, tts_delay, runner)
+    dialog = DialogLoop()
+    if runner is not None:
+        runner.run(modules)
+        dialog_future = runner.submit(dialog.loop_async())
+    else:
+        for module in modules:
+            module.run()
+        dialog_thread = threading.Thread(target=dialog.loop)
+        dialog_thread.start()
+
+    time.sleep(0.2)
+    n_threads = threading.active_count() - threads_before
+    for i in range(n_utterances):
+        iu = source.create_iu()
+        iu.payload = "utterance %d" % i
+        iu.created = time.perf_counter()
+        consumer.received.clear()
+        source.append(iu)
+        consumer.received.wait(2.0)
+        time.sleep(0.05)
+        n_threads = max(n_threads, threading.active_count() - threads_before)
+
+    dialog.running = False
+    for module in modules:
+        module.stop()
+    if runner is not None:
+        dialog_future.result()
+        runner.close()
+    else:
+        dialog_thread.join()
+    time.sleep(0.1)
+    return n_threads, consumer.latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--n_utterances", type=int, default=30)
+    parser.add_argument("--tts_delay", type=float, default=0.05)
+    args = parser.parse_args()
+
+    print("runtime | threads | mean (ms) | median (ms) | max (ms)")
+    for runtime in ["thread", "asyncio"]:
+        n_threads, lat = measure(runtime, args.n_utterances, args.tts_delay)
+        lat = [l * 1000 for l in lat]
+        print(
+            "%7s | %7d | %9.3f | %11.3f | %8.3f"
+            % (
+                runtime,
+                n_threads,
+                statistics.mean(lat),
+                statistics.median(lat),
+                max(lat),
+            )
+        )
+
+
+if __name__ == "__main__":
+    main()
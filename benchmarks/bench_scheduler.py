@@ -0,0 +1,134 @@
+"""
+Benchmark of the wake-up latency of modules with multiple left buffers.
+
+The event-driven scheduler of the AbstractModule is compared to the old
+round-robin polling loop that waited for QUEUE_TIMEOUT on every left buffer in
+turn. For every number of input buffers, IUs are put into a random buffer and
+the time until the consuming module starts processing them is measured.
+
+Usage:
+    $ python benchmarks/bench_scheduler.py [--n_ius 200]
+"""
+
+import argparse
+import queue
+import random
+import statistics
+import threading
+import time
+
+from retico.core import abstract
+
+
+class BenchIU(abstract.IncrementalUnit):
+    @staticmethod
+    def type():
+        return "Benchmark IU"
+
+
+class SourceModule(abstract.AbstractModule):
+    @staticmethod
+    def name():
+        return "Benchmark Source Module"
+
+    @staticmethod
+    def description():
+        return "A module that only serves as the provider of a queue."
+
+    @staticmethod
+    def input_ius():
+        return []
+
+    @staticmethod
+    def output_iu():
+        return BenchIU
+
+
+class LatencyModule(abstract.AbstractConsumingModule):
+    @staticmethod
+    def name():
+        return "Latency Module"
+
+    @staticmethod
+    def description():
+        return "A module that records the wake-up latency of incoming IUs."
+
+    @staticmethod
+    def input_ius():
+        return [BenchIU]
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.latencies = []
+        self.received = threading.Event()
+
+    def process_iu(self, input_iu):
+        self.latencies.append(time.perf_counter() - input_iu.payload)
+        self.received.set()
+
+
+class PollingLatencyModule(LatencyModule):
+    """The latency module with the previous round-robin polling loop."""
+
+    def _run(self):
+        self.prepare_run()
+        self.is_running = True
+        while self.is_running:
+            for buffer in self._left_buffers:
+                with self.mutex:
+                    try:
+                        input_iu = buffer.get(timeout=abstract.QUEUE_TIMEOUT)
+                    except queue.Empty:
+                        input_iu = None
+                    if input_iu:
+                        self.process_iu(input_iu)
+        self.shutdown()
+
+
+def measure(module_class, n_buffers, n_ius):
+    consumer = module_class()
+    sources = [SourceModule() for _ in range(n_buffers)]
+    for source in sources:
+        source.subscribe(consumer)
+    consumer.run()
+    time.sleep(0.1)
+    for _ in range(n_ius):
+        source = random.choice(sources)
+        iu = source.create_iu()
+        consumer.received.clear()
+        iu.payload = time.perf_counter()
+        source.append(iu)
+        consumer.received.wait(1.0)
+        # Random gaps so that the IU arrives at an arbitrary point of the loop
+        time.sleep(random.uniform(0.001, 0.02))
+    consumer.stop()
+    return consumer.latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--n_ius", type=int, default=200)
+    args = parser.parse_args()
+
+    print("buffers | scheduler | mean (ms) | median (ms) | max (ms)")
+    for n_buffers in [1, 2, 8]:
+        for label, module_class in [
+            ("polling", PollingLatencyModule),
+            ("event", LatencyModule),
+        ]:
+            lat = measure(module_class, n_buffers, args.n_ius)
+            lat = [l * 1000 for l in lat]
+            print(
+                "%7d | %9s | %9.3f | %11.3f | %8.3f"
+                % (
+                    n_buffers,
+                    label,
+                    statistics.mean(lat),
+                    statistics.median(lat),
+                    max(lat),
+                )
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""
+Benchmark of the pooled service client against a new connection per call.
+
+A local stub of the TRP service (HTTP/1.1 with keep-alive, a fixed inference
+time per request) is queried with the previous `requests.post` without a
+session, with the pooled client of retico.agent.service and with batches of
+concurrent queries (`post_many`). The latency per call and the latency
+histogram of the pooled client are reported.
+
+Usage:
+    $ python benchmarks/bench_service.py [--calls 200] [--inference 0.002]
+        [--batch 4]
+"""
+
+import argparse
+import json
+import statistics
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+from retico.agent.service import ServiceClient
+
+
+def stub_handler(inference):
+    class TRPHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        wbufsize = -1  # send the headers and the body in one segment
+        disable_nagle_algorithm = True
+
+        def do_POST(self):
+            data = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+            time.sleep(inference)
+            tokens = " ".join(data["text"]).split()
+            body = json.dumps({"trp": [0.1] * len(tokens), "tokens": " ".join(tokens)}).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    return TRPHandler
+
+
+def timed_calls(function, calls):
+    times = []
+    for _ in range(calls):
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+    return statistics.median(times) * 1000, statistics.mean(times) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--calls", type=int, default=200)
+    parser.add_argument("--inference", type=float, default=0.002)
+    parser.add_argument("--batch", type=int, default=4)
+    args = parser.parse_args()
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), stub_handler(args.inference))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = "http://127.0.0.1:%d/trp" % server.server_port
+    payload = {"text": ["hello there how are you doing today", "i am fine thank you"]}
+
+    def unpooled():
+        response = requests.post(url, json=payload)
+        return json.loads(response.content.decode())
+
+    client = ServiceClient()
+    client.post(url, payload)  # open the connection
+
+    print("client | median (ms) | mean (ms)")
+    median, mean = timed_calls(unpooled, args.calls)
+    print("requests.post | %.2f | %.2f" % (median, mean))
+    median, mean = timed_calls(lambda: client.post(url, payload), args.calls)
+    print("pooled | %.2f | %.2f" % (median, mean))
+
+    batch = [payload] * args.batch
+    median, _ = timed_calls(lambda: [unpooled() for _ in batch], args.calls // args.batch)
+    print("%d sequential requests.post | %.2f | -" % (args.batch, median))
+    median, _ = timed_calls(lambda: client.post_many(url, batch), args.calls // args.batch)
+    print("pooled post_many(%d) | %.2f | -" % (args.batch, median))
+
+    for endpoint, histogram in client.latencies().items():
+        print(
+            "%s: %d calls, mean %.2f ms, p50 <= %.1f ms, p95 <= %.1f ms"
+            % (
+                endpoint,
+                histogram["count"],
+                histogram["mean"] * 1000,
+                histogram["p50"] * 1000,
+                histogram["p95"] * 1000,
+            )
+        )
+    client.close()
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,149 @@
+"""
+Benchmark of the load time and memory of the simulation database.
+
+Every simulation has a caller and a callee NLG module that both need the
+database of their agent type. The previous database read the audio of every
+utterance into memory when it was created, so every simulation held two copies
+of the corpus audio. The shared database is created once per process from the
+stored index and maps the wave files, so all modules and all processes share
+the audio in the page cache.
+
+For 1, 4 and 16 concurrent simulations (processes), the time to create the
+databases and the memory of all processes (the sum of their proportional set
+sizes) after querying utterances like a simulation are reported. If no data
+directory is given, a synthetic corpus is generated.
+
+Usage:
+    $ python benchmarks/bench_simulation_db.py [--data data/sct11/audio]
+        [--sims 1 4 16] [--queries 200]
+"""
+
+import argparse
+import multiprocessing
+import os
+import random
+import tempfile
+import time
+import wave
+
+import numpy as np
+
+from retico.modules.simulation.database import simulation
+
+ACTS = ["inform:name,date", "request:date", "confirm:", "provide_info:caller_name"]
+
+
+class EagerSimulatioDB(simulation.SimulatioDB):
+    """The previous database that read all audio when it was created."""
+
+    def __init__(self, data_directory, agent_type):
+        self.act_db_eager = {}
+        for csv_f, wav_f, csv_p, wav_p in self.csv_wav_pair(data_directory):
+            for row in csv_f:
+                if len(row) != 7 or row[1] != agent_type:
+                    continue
+                data = simulation.SimulationData(wav_p, csv_p, row)
+                data.set_transcription(row[5], float(row[6]))
+                data.set_dialogue_act(row[4])
+                raw_audio = self.get_wave_data(wav_f, int(row[2]), int(row[3]))
+                data.set_audio(raw_audio, wav_f.getframerate(), wav_f.getsampwidth())
+                self.act_db_eager.setdefault(data.dialogue_act, []).append(data)
+
+    def query(self, dialogue_act, concepts):
+        return [
+            data
+            for data in self.act_db_eager.get(dialogue_act, [])
+            if set(data.concepts) == set(concepts.keys())
+        ]
+
+
+def create_corpus(folder, n_files, seconds, seed=0):
+    rng = random.Random(seed)
+    for i in range(n_files):
+        with wave.open(os.path.join(folder, "d%d.wav" % i), "wb") as wav:
+            wav.setnchannels(1)
+            wav.setsampwidth(2)
+            wav.setframerate(44100)
+            wav.writeframes(
+                np.random.default_rng(i).integers(-1000, 1000, 44100 * seconds, dtype="<i2").tobytes()
+            )
+        with open(os.path.join(folder, "d%d.txt" % i), "w") as f:
+            start = 0
+            while start < (seconds - 4) * 1000:
+                end = start + rng.randint(500, 4000)
+                agent = rng.choice(["caller", "callee"])
+                f.write("\t".join(["x", agent, str(start), str(end), rng.choice(ACTS), "text", "0.9"]) + "\n")
+                start = end
+
+
+def proportional_memory():
+    """The proportional set size of the process in bytes (Linux only). Pages
+    that are shared with other processes are divided among them, so the sum
+    over all processes is the memory they use together."""
+    with open("/proc/self/smaps_rollup") as f:
+        for line in f:
+            if line.startswith("Pss:"):
+                return int(line.split()[1]) * 1024
+    return 0
+
+
+def run_simulation(args):
+    data, shared, queries, barrier = args
+    barrier.wait()
+    memory = proportional_memory()
+    start = time.perf_counter()
+    if shared:
+        dbs = [simulation.get_database(data, agent) for agent in ["caller", "callee"]]
+    else:
+        dbs = [EagerSimulatioDB(data, agent) for agent in ["caller", "callee"]]
+    load_time = time.perf_counter() - start
+    rng = random.Random(os.getpid())
+    for i in range(queries):
+        act, _, concepts = rng.choice(ACTS).partition(":")
+        candidates = dbs[i % 2].query(act, {c: "" for c in concepts.split(",") if c})
+        if candidates:
+            len(rng.choice(candidates).generate_meta()["raw_audio"])
+    # Wait until all simulations queried the database, so that the shared
+    # pages are divided among all of them
+    barrier.wait()
+    return load_time, proportional_memory() - memory
+
+
+def benchmark(data, shared, n_sims, queries):
+    context = multiprocessing.get_context("spawn")
+    with context.Manager() as manager:
+        barrier = manager.Barrier(n_sims)
+        with context.Pool(n_sims) as pool:
+            results = pool.map(run_simulation, [(data, shared, queries, barrier)] * n_sims)
+    load_times = [r[0] for r in results]
+    memory = sum(r[1] for r in results)
+    return max(load_times), memory
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--data", type=str, default=None)
+    parser.add_argument("--sims", type=int, nargs="+", default=[1, 4, 16])
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--n_files", type=int, default=20)
+    parser.add_argument("--seconds", type=int, default=120)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        data = args.data
+        if data is None:
+            data = tmp
+            create_corpus(data, args.n_files, args.seconds)
+        # The index is stored once, like after the first simulation
+        simulation.SimulatioDB(data, "caller")
+        simulation.SimulatioDB(data, "callee")
+
+        print("database | simulations | load time (ms) | memory (MB)")
+        for n_sims in args.sims:
+            for label, shared in [("eager", False), ("shared", True)]:
+                load_time, memory = benchmark(data, shared, n_sims, args.queries)
+                print("%s | %d | %.1f | %.1f" % (label, n_sims, load_time * 1000, memory / 2**20))
+
+
+if __name__ == "__main__":
+    main()
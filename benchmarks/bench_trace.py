@@ -0,0 +1,102 @@
+"""
+Benchmark of the cost of the latency tracing of IUs.
+
+A chain of modules (a source and four modules that pass an IU on) is driven
+IU by IU in one thread, so that only the cost of the module hops is measured:
+putting an IU into a left buffer, taking it out, processing it and creating
+the next IU. The time per IU through the chain is reported with tracing
+disabled and enabled (the best of three runs), together with the time to summarize and export the
+trace.
+
+Usage:
+    $ python benchmarks/bench_trace.py [--n 20000] [--hops 4]
+"""
+
+import argparse
+import time
+
+from retico.core import abstract, trace
+
+
+class ChainIU(abstract.IncrementalUnit):
+    @staticmethod
+    def type():
+        return "Chain IU"
+
+
+class ChainModule(abstract.AbstractModule):
+    @staticmethod
+    def name():
+        return "Chain Module"
+
+    @staticmethod
+    def description():
+        return "A module that passes an IU on."
+
+    @staticmethod
+    def input_ius():
+        return [ChainIU]
+
+    @staticmethod
+    def output_iu():
+        return ChainIU
+
+    def process_iu(self, input_iu):
+        output_iu = self.create_iu(input_iu)
+        output_iu.payload = input_iu.payload
+        return output_iu
+
+
+def chain(hops):
+    modules = [ChainModule() for _ in range(hops + 1)]
+    for provider, consumer in zip(modules, modules[1:]):
+        provider.subscribe(consumer)
+    modules[-1].subscribe(ChainModule())  # the right buffer of the last module
+    return modules
+
+
+def drive(modules, n):
+    source, hops = modules[0], modules[1:]
+    start = time.perf_counter()
+    for i in range(n):
+        iu = source.create_iu()
+        iu.payload = i
+        source.append(iu)
+        for module in hops:
+            module._process_input(module._next_input(timeout=0))
+    elapsed = time.perf_counter() - start
+    for q in modules[-1].right_buffers():
+        q.queue.clear()
+    return elapsed / n * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--n", type=int, default=20000)
+    parser.add_argument("--hops", type=int, default=4)
+    args = parser.parse_args()
+
+    modules = chain(args.hops)
+    drive(modules, 1000)  # warm up
+
+    print("tracing | time per IU (us)")
+    print("disabled | %.2f" % min(drive(modules, args.n) for _ in range(3)))
+    tracer = trace.enable()
+    t = min(drive(modules, args.n) for _ in range(3))
+    trace.disable()
+    print("enabled | %.2f" % t)
+
+    start = time.perf_counter()
+    tracer.summary()
+    t_summary = time.perf_counter() - start
+    start = time.perf_counter()
+    tracer.to_chrome()
+    t_export = time.perf_counter() - start
+    print(
+        "%d events: summary %.0f ms, Chrome export %.0f ms"
+        % (len(tracer.events()), t_summary * 1000, t_export * 1000)
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,146 @@
+"""
+Benchmark of the blocking and the asynchronous TRP prediction of FC_Predict.
+
+A user turn is simulated: the ASR hypothesis grows by a word every 60-150 ms
+(and is sometimes revised to an earlier hypothesis) while the user speaks and
+the dialog loop steps every 10 ms. The prediction model is simulated with a
+fixed latency. The previous FC_Predict queried the model in the dialog loop
+for every new hypothesis after the user went silent; the current one queries
+it in the background (debounced, memoized and without stale results).
+Reported are the model calls per turn, the longest dialog loop step and the
+time from the end of the user speech to the turn-taking decision.
+
+Usage:
+    $ python benchmarks/bench_trp_prediction.py [--turns 20]
+        [--model_latency 0.08] [--words 12] [--debounce_time 0 0.05 0.15]
+"""
+
+import argparse
+import random
+import statistics
+import time
+from types import SimpleNamespace
+
+from retico.agent.memory import AgentState, Memory, UserState
+from retico.agent.policies.prediction import FC_Predict
+from retico.agent.utils import clean_whitespace
+
+LOOP_TIME = 0.01
+
+
+class SimulatedFC_Predict(FC_Predict):
+    def __init__(self, model_latency, debounce_time=0.15, **kwargs):
+        super().__init__(debounce_time=debounce_time, **kwargs)
+        self.model_latency = model_latency
+        self.model_calls = 0
+
+    def lm_prediction(self, text):
+        self.model_calls += 1
+        time.sleep(self.model_latency)
+        p = 1.0 if text[-1].endswith("done") else 0.0
+        return {"p": p, "predictions": [], "time": self.model_latency}
+
+
+class BlockingFC_Predict(SimulatedFC_Predict):
+    """The previous FC_Predict: queries the model in the dialog loop"""
+
+    def trigger_user_turn_off(self):
+        if self.cns.user_turn_active and not self.cns.vad_ipu_active:
+            current_utt = clean_whitespace(self.cns.user.prel_utterance)
+            if current_utt != "" and current_utt != self.last_current_utterance:
+                self.last_current_utterance = current_utt
+                context, _ = self.cns.memory.get_dialog_text()
+                context.append(current_utt)
+                return self.lm_prediction(context)["p"] >= self.trp_threshold
+        return False
+
+
+def hypotheses(n_words, rng):
+    """The ASR hypotheses of a turn as (time, text, user is speaking)"""
+    words = ["word%d" % rng.randrange(1000) for _ in range(n_words - 1)] + ["done"]
+    events = []
+    t = 0.0
+    for i in range(1, n_words + 1):
+        t += rng.uniform(0.06, 0.15)
+        events.append((t, " ".join(words[:i]), True))
+        if rng.random() < 0.2 and i > 1:  # revised back to the previous hypothesis
+            t += 0.03
+            events.append((t, " ".join(words[: i - 1]), True))
+            t += 0.03
+            events.append((t, " ".join(words[:i]), True))
+        if rng.random() < 0.25 and i < n_words:  # short pause within the turn
+            t += 0.1
+            events.append((t, " ".join(words[:i]), False))
+            t += 0.1
+            events.append((t, " ".join(words[:i]), True))
+    events.append((t + 0.05, " ".join(words), False))
+    return events
+
+
+def simulate(fc_class, args, seed, debounce_time=0.15):
+    rng = random.Random(seed)
+    memory = Memory()
+    agent = AgentState()
+    agent.utterance = "Hello there, how are you doing today?"
+    agent.finalize()
+    memory.update(agent, agent=True)
+    cns = SimpleNamespace(memory=memory, user=None, user_turn_active=False, vad_ipu_active=False)
+    fc = fc_class(
+        args.model_latency, debounce_time, central_nervous_system=cns, trp_threshold=0.5
+    )
+    fc.predictor.start()
+
+    calls, steps, reactions = [], [], []
+    for _ in range(args.turns):
+        cns.user = UserState()
+        cns.user_turn_active = True
+        events = hypotheses(args.words, rng)
+        calls_before = fc.model_calls
+        start = time.perf_counter()
+        i = 0
+        silent_since = None
+        while True:
+            now = time.perf_counter() - start
+            while i < len(events) and events[i][0] <= now:
+                _, cns.user.prel_utterance, cns.vad_ipu_active = events[i]
+                i += 1
+                if i == len(events):
+                    silent_since = time.perf_counter()
+            t = time.perf_counter()
+            respond = fc.trigger_user_turn_off()
+            steps.append(time.perf_counter() - t)
+            if respond and silent_since is not None:
+                reactions.append(time.perf_counter() - silent_since)
+                break
+            time.sleep(LOOP_TIME)
+        cns.user.utterance = cns.user.prel_utterance
+        cns.user.finalize()
+        memory.update(cns.user)
+        cns.user_turn_active = False
+        calls.append(fc.model_calls - calls_before)
+
+    fc.predictor.stop()
+    return statistics.mean(calls), max(steps), statistics.median(reactions)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--turns", type=int, default=20)
+    parser.add_argument("--model_latency", type=float, default=0.08)
+    parser.add_argument("--words", type=int, default=12)
+    parser.add_argument("--debounce_time", type=float, nargs="+", default=[0, 0.05, 0.15])
+    args = parser.parse_args()
+
+    print("policy | model calls per turn | max loop step (ms) | reaction (ms)")
+    calls, step, reaction = simulate(BlockingFC_Predict, args, seed=0)
+    print("blocking | %.1f | %.1f | %.1f" % (calls, step * 1000, reaction * 1000))
+    for debounce_time in args.debounce_time:
+        calls, step, reaction = simulate(SimulatedFC_Predict, args, 0, debounce_time)
+        print(
+            "async (debounce %d ms) | %.1f | %.1f | %.1f"
+            % (debounce_time * 1000, calls, step * 1000, reaction * 1000)
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,203 @@
+"""
+Benchmark of the time-to-first-audio of streaming and non-streaming TTS.
+
+A TTS module with a simulated cloud synthesis (a fixed request latency plus a
+latency per word) either synthesizes the whole utterance into one SpeechIU or
+streams it phrase by phrase (see retico.core.audio.tts). The time from the
+creation of the text IU until the first chunk of audio is dispatched by the
+AudioDispatcherModule is reported for utterances of different lengths. The
+utterance is interrupted after its first audio, which also stops the synthesis
+of the remaining phrases of a stream.
+
+Usage:
+    $ python benchmarks/bench_tts_streaming.py [--words 5 10 20 40 80]
+        [--request_latency 0.1] [--word_latency 0.02] [--repetitions 5]
+"""
+
+import argparse
+import statistics
+import threading
+import time
+
+from retico.core import abstract
+from retico.core.audio.common import SpeechIU, DispatchedAudioIU
+from retico.core.audio.io import AudioDispatcherModule
+from retico.core.audio.tts import stream_speech
+
+RATE = 16000
+SAMPLE_WIDTH = 2
+CHUNK_TIME = 0.01
+WORD_DURATION = 0.3
+PHRASE_WORDS = 6
+
+
+class TextIU(abstract.IncrementalUnit):
+    @staticmethod
+    def type():
+        return "Benchmark Text IU"
+
+    def get_text(self):
+        return self.payload
+
+
+class TextSourceModule(abstract.AbstractModule):
+    @staticmethod
+    def name():
+        return "Benchmark Text Source"
+
+    @staticmethod
+    def description():
+        return "A module that only serves as the provider of a queue."
+
+    @staticmethod
+    def input_ius():
+        return []
+
+    @staticmethod
+    def output_iu():
+        return TextIU
+
+
+class FakeTTSModule(abstract.AbstractModule):
+    @staticmethod
+    def name():
+        return "Fake TTS Module"
+
+    @staticmethod
+    def description():
+        return "A module that simulates a cloud TTS request."
+
+    @staticmethod
+    def input_ius():
+        return [TextIU]
+
+    @staticmethod
+    def output_iu():
+        return SpeechIU
+
+    def __init__(self, request_latency, word_latency, streaming, **kwargs):
+        super().__init__(**kwargs)
+        self.request_latency = request_latency
+        self.word_latency = word_latency
+        self.streaming = streaming
+
+    def synthesize(self, text):
+        words = text.split()
+        time.sleep(self.request_latency + self.word_latency * len(words))
+        duration = WORD_DURATION * len(words)
+        raw_audio = b"\1\0" * int(RATE * duration)
+        info = {
+            "words": words,
+            "starts": [i * WORD_DURATION for i in range(len(words))],
+            "ends": [(i + 1) * WORD_DURATION for i in range(len(words))],
+            "duration": duration,
+        }
+        return raw_audio, info
+
+    def process_iu(self, input_iu):
+        if self.streaming and input_iu.dispatch:
+            for output_iu in stream_speech(self, input_iu, self.synthesize, RATE, SAMPLE_WIDTH):
+                self.append(output_iu)
+            return None
+        output_iu = self.create_iu(input_iu)
+        if input_iu.dispatch:
+            raw_audio, info = self.synthesize(input_iu.get_text())
+            output_iu.set_audio(raw_audio, len(raw_audio) // SAMPLE_WIDTH, RATE, SAMPLE_WIDTH)
+            for name, value in info.items():
+                setattr(output_iu, name, value)
+        output_iu.dispatch = input_iu.dispatch
+        return output_iu
+
+
+class FirstAudioModule(abstract.AbstractConsumingModule):
+    @staticmethod
+    def name():
+        return "First Audio Module"
+
+    @staticmethod
+    def description():
+        return "A module that records the time until audio is dispatched."
+
+    @staticmethod
+    def input_ius():
+        return [DispatchedAudioIU]
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.text_iu = None
+        self.first_audio = None
+        self.received = threading.Event()
+
+    def process_iu(self, input_iu):
+        if not input_iu.is_dispatching or self.received.is_set():
+            return
+        if input_iu.grounded_in.grounded_in is self.text_iu:
+            self.first_audio = time.perf_counter() - self.text_iu.created
+            self.received.set()
+
+
+def utterance(n_words):
+    words = []
+    for i in range(n_words):
+        word = "word%d" % i
+        if (i + 1) % PHRASE_WORDS == 0 or i == n_words - 1:
+            word += ","
+        words.append(word)
+    return " ".join(words)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--words", type=int, nargs="+", default=[5, 10, 20, 40, 80])
+    parser.add_argument("--request_latency", type=float, default=0.1)
+    parser.add_argument("--word_latency", type=float, default=0.02)
+    parser.add_argument("--repetitions", type=int, default=5)
+    args = parser.parse_args()
+
+    print("words | whole (ms) | streaming (ms)")
+    results = {}
+    for streaming in [False, True]:
+        source = TextSourceModule()
+        tts = FakeTTSModule(args.request_latency, args.word_latency, streaming)
+        dispatcher = AudioDispatcherModule(int(CHUNK_TIME * RATE), rate=RATE, sample_width=SAMPLE_WIDTH)
+        consumer = FirstAudioModule()
+        source.subscribe(tts)
+        tts.subscribe(dispatcher)
+        dispatcher.subscribe(consumer)
+        modules = [source, tts, dispatcher, consumer]
+        for module in modules:
+            module.run()
+
+        for n_words in args.words:
+            latencies = []
+            for _ in range(args.repetitions):
+                iu = source.create_iu()
+                iu.payload = utterance(n_words)
+                iu.dispatch = True
+                iu.created = time.perf_counter()
+                consumer.text_iu = iu
+                consumer.received.clear()
+                source.append(iu)
+                consumer.received.wait(30)
+                latencies.append(consumer.first_audio)
+
+                # interrupt the utterance
+                stop_iu = source.create_iu()
+                stop_iu.payload = ""
+                stop_iu.dispatch = False
+                source.append(stop_iu)
+                time.sleep(0.1)
+            results[(n_words, streaming)] = statistics.median(latencies)
+
+        for module in modules:
+            module.stop()
+
+    for n_words in args.words:
+        print(
+            "%d | %.1f | %.1f"
+            % (n_words, results[(n_words, False)] * 1000, results[(n_words, True)] * 1000)
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,164 @@
+"""
+Benchmark and check of the VAD smoothing with running window counts.
+
+The VADModule is compared to the previous implementation that rebuilt its six
+frame buffers with np.concatenate on every frame, and to the batch replay of a
+whole stream of VadIUs. The per-frame cost of the incremental versions and the
+time of the batch replay are reported and all three are checked to produce the
+same state changes.
+
+The frame states are taken from recorded sessions (the user audio of an agent
+session, framed and labeled with webrtcvad) or, if no recording is given, from
+a synthetic stream of speech and silence segments.
+
+Usage:
+    $ python benchmarks/bench_vad.py [--wav session/hearing/user_audio.wav ...]
+        [--chunk_time 0.01] [--n_frames 100000]
+"""
+
+import argparse
+import time
+import wave
+
+import numpy as np
+
+from retico.agent.common import VadIU
+from retico.agent.vad import VADModule
+
+EVENTS = {
+    VADModule.EVENT_VAD_TURN_CHANGE: "turn",
+    VADModule.EVENT_VAD_IPU_CHANGE: "ipu",
+    VADModule.EVENT_VAD_FAST_CHANGE: "fast",
+}
+
+
+class RecordingVADModule(VADModule):
+    """A VADModule that records its events instead of calling them."""
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.frame = -1
+        self.changes = {name: [] for name in EVENTS.values()}
+
+    def event_call(self, event_name, data={}):
+        self.changes[EVENTS[event_name]].append((self.frame, data["active"]))
+
+    def process_iu(self, input_iu):
+        self.frame += 1
+        return super().process_iu(input_iu)
+
+
+class ConcatenateVADModule(RecordingVADModule):
+    """The VADModule with the previous np.concatenate frame buffers."""
+
+    def create_buffers(self):
+        for name, onset, offset in [
+            ("turn", self.turn_onset, self.turn_offset),
+            ("ipu", self.ipu_onset, self.ipu_offset),
+            ("fast", self.fast_onset, self.fast_offset),
+        ]:
+            setattr(self, name + "_off_buffer", np.zeros(int(offset / self.chunk_time)))
+            setattr(self, name + "_on_buffer", np.zeros(int(onset / self.chunk_time)))
+
+    def add_state(self, is_speaking):
+        is_silent = (not is_speaking) * 1.0
+        is_speaking *= 1.0
+        for name in ["turn", "ipu", "fast"]:
+            on_buffer = getattr(self, name + "_on_buffer")
+            off_buffer = getattr(self, name + "_off_buffer")
+            setattr(
+                self,
+                name + "_on_buffer",
+                np.concatenate((on_buffer[1:], np.array((is_speaking,)))),
+            )
+            setattr(
+                self,
+                name + "_off_buffer",
+                np.concatenate((off_buffer[1:], np.array((is_silent,)))),
+            )
+
+
+def frames_from_wav(path, chunk_time, mode=3):
+    import webrtcvad
+
+    vad = webrtcvad.Vad(mode=mode)
+    with wave.open(path, "rb") as wav:
+        sample_rate = wav.getframerate()
+        sample_width = wav.getsampwidth()
+        audio = wav.readframes(wav.getnframes())
+    chunk_width = int(chunk_time * sample_rate) * sample_width
+    view = memoryview(audio)
+    return [
+        vad.is_speech(view[i : i + chunk_width], sample_rate)
+        for i in range(0, len(audio) - chunk_width + 1, chunk_width)
+    ]
+
+
+def synthetic_frames(n_frames, seed=0):
+    rng = np.random.default_rng(seed)
+    frames = []
+    speaking = False
+    while len(frames) < n_frames:
+        length = rng.integers(5, 150)
+        # Noisy segments, like webrtcvad labels of real speech and silence
+        p = 0.9 if speaking else 0.1
+        frames.extend((rng.random(length) < p).tolist())
+        speaking = not speaking
+    return frames[:n_frames]
+
+
+def run_incremental(module_class, frames, kwargs):
+    module = module_class(**kwargs)
+    ius = []
+    for is_speaking in frames:
+        iu = VadIU()
+        iu.is_speaking = is_speaking
+        ius.append(iu)
+    start = time.perf_counter()
+    for iu in ius:
+        module.process_iu(iu)
+    return time.perf_counter() - start, module.changes
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--wav", type=str, nargs="*", default=[])
+    parser.add_argument("--chunk_time", type=float, default=0.01)
+    parser.add_argument("--n_frames", type=int, default=100000)
+    args = parser.parse_args()
+
+    kwargs = dict(
+        chunk_time=args.chunk_time,
+        onset_time=0.15,
+        turn_offset=0.75,
+        ipu_offset=0.2,
+        fast_offset=0.1,
+        prob_thresh=0.95,
+    )
+    if args.wav:
+        streams = [(path, frames_from_wav(path, args.chunk_time)) for path in args.wav]
+    else:
+        streams = [("synthetic", synthetic_frames(args.n_frames))]
+
+    print("stream | frames | concatenate (us/frame) | running (us/frame) | batch (ms) | equal")
+    for label, frames in streams:
+        t_concat, concat = run_incremental(ConcatenateVADModule, frames, kwargs)
+        t_running, running = run_incremental(RecordingVADModule, frames, kwargs)
+        start = time.perf_counter()
+        batch = VADModule(**kwargs).replay(frames)
+        t_batch = time.perf_counter() - start
+        print(
+            "%s | %d | %.2f | %.2f | %.2f | %s"
+            % (
+                label,
+                len(frames),
+                t_concat / len(frames) * 1e6,
+                t_running / len(frames) * 1e6,
+                t_batch * 1000,
+                concat == running == batch,
+            )
+        )
+
+
+if __name__ == "__main__":
+    main()
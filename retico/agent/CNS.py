@@ -223,7 +223,7 @@ class CNS(AbstractModule):
         self.memory.start_time = time.time()
         super().run(**kwargs)
 
-    def save(self, savepath):
+    def save(self, savepath, tts_cache=None, service_latency=None):
         turns = self.memory.finalize_turns()
 
         states = []
@@ -252,6 +252,10 @@ class CNS(AbstractModule):
             ),
             "dialog_states": states,
         }
+        if tts_cache is not None:
+            data["tts_cache"] = tts_cache
+        if service_latency is not None:
+            data["service_latency"] = service_latency
 
         dirpath = split(savepath)[0]
         if dirpath != "":
@@ -1,10 +1,13 @@
 from argparse import ArgumentParser
 from os.path import join, exists
 from os import makedirs
-import subprocess
 from datetime import datetime
 
-from retico.agent import Hearing, Speech
+from retico.core.abstract import IncrementalQueue
+from retico.core.aio import EventLoopRunner
+from retico.core.audio import convert
+from retico.agent import Hearing, Speech, service
+from retico.agent.hearing import ASR_BUFFER_SIZE
 from retico.agent.CNS import CNS
 from retico.agent.dm.dm import DM, DM_LM, DMExperiment
 from retico.agent.policies import FC_Baseline, FC_BaselineVad, FC_EOT, FC_Predict
@@ -14,6 +17,7 @@ from retico.agent.vad import VADModule
 
 class Agent:
     POLICIES = ["baseline", "baselinevad", "eot", "prediction"]
+    RUNTIMES = ["thread", "asyncio"]
     """
     Agent
 
@@ -41,6 +45,7 @@ class Agent:
         record=True,
         bypass=False,
         verbose=False,
+        runtime="thread",
         tts_cache_path="/home/erik/.cache/agent/tts",
         root="/home/erik/.cache/agent",
     ):
@@ -48,6 +53,9 @@ class Agent:
         assert (
             policy in self.POLICIES
         ), f"Policy ({policy}) is not implemented. Please choose {self.POLICIES}"
+        assert (
+            runtime in self.RUNTIMES
+        ), f"Runtime ({runtime}) is not implemented. Please choose {self.RUNTIMES}"
 
         self.policy = policy
         self.dm_type = dm_type
@@ -63,7 +71,9 @@ class Agent:
         self.record = record
         self.verbose = verbose
         self.bypass = bypass
+        self.runtime = runtime
         self.root = root
+        self.runner = EventLoopRunner() if runtime == "asyncio" else None
 
         # ---------------------------------------------
         makedirs(self.root, exist_ok=True)
@@ -92,6 +102,7 @@ class Agent:
             cache_dir=tts_cache_path,
             result_dir=self.session_dir,
             debug=False,
+            runner=self.runner,
         )
 
         self.vad = VADModule(
@@ -106,7 +117,8 @@ class Agent:
 
         # Connect incremental components
         self.cns.subscribe(self.speech.tts)
-        self.hearing.asr.subscribe(self.cns)
+        # earlier hypotheses that the CNS did not take yet are replaced by the latest one
+        self.hearing.asr.subscribe(self.cns, maxsize=ASR_BUFFER_SIZE, overflow=IncrementalQueue.COALESCE)
         self.hearing.vad_frames.subscribe(self.vad)
         self.speech.audio_dispatcher.subscribe(self.cns)
         self.vad.event_subscribe(self.vad.EVENT_VAD_IPU_CHANGE, self.cns.vad_callback)
@@ -137,6 +149,7 @@ class Agent:
             self.fcortex = FC_Predict(
                 dm=self.dm,
                 central_nervous_system=self.cns,
+                prefetcher=self.speech.prefetcher,
                 fallback_duration=fallback_duration,
                 trp_threshold=trp,
                 verbose=verbose,
@@ -146,6 +159,7 @@ class Agent:
             self.fcortex = FC_EOT(
                 dm=self.dm,
                 central_nervous_system=self.cns,
+                prefetcher=self.speech.prefetcher,
                 trp_threshold=trp,
                 fallback_duration=fallback_duration,
                 verbose=verbose,
@@ -155,6 +169,7 @@ class Agent:
             self.fcortex = FC_BaselineVad(
                 dm=self.dm,
                 central_nervous_system=self.cns,
+                prefetcher=self.speech.prefetcher,
                 fallback_duration=fallback_duration,
                 verbose=verbose,
             )
@@ -163,6 +178,7 @@ class Agent:
             self.fcortex = FC_Baseline(
                 dm=self.dm,
                 central_nervous_system=self.cns,
+                prefetcher=self.speech.prefetcher,
                 fallback_duration=fallback_duration,
                 verbose=verbose,
             )
@@ -184,6 +200,7 @@ class Agent:
             "trp": self.trp,
             "verbose": self.verbose,
             "bypass": self.bypass,
+            "runtime": self.runtime,
             "date": datetime.now().strftime("%Y-%m-%d_%H:%M"),
         }
 
@@ -200,8 +217,7 @@ class Agent:
 
         comb_wav = join(self.session_dir, "dialog.wav")
 
-        cmd = ["sox", "-M", agent_wav, user_wav, comb_wav]
-        subprocess.call(cmd)
+        convert.merge_wavs([agent_wav, user_wav], comb_wav)
         print("Joined audio -> ", comb_wav)
 
     @staticmethod
@@ -224,6 +240,7 @@ class Agent:
         parser.add_argument("--backchannel_prob", type=float, default=0.5)
         parser.add_argument("--bypass", action="store_true")
         parser.add_argument("--verbose", action="store_true")
+        parser.add_argument("--runtime", type=str, default="thread")
         return parser
 
     def start(self):
@@ -231,7 +248,7 @@ class Agent:
         self.vad.run()
         self.hearing.run()
         self.speech.run()
-        self.fcortex.start_loop()
+        self.fcortex.start_loop(runner=self.runner)
 
         input("DIALOG\n")
         self.fcortex.dialog_ended = True
@@ -240,7 +257,14 @@ class Agent:
         self.speech.stop()
         self.vad.stop()
         self.cns.stop()
-        self.cns.save(join(self.session_dir, "dialog.json"))
+        tts_cache = None
+        if self.speech.prefetcher is not None:
+            tts_cache = self.speech.prefetcher.stats()
+        self.cns.save(
+            join(self.session_dir, "dialog.json"),
+            tts_cache=tts_cache,
+            service_latency=service.get_client().latencies(),
+        )
         self.join_audio()
         self.hearing.asr.active = False
 
@@ -271,6 +295,7 @@ if __name__ == "__main__":
         trp=args.trp,
         verbose=args.verbose,
         bypass=args.bypass,
+        runtime=args.runtime,
         root=args.root,
     )
 
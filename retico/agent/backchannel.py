@@ -1,5 +1,3 @@
-import requests
-import json
 import time
 
 import wave
@@ -9,6 +7,7 @@ from retico.core.audio.io import AudioIU
 from retico.core.audio.io import SpeakerModule
 from retico.core.text.common import SpeechRecognitionIU
 
+from retico.agent import service
 from retico.agent.vad import VadIU
 from retico.agent.utils import Color as C
 
@@ -73,8 +72,7 @@ class BackChannelModule(AbstractConsumingModule):
 
     def get_eot(self, text):
         json_data = {"text": text}
-        response = requests.post(URL_TRP, json=json_data)
-        d = json.loads(response.content.decode())
+        d = service.post(URL_TRP, json_data)
         return d["trp"][-1]  # only care about last token
 
     def handle_asr(self, input_iu):
@@ -4,6 +4,8 @@ from retico.core.abstract import IncrementalUnit
 
 
 class VadIU(IncrementalUnit):
+    __slots__ = ("is_speaking", "silence_time")
+
     @staticmethod
     def type():
         return "Vad IU"
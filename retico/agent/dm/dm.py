@@ -1,8 +1,8 @@
 from argparse import ArgumentParser
-import requests
-import json
+from collections import Counter
 import random
 
+from retico.agent import service
 from retico.agent.utils import read_json
 
 QUESTIONS = [
@@ -61,16 +61,21 @@ URL_RANK = "http://localhost:5001/response_ranking"
 class DMBase:
     def rank_responses(self, context, responses):
         json_data = {"context": context, "responses": responses}
-        response = requests.post(URL_RANK, json=json_data)
-        d = json.loads(response.content.decode())
+        d = service.post(URL_RANK, json_data)
         return d["response"], d
 
     def generate_response(self, context):
         json_data = {"text": context}
-        response = requests.post(URL_SAMPLE, json=json_data)
-        d = json.loads(response.content.decode())
+        d = service.post(URL_SAMPLE, json_data)
         return d["response"]
 
+    def get_candidates(self, context=None, k=4, no_rank=True):
+        """
+        Returns up to `k` responses that `get_response` may return next (most likely first) without changing the
+        state of the dialog. Used to prefetch the synthesis of the next response.
+        """
+        return []
+
 
 class DM(DMBase):
     def __init__(self, questions=None, n_follow_ups=2):
@@ -127,6 +132,17 @@ class DM(DMBase):
                     end = False
         return response, end
 
+    def get_candidates(self, context=None, k=4, no_rank=True):
+        if context is None:
+            candidates = [self.questions[0]["question"]] if self.questions else []
+        elif len(self.questions) == 0:
+            candidates = ["Dialog Done"]
+        elif self.n_current_follow_ups >= self.n_follow_ups:
+            candidates = [q["question"] for q in self.questions]
+        else:
+            candidates = list(self.current_follow_ups)
+        return candidates[:k]
+
 
 class DM_LM(object):
     def __init__(self, initial_utterance="Hello there, how can I help you?"):
@@ -138,11 +154,14 @@ class DM_LM(object):
             utterance = self.initial_utterance
         else:
             json_data = {"text": turns}
-            response = requests.post(URL_SAMPLE, json=json_data)
-            d = json.loads(response.content.decode())
+            d = service.post(URL_SAMPLE, json_data)
             utterance = d["response"]
         return utterance, end, None
 
+    def get_candidates(self, turns=None, k=4, no_rank=True):
+        # generated responses are not known in advance
+        return [self.initial_utterance] if turns is None else []
+
 
 class DMExperiment(DMBase):
     TASKS = ["travel_a", "travel_b", "travel_c", "exercise", "food", "hobbies"]
@@ -216,6 +235,33 @@ class DMExperiment(DMBase):
             questions += self.answers
         return questions
 
+    def get_candidates(self, context=None, k=4, no_rank=True):
+        if self.response_count == 0:
+            return self.dialog["introduction"][:1]
+
+        candidates = []
+        current_user_turn = context[-1] if context else ""
+        if (
+            self.response_count > 1
+            and len(current_user_turn.split()) <= self.short_heuristic_cutoff
+            and self.last_response != "elaborate"
+        ):
+            candidates += self.elaborate
+
+        questions = self.dialog["questions"] + self.answers
+        if len(questions) == 0:
+            candidates.append(
+                "Thank you for answering my questions. This session is over. Goodbye."
+            )
+        else:
+            # without ranking the first question is asked, otherwise any question may be ranked first
+            if no_rank:
+                questions = questions[:1]
+            segways = [segway for segway, _ in Counter(self.segways).most_common()]
+            for segway in segways:
+                candidates += [segway + " " + question for question in questions]
+        return candidates[:k]
+
     def pop_response(self, response):
         kind = None
         pop_index = 1
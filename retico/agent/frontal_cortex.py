@@ -1,3 +1,4 @@
+import asyncio
 import threading
 import time
 
@@ -24,6 +25,8 @@ class FrontalCortexBase:
         no_rank=True,
         verbose=False,
         show_dialog=False,
+        prefetcher=None,
+        prefetch_k=6,
     ):
         self.cns = central_nervous_system
         self.speak_first = speak_first
@@ -44,6 +47,11 @@ class FrontalCortexBase:
 
         self.last_agent_trigger_on = False
 
+        # prefetch the synthesis of the next response while the user is speaking
+        self.prefetcher = prefetcher
+        self.prefetch_k = prefetch_k
+        self._prefetch_state = None
+
     @property
     def both_active(self):
         return self.cns.agent_turn_active and self.cns.user_turn_active
@@ -90,6 +98,34 @@ class FrontalCortexBase:
 
         return None
 
+    def get_context(self):
+        """The dialog text including the ongoing user turn"""
+        context, last_speaker = self.cns.memory.get_dialog_text()
+        if last_speaker != "user":
+            if self.cns.user.utterance != "":
+                context.append(self.cns.user.utterance)
+            elif self.cns.user.prel_utterance != "":
+                context.append(self.cns.user.prel_utterance)
+        return context
+
+    def prefetch_responses(self):
+        """
+        Updates the candidates for the next response that are synthesized in the background while the user speaks.
+        The candidates only change when the user utterance (or the last agent utterance) changes.
+        """
+        if self.prefetcher is None or self.dm is None or not self.cns.user_turn_active:
+            return
+        if len(self.cns.memory.turns_user) + len(self.cns.memory.turns_agent) == 0:
+            return
+        state = (self.cns.agent.planned_utterance, self.cns.user.prel_utterance)
+        if state == self._prefetch_state:
+            return
+        self._prefetch_state = state
+        candidates = self.dm.get_candidates(
+            self.get_context(), k=self.prefetch_k, no_rank=self.no_rank
+        )
+        self.prefetcher.update(candidates)
+
     def get_response_and_speak(self, response=None, fallback=False):
         """
         The speak action of the agent.
@@ -108,24 +144,14 @@ class FrontalCortexBase:
             self.cns.finalize_user()
             self.cns.init_agent_turn("This is me talking.")
         elif self.no_rank:
-            context, last_speaker = self.cns.memory.get_dialog_text()
-            if last_speaker != "user":
-                if self.cns.user.utterance != "":
-                    context.append(self.cns.user.utterance)
-                elif self.cns.user.prel_utterance != "":
-                    context.append(self.cns.user.prel_utterance)
+            context = self.get_context()
             (planned_utterance, dialog_ended, data) = self.dm.get_response(
                 context, no_rank=True
             )
             self.cns.finalize_user()
             self.cns.init_agent_turn(planned_utterance, fallback)
         else:
-            context, last_speaker = self.cns.memory.get_dialog_text()
-            if last_speaker != "user":
-                if self.cns.user.utterance != "":
-                    context.append(self.cns.user.utterance)
-                elif self.cns.user.prel_utterance != "":
-                    context.append(self.cns.user.prel_utterance)
+            context = self.get_context()
             (planned_utterance, dialog_ended, data) = self.dm.get_response(context)
             self.cns.finalize_user()
             self.cns.init_agent_turn(planned_utterance, fallback)
@@ -168,7 +194,7 @@ class FrontalCortexBase:
         else:
             self.cns.dialog_states[-2]["state"] = self.BOTH_ACTIVE
             self.cns.dialog_states[-1]["state"] = self.BOTH_ACTIVE
-        self.cns.init_user_turn(self.cns.memory.turns_user.pop(-1))
+        self.cns.init_user_turn(self.cns.memory.pop_user_turn())
 
     def is_interrupted(self):
         if self.cns.agent.completion <= self.interuption_ratio:
@@ -226,20 +252,56 @@ class FrontalCortexBase:
                     ret = True
         return ret
 
-    def start_loop(self):
+    def start_loop(self, runner=None):
         """Prepares the dialogue_loop and the DialogueState of the agent and the
         interlocutor by resetting the timers.
-        This method starts the dialogue_loop."""
-        self.t = threading.Thread(target=self.dialog_loop)
+        This method starts the dialogue_loop.
+
+        Args:
+            runner (EventLoopRunner): If given, the dialog loop runs as a
+                coroutine on the event loop of the runner instead of a thread.
+        """
         now = time.time()
         self.cns.start_time = now
         self.cns.memory.start_time = now
-        self.t.start()
+        if runner is not None:
+            self.t = runner.submit(self.dialog_loop_async())
+        else:
+            self.t = threading.Thread(target=self.dialog_loop)
+            self.t.start()
 
     def stop_loop(self):
-        self.t.join()
+        if isinstance(self.t, threading.Thread):
+            self.t.join()
+        else:
+            self.t.result()
         print("Stopped dialog loop")
 
+    def speak_first_response(self):
+        planned_utterance, dialog_ended, _ = self.dm.get_response()
+        print("spoke first")
+        self.cns.init_agent_turn(planned_utterance)
+
+    def dialog_step(self):
+        """A single update of the dialog loop."""
+        self.trigger_user_turn_on()
+        self.prefetch_responses()
+        if self.trigger_user_turn_off():
+            if not self.cns.agent_turn_active:
+                self.get_response_and_speak()
+        else:
+            self.fallback_inactivity()
+
+        # updates the state if necessary
+        current_state = self.update_dialog_state()
+        # if current_state == self.BOTH_ACTIVE:
+        #     if self.is_interrupted():
+        if self.cns.vad_ipu_active and self.cns.agent_turn_active:
+            if self.is_interrupted():
+                self.should_repeat()
+                self.cns.stop_speech(finalize=True)
+                self.retrigger_user_turn()  # put after stop speech
+
     def dialog_loop(self):
         """
         A constant loop which looks at the internal state of the agent, the estimated state of the user and the dialog
@@ -247,29 +309,27 @@ class FrontalCortexBase:
 
         """
         if self.speak_first:
-            planned_utterance, dialog_ended, _ = self.dm.get_response()
-            print("spoke first")
-            self.cns.init_agent_turn(planned_utterance)
+            self.speak_first_response()
 
         while not self.dialog_ended:
             time.sleep(self.LOOP_TIME)
+            self.dialog_step()
 
-            self.trigger_user_turn_on()
-            if self.trigger_user_turn_off():
-                if not self.cns.agent_turn_active:
-                    self.get_response_and_speak()
-            else:
-                self.fallback_inactivity()
-
-            # updates the state if necessary
-            current_state = self.update_dialog_state()
-            # if current_state == self.BOTH_ACTIVE:
-            #     if self.is_interrupted():
-            if self.cns.vad_ipu_active and self.cns.agent_turn_active:
-                if self.is_interrupted():
-                    self.should_repeat()
-                    self.cns.stop_speech(finalize=True)
-                    self.retrigger_user_turn()  # put after stop speech
+        print("======== DIALOG DONE ========")
+
+    async def dialog_loop_async(self):
+        """
+        The dialog loop as a coroutine. The steps may call the (blocking) dialog
+        manager, so they are executed in the executor of the event loop while
+        the waiting between the steps does not occupy a thread.
+        """
+        loop = asyncio.get_running_loop()
+        if self.speak_first:
+            await loop.run_in_executor(None, self.speak_first_response)
+
+        while not self.dialog_ended:
+            await asyncio.sleep(self.LOOP_TIME)
+            await loop.run_in_executor(None, self.dialog_step)
 
         print("======== DIALOG DONE ========")
 
@@ -5,7 +5,7 @@ import pyaudio
 from os import makedirs
 from os.path import join
 
-from retico.core.abstract import AbstractConsumingModule, AbstractProducingModule
+from retico.core.abstract import AbstractConsumingModule, AbstractProducingModule, IncrementalQueue
 from retico.core.audio.common import AudioIU
 from retico.core.audio.io import MicrophoneModule, AudioRecorderModule
 from retico.core.debug.general import CallbackModule
@@ -20,6 +20,8 @@ from retico.agent.utils import Color as C
 from os import environ
 
 CHANNELS = 1
+VAD_BUFFER_TIME = 1.0  # seconds of audio queued for the VAD before the oldest chunks are dropped
+ASR_BUFFER_SIZE = 8  # ASR hypotheses queued for a consumer before earlier revisions are coalesced
 
 # logging.basicConfig(filename="Hearing.log", level=logging.INFO)
 
@@ -237,7 +239,12 @@ class Hearing(object):
             mode=3,
             debug=debug,
         )
-        self.in_mic.subscribe(self.vad_frames)
+        # the VAD only needs recent audio, stale chunks are dropped if it falls behind
+        self.in_mic.subscribe(
+            self.vad_frames,
+            maxsize=max(1, int(VAD_BUFFER_TIME / self.chunk_time)),
+            overflow=IncrementalQueue.DROP_OLDEST,
+        )
 
         # Optional Components
         if self.use_asr:
@@ -252,7 +259,7 @@ class Hearing(object):
             self.iasr = IncrementalizeASRModule(
                 threshold=0.8
             )  # Gets only the newly added words at each increment
-            self.asr.subscribe(self.iasr)
+            self.asr.subscribe(self.iasr, maxsize=ASR_BUFFER_SIZE, overflow=IncrementalQueue.COALESCE)
 
         if self.record:
             self.cache_dir = join(cache_dir, "hearing")
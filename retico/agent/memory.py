@@ -1,6 +1,7 @@
 from os import makedirs
 from os.path import split
 from retico.agent.utils import clean_whitespace, write_json
+import bisect
 import time
 
 
@@ -60,42 +61,110 @@ class AgentState(StateCommon):
 
 
 class Memory:
+    """
+    The finalized turns of the dialog.
+
+    The turns are kept in order of their start time and the dialog text (consecutive turns of the same speaker merged)
+    is updated when a turn is added, so the context of the language models does not have to be rebuilt on every ASR
+    update. Turns should only be added with `update` and removed with `pop_user_turn`.
+    """
+
     def __init__(self):
         self.turns_agent = []
         self.turns_user = []
         self.start_time = 0.0
 
+        self.turns = []  # all turns sorted by start time
+        self._start_times = []
+        self._dialog = []  # the merged utterances
+        self._last_name = None
+        self._snapshot = {}  # speaker -> (last added turn, its utterance)
+        self._windows = {}
+        self.version = 0
+
     def update(self, turn, agent=False):
         if agent:
             self.turns_agent.append(turn)
         else:
             self.turns_user.append(turn)
 
+        i = bisect.bisect_right(self._start_times, turn.start_time)
+        self._start_times.insert(i, turn.start_time)
+        self.turns.insert(i, turn)
+        if i == len(self.turns) - 1 and not self._changed():
+            self._append_dialog(turn)
+        else:
+            self._rebuild_dialog()
+        self._snapshot[turn.name] = (turn, turn.utterance)
+        self._windows.clear()
+        self.version += 1
+
+    def pop_user_turn(self):
+        """Removes and returns the last user turn (e.g. to continue it after an erroneous end-of-turn guess)"""
+        turn = self.turns_user.pop(-1)
+        i = len(self.turns) - 1 - self.turns[::-1].index(turn)
+        self.turns.pop(i)
+        self._start_times.pop(i)
+        if self._snapshot.get(turn.name, (None,))[0] is turn:
+            del self._snapshot[turn.name]
+        self._rebuild_dialog()
+        self._windows.clear()
+        self.version += 1
+        return turn
+
     def get_turns(self):
-        turns = self.turns_agent + self.turns_user
-        turns.sort(key=lambda x: x.start_time)
-        return turns
+        return list(self.turns)
+
+    def _changed(self):
+        """The current turns of the CNS are updated in place (e.g. by a late ASR result) after they are added"""
+        for turn, utterance in self._snapshot.values():
+            if turn.utterance != utterance:
+                return True
+        return False
+
+    def _append_dialog(self, turn):
+        if not self._dialog:
+            self._dialog.append(clean_whitespace(turn.utterance))
+            self._last_name = turn.name
+        elif turn.utterance == "":
+            return
+        elif turn.name == self._last_name:
+            self._dialog[-1] = clean_whitespace(
+                self._dialog[-1] + " " + clean_whitespace(turn.utterance)
+            )
+        else:
+            self._dialog.append(clean_whitespace(turn.utterance))
+            self._last_name = turn.name
+
+    def _rebuild_dialog(self):
+        self._dialog = []
+        self._last_name = None
+        for turn in self.turns:
+            self._append_dialog(turn)
+        self._snapshot = {name: (t, t.utterance) for name, (t, _) in self._snapshot.items()}
+
+    def _check_current(self):
+        if self._changed():
+            self._rebuild_dialog()
+            self._windows.clear()
+            self.version += 1
 
     def get_dialog_text(self):
-        turns = self.get_turns()
+        """The merged utterances (a new list) and the name of the last speaker"""
+        self._check_current()
+        return list(self._dialog), self._last_name
 
-        # utt = str(turns[0].start_time) + turns[0].utterance
-        dialog = []
-        if len(turns) > 0:
-            utt = turns[0].utterance
-            last_name = turns[0].name
-            for t in turns[1:]:
-                if t.utterance == "":
-                    continue
-                if t.name == last_name:
-                    utt = utt + " " + clean_whitespace(t.utterance)
-                else:
-                    dialog.append(clean_whitespace(utt))
-                    # utt = str(t.start_time) + t.utterance
-                    utt = clean_whitespace(t.utterance)
-                    last_name = t.name
-            dialog.append(clean_whitespace(utt))
-        return dialog, last_name
+    def get_context_window(self, max_turns=None):
+        """
+        The last `max_turns` merged utterances (all if None) as a tuple, ready to be sent to the language models, and
+        the name of the last speaker. The window is cached until a turn is added.
+        """
+        self._check_current()
+        window = self._windows.get(max_turns)
+        if window is None:
+            dialog = self._dialog if max_turns is None else self._dialog[-max_turns:]
+            window = self._windows[max_turns] = tuple(dialog)
+        return window, self._last_name
 
     def get_dialog_text_debug(self):
         turns = self.get_turns()
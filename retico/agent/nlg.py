@@ -1,5 +1,4 @@
-import json
-import requests
+from retico.agent import service
 
 URL_SAMPLE = "http://localhost:5000/sample"
 
@@ -11,8 +10,7 @@ class NLG(object):
 
     def generate_response(self, turns):
         json_data = {"text": turns}
-        response = requests.post(URL_SAMPLE, json=json_data)
-        d = json.loads(response.content.decode())
+        d = service.post(URL_SAMPLE, json_data)
         return d["response"]
 
     def get_next_response(self):
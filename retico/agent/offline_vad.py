@@ -0,0 +1,182 @@
+"""
+Offline VAD over whole WAV files.
+
+Re-annotates recorded sessions (`dialog.wav`, `user_audio.wav`) without replaying them in real time. The WAV is
+memory-mapped and framed with zero-copy slices, every frame is classified by webrtcvad (like VADFrames) and the frame
+states are smoothed with the turn/IPU/fast windows of the VADModule in one batch. Several files are processed in
+parallel worker processes.
+
+The output contains the same `vad_ipu_on/off` and `vad_turn_on/off` arrays that `CNS.save` writes to `dialog.json`:
+the times (in seconds from the start of the recording) at which the VADModule would have called its events.
+
+Usage:
+    $ python retico/agent/offline_vad.py session/dialog.wav --channel 1 --save
+"""
+
+from argparse import ArgumentParser
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+import mmap
+import struct
+
+import numpy as np
+import webrtcvad
+
+from retico.agent.utils import write_json
+from retico.agent.vad import VADFrames, VADModule
+
+
+def _find_chunk(buffer, chunk_id):
+    """Returns (offset, size) of the given chunk in the memory of a RIFF/WAVE file"""
+    if buffer[:4] != b"RIFF" or buffer[8:12] != b"WAVE":
+        raise ValueError("Not a RIFF/WAVE file")
+    pos = 12
+    while pos + 8 <= len(buffer):
+        cid, size = struct.unpack("<4sI", buffer[pos : pos + 8])
+        if cid == chunk_id:
+            return pos + 8, size
+        pos += 8 + size + (size % 2)
+    raise ValueError(f"No {chunk_id} chunk in WAVE file")
+
+
+def wav_frames(path, chunk_time, channel=None):
+    """
+    Memory-maps a 16 bit PCM WAV file and splits it into frames of `chunk_time` seconds.
+
+    The frames of a mono file are zero-copy slices of the mapped file. For files with multiple channels the chosen
+    channel (default: 0) is extracted once and then sliced. A last frame shorter than `chunk_time` is dropped, like a
+    chunk that never reached VADFrames.
+
+    Returns:
+        frames (list): memoryviews with the audio of each frame
+        sample_rate (int): the sample rate of the file
+    """
+    with open(path, "rb") as f:
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    view = memoryview(mm)
+    offset, _ = _find_chunk(view, b"fmt ")
+    audio_format, n_channels, sample_rate, _, _, bits = struct.unpack(
+        "<HHIIHH", view[offset : offset + 16]
+    )
+    if audio_format != 1 or bits != 16:
+        raise ValueError(f"webrtcvad needs 16 bit PCM audio: {path}")
+    offset, size = _find_chunk(view, b"data")
+    audio = view[offset : offset + size]
+    if n_channels > 1:
+        samples = np.frombuffer(audio, dtype="<i2")
+        samples = samples[: len(samples) - len(samples) % n_channels]
+        channel = channel or 0
+        audio = memoryview(
+            np.ascontiguousarray(samples.reshape(-1, n_channels)[:, channel])
+        ).cast("B")
+    chunk_width = int(chunk_time * sample_rate) * 2
+    frames = [
+        audio[i : i + chunk_width]
+        for i in range(0, len(audio) - chunk_width + 1, chunk_width)
+    ]
+    return frames, sample_rate
+
+
+def vad_frames(frames, sample_rate, mode=3):
+    """The webrtcvad `is_speech` state of every frame (as in VADFrames)"""
+    if sample_rate not in VADFrames.SAMPLE_RATES:
+        raise ValueError(
+            f"webrtc.Vad must use sample rate of {VADFrames.SAMPLE_RATES} but got {sample_rate}"
+        )
+    vad = webrtcvad.Vad(mode=mode)
+    return np.array([vad.is_speech(frame, sample_rate) for frame in frames], dtype=bool)
+
+
+def vad_file(
+    path,
+    chunk_time=0.01,
+    channel=None,
+    mode=3,
+    onset_time=0.15,
+    turn_offset=0.75,
+    ipu_offset=0.2,
+    fast_offset=0.1,
+    prob_thresh=0.95,
+):
+    """
+    Runs the VAD of the agent over a whole WAV file. The default arguments are the ones used by `Agent`.
+
+    Returns:
+        dict: `vad_ipu_on`, `vad_ipu_off`, `vad_turn_on` and `vad_turn_off` times in seconds, as in `CNS.save`
+    """
+    frames, sample_rate = wav_frames(path, chunk_time, channel)
+    is_speaking = vad_frames(frames, sample_rate, mode)
+    vad = VADModule(
+        chunk_time=chunk_time,
+        onset_time=onset_time,
+        turn_offset=turn_offset,
+        ipu_offset=ipu_offset,
+        fast_offset=fast_offset,
+        prob_thresh=prob_thresh,
+    )
+    changes = vad.replay(is_speaking)
+
+    data = {}
+    for name in ["ipu", "turn"]:
+        # the event is called once the frame has been received
+        data[f"vad_{name}_on"] = [
+            (frame + 1) * chunk_time for frame, active in changes[name] if active
+        ]
+        data[f"vad_{name}_off"] = [
+            (frame + 1) * chunk_time for frame, active in changes[name] if not active
+        ]
+    return data
+
+
+def vad_files(paths, workers=None, **kwargs):
+    """
+    Runs `vad_file` over several files in parallel worker processes.
+
+    Args:
+        paths (list): paths to WAV files
+        workers (int): number of worker processes (default: number of cpus)
+        **kwargs: arguments to `vad_file`
+
+    Returns:
+        dict: the output of `vad_file` for each path
+    """
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        results = executor.map(partial(vad_file, **kwargs), paths)
+        return dict(zip(paths, results))
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description="Offline VAD")
+    parser.add_argument("wavs", type=str, nargs="+")
+    parser.add_argument("--channel", type=int, default=None)
+    parser.add_argument("--chunk_time", type=float, default=0.01)
+    parser.add_argument("--mode", type=int, default=3)
+    parser.add_argument("--onset_time", type=float, default=0.15)
+    parser.add_argument("--turn_offset", type=float, default=0.75)
+    parser.add_argument("--ipu_offset", type=float, default=0.2)
+    parser.add_argument("--fast_offset", type=float, default=0.1)
+    parser.add_argument("--prob_thresh", type=float, default=0.95)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--save", action="store_true")
+    args = parser.parse_args()
+
+    results = vad_files(
+        args.wavs,
+        workers=args.workers,
+        chunk_time=args.chunk_time,
+        channel=args.channel,
+        mode=args.mode,
+        onset_time=args.onset_time,
+        turn_offset=args.turn_offset,
+        ipu_offset=args.ipu_offset,
+        fast_offset=args.fast_offset,
+        prob_thresh=args.prob_thresh,
+    )
+    for path, data in results.items():
+        print(
+            f"{path}: {len(data['vad_ipu_on'])} ipus, {len(data['vad_turn_on'])} turns"
+        )
+        if args.save:
+            savepath = path.rsplit(".", 1)[0] + "_vad.json"
+            write_json(data, savepath)
+            print("Saved vad -> ", savepath)
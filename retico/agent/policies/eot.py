@@ -1,7 +1,6 @@
-import json
-import requests
 import time
 
+from retico.agent import service
 from retico.agent.utils import clean_whitespace, Color as C
 from retico.agent.frontal_cortex import FrontalCortexBase
 
@@ -18,8 +17,7 @@ class FC_EOT(FrontalCortexBase):
 
     def lm_eot(self, text):
         json_data = {"text": text}
-        response = requests.post(URL_TRP, json=json_data)
-        d = json.loads(response.content.decode())
+        d = service.post(URL_TRP, json_data)
         return d["trp"][-1]  # only care about last token
 
     def trigger_user_turn_off(self):
@@ -29,7 +27,7 @@ class FC_EOT(FrontalCortexBase):
                 current_utt = clean_whitespace(self.cns.user.utterance)
                 if current_utt != self.last_current_utterance:
                     self.last_current_utterance = current_utt
-                    context = self.cns.memory.get_dialog_text()
+                    context, _ = self.cns.memory.get_dialog_text()
                     context.append(current_utt)
                     trp = self.lm_eot(context)
                     self.cns.user.all_trps.append({"trp": trp, "time": time.time()})
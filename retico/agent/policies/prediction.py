@@ -1,7 +1,9 @@
-import requests
-import json
+import collections
+import threading
 import time
+import traceback
 
+from retico.agent import service
 from retico.agent.frontal_cortex import FrontalCortexBase
 from retico.agent.utils import clean_whitespace, Color as C
 
@@ -27,69 +29,227 @@ Inside
 """
 
 
+class TRPPredictor:
+    """
+    Queries the prediction model in a background thread, so that the dialog loop never waits for the model.
+
+    Only the newest request is kept: a request replaces a pending request that has not been sent yet and the response
+    to an older request is stale, i.e. it is memoized but never returned by `result` for the newer request. While the
+    user speaks, a request is only sent when no newer ASR increment arrived for `debounce_time`; `flush` sends the
+    pending request at once (when the user goes silent). Results are memoized by (context hash, utterance prefix),
+    so an utterance that the ASR revises back to an earlier hypothesis does not query the model again.
+
+    A failed request is put back as pending (unless a newer request arrived) and retried up to `retries` times.
+    After that, `FAILED` is memoized as its result, so that the caller does not wait for it forever.
+    """
+
+    FAILED = {"failed": True}
+
+    def __init__(self, predict, debounce_time=0.15, memo_size=256, retries=2):
+        self.predict = predict
+        self.debounce_time = debounce_time
+        self.memo_size = memo_size
+        self.retries = retries
+        self.memo = collections.OrderedDict()
+        self.pending = None  # (key, context, request time, attempts)
+        self.latest = None
+        self.n_requests = 0
+        self.n_model_calls = 0
+        self.n_memo_hits = 0
+        self.n_debounced = 0
+        self.n_stale = 0
+        self.n_failed = 0
+        self.active = False
+        self.thread = None
+        self._cond = threading.Condition()
+
+    @staticmethod
+    def key(context, utterance):
+        return hash(tuple(context)), utterance
+
+    def request(self, key, context):
+        with self._cond:
+            self.n_requests += 1
+            self.latest = key
+            if key in self.memo:
+                self.n_memo_hits += 1
+                if self.pending is not None:  # the pending request would be stale
+                    self.n_debounced += 1
+                    self.pending = None
+                return
+            if self.pending is not None:
+                self.n_debounced += 1
+            self.pending = (key, context, time.time(), 0)
+            self._cond.notify()
+
+    def flush(self):
+        with self._cond:
+            if self.pending is not None and self.pending[2] > 0:
+                key, context, _, attempts = self.pending
+                self.pending = (key, context, 0, attempts)
+                self._cond.notify()
+
+    def result(self, key):
+        """The result of the prediction for `key`, None if it is not (yet) known or `FAILED`"""
+        with self._cond:
+            return self.memo.get(key)
+
+    def start(self):
+        self.active = True
+        self.thread = threading.Thread(target=self._run, name="trp-prediction", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        with self._cond:
+            self.active = False
+            self.pending = None
+            self._cond.notify()
+        if self.thread is not None:
+            self.thread.join()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while self.active and self.pending is None:
+                    self._cond.wait()
+                if not self.active:
+                    return
+                # debounce: wait until no new request arrived for `debounce_time`
+                wait = self.pending[2] + self.debounce_time - time.time()
+                if wait > 0:
+                    self._cond.wait(wait)
+                    continue
+                key, context, _, attempts = self.pending
+                self.pending = None
+                self.n_model_calls += 1
+            try:
+                result = self.predict(context)
+            except Exception:
+                traceback.print_exc()
+                with self._cond:
+                    self.n_failed += 1
+                    if attempts < self.retries:
+                        if self.pending is None:
+                            self.pending = (key, context, time.time(), attempts + 1)
+                        continue
+                result = self.FAILED
+            with self._cond:
+                self.memo[key] = result
+                if len(self.memo) > self.memo_size:
+                    self.memo.popitem(last=False)
+                if key != self.latest:
+                    self.n_stale += 1
+
+    def stats(self):
+        with self._cond:
+            return {
+                "requests": self.n_requests,
+                "model_calls": self.n_model_calls,
+                "memo_hits": self.n_memo_hits,
+                "debounced": self.n_debounced,
+                "stale": self.n_stale,
+                "failed": self.n_failed,
+            }
+
+
 class FC_Predict(FrontalCortexBase):
-    def __init__(self, trp_threshold=0.1, **kwargs):
+    def __init__(self, trp_threshold=0.1, debounce_time=0.15, **kwargs):
         super().__init__(**kwargs)
         self.trp_threshold = trp_threshold
 
         self.last_current_utterance = ""
         # self.t_predicted_user_off = 0
 
+        # the prediction runs in the background while the user speaks
+        self.predictor = TRPPredictor(self.lm_prediction, debounce_time=debounce_time)
+        self.prediction_key = None
+        self.prediction_user = None
+        self.last_evaluated_key = None
+
     def lm_prediction(self, text):
         json_data = {"text": text}
-        response = requests.post(URL_Prediction, json=json_data)
-        d = json.loads(response.content.decode())
+        d = service.post(URL_Prediction, json_data)
         return d
 
     def predict_trp(self, current_utt):
-        context, last_speaker = self.cns.memory.get_dialog_text()
-        context.append(current_utt)
-        return self.lm_prediction(context)
+        """Requests the prediction for the current utterance. Returns the key of the prediction"""
+        window, last_speaker = self.cns.memory.get_context_window()
+        key = self.predictor.key(window, current_utt)
+        self.predictor.request(key, list(window) + [current_utt])
+        return key
+
+    def start_loop(self, runner=None):
+        self.predictor.start()
+        super().start_loop(runner)
+
+    def stop_loop(self):
+        super().stop_loop()
+        self.predictor.stop()
+        if self.verbose:
+            print("TRP predictions: ", self.predictor.stats())
 
     def trigger_user_turn_off(self):
         should_respond = False
-        if self.cns.user_turn_active and not self.cns.vad_ipu_active:
-            current_utt = clean_whitespace(self.cns.user.prel_utterance)
-            if current_utt != "" and current_utt != self.last_current_utterance:
-                # print("guessing")
-
-                # update last prediction text
-                self.last_current_utterance = current_utt
-
-                # get result from prediction model
-                result = self.predict_trp(current_utt)
-                trp = result["p"]
-
-                # append trp estimate, the current time and duration of prediction
-                print("pred time: ", result["time"])
-                self.cns.user.all_trps.append(
-                    {
-                        "trp": trp,
-                        "utterance": current_utt,
-                        "predictions": result["predictions"],
-                        "prediction_time": result["time"],
-                        "time": time.time(),
-                    }
-                )
-                self.cns.user.pred_time.append(result["time"])
-                # self.last_guess = "trp"
-
-                # check if a turn-shift is recognized
-                if trp >= self.trp_threshold:
-                    print("pos trp")
-                    self.cns.user.trp_at_eot = trp
-                    self.cns.user.utterance_at_eot = current_utt
-                    # self.t_predicted_user_off = time.time()
-                    # print("last_agent_trigger_on: ", self.last_agent_trigger_on)
-                    # print("should respond: TRUE")
-                    should_respond = True
-                    # self.cns.finalize_user()
-                    if self.verbose:
-                        print(C.green + f"Take turn: {round(trp, 3)}" + C.end)
-                else:
-                    print("neg trp")
-                    if self.verbose:
-                        print(C.green + f"Listen: ", C.red, f"{round(trp, 3)}" + C.end)
-                    # self.last_guess = "listen"
+        if not self.cns.user_turn_active:
+            return should_respond
+
+        # speculatively request the prediction for every new hypothesis, also while the user is speaking
+        current_utt = clean_whitespace(self.cns.user.prel_utterance)
+        if current_utt != "" and current_utt != self.last_current_utterance:
+            # update last prediction text
+            self.last_current_utterance = current_utt
+            self.prediction_key = self.predict_trp(current_utt)
+            self.prediction_user = self.cns.user
+
+        if self.cns.vad_ipu_active or self.prediction_user is not self.cns.user:
+            return should_respond
+        self.predictor.flush()
+        if self.prediction_key == self.last_evaluated_key:
+            return should_respond
+
+        # get result from prediction model (if it has arrived)
+        result = self.predictor.result(self.prediction_key)
+        if result is None:
+            return should_respond
+        self.last_evaluated_key = self.prediction_key
+        current_utt = self.prediction_key[1]
+        if result is self.predictor.FAILED:
+            # without a prediction the silence of the user ends the turn
+            if self.verbose:
+                print(C.red + "Prediction failed: take turn" + C.end)
+            self.cns.user.utterance_at_eot = current_utt
+            return True
+        trp = result["p"]
+
+        # append trp estimate, the current time and duration of prediction
+        if self.verbose:
+            print("pred time: ", result["time"])
+        self.cns.user.all_trps.append(
+            {
+                "trp": trp,
+                "utterance": current_utt,
+                "predictions": result["predictions"],
+                "prediction_time": result["time"],
+                "time": time.time(),
+            }
+        )
+        self.cns.user.pred_time.append(result["time"])
+        # self.last_guess = "trp"
+
+        # check if a turn-shift is recognized
+        if trp >= self.trp_threshold:
+            self.cns.user.trp_at_eot = trp
+            self.cns.user.utterance_at_eot = current_utt
+            # self.t_predicted_user_off = time.time()
+            # print("last_agent_trigger_on: ", self.last_agent_trigger_on)
+            # print("should respond: TRUE")
+            should_respond = True
+            # self.cns.finalize_user()
+            if self.verbose:
+                print(C.green + f"Take turn: {round(trp, 3)}" + C.end)
+        else:
+            if self.verbose:
+                print(C.green + f"Listen: ", C.red, f"{round(trp, 3)}" + C.end)
+            # self.last_guess = "listen"
 
         return should_respond
@@ -0,0 +1,141 @@
+"""
+A pooled HTTP client for the language model services of the agent (response generation and ranking, TRP and
+prediction).
+
+All calls share one `requests.Session` per process, so the connections to the services are kept alive instead of
+opening a new TCP connection for every query on the turn-taking critical path. Calls have timeouts, failed
+connections are retried with a backoff and the latency of every endpoint is recorded in a histogram.
+
+Example:
+    d = post("http://localhost:5001/trp", {"text": context})
+    ds = post_many("http://localhost:5001/trp", [{"text": c} for c in contexts])
+    print(get_client().latencies())
+"""
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from retico.core.metrics import Histogram
+
+TIMEOUT = (0.5, 10.0)  # (connect, read) in seconds
+# generation (sampling and the predicted continuations) may take longer than 10 s on a loaded GPU, so it waits for
+# as long as the service takes
+ENDPOINT_TIMEOUTS = {"/sample": (0.5, None), "/prediction": (0.5, None)}
+POOL_SIZE = 8
+RETRIES = 2
+BACKOFF = 0.05
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class ServiceClient:
+    """
+    A keep-alive HTTP client for JSON services.
+
+    Only failed connections and gateway errors (502, 503, 504) are retried. The services only run inference, so
+    repeating a POST request is safe. The timeout of a request is looked up by the path of its url in
+    `endpoint_timeouts` and is `timeout` for all other paths.
+    """
+
+    def __init__(
+        self,
+        pool_size=POOL_SIZE,
+        retries=RETRIES,
+        backoff=BACKOFF,
+        timeout=TIMEOUT,
+        endpoint_timeouts=ENDPOINT_TIMEOUTS,
+    ):
+        self.pool_size = pool_size
+        self.timeout = timeout
+        self.endpoint_timeouts = dict(endpoint_timeouts)
+        self.session = requests.Session()
+        retry = Retry(
+            total=retries,
+            connect=retries,
+            read=0,
+            status=retries,
+            backoff_factor=backoff,
+            status_forcelist=(502, 503, 504),
+            allowed_methods=frozenset(["POST"]),
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+        self._histograms = {}
+        self._lock = threading.Lock()
+        self._executor = None
+
+    def post(self, url, json_data, timeout=None):
+        """POST `json_data` to `url` and return the decoded JSON response"""
+        t = time.perf_counter()
+        try:
+            if timeout is None:
+                timeout = self.endpoint_timeouts.get(urlsplit(url).path, self.timeout)
+            response = self.session.post(url, json=json_data, timeout=timeout)
+            response.raise_for_status()
+            return response.json()
+        finally:
+            self._record(url, time.perf_counter() - t)
+
+    def post_many(self, url, payloads, timeout=None):
+        """
+        POST several payloads to `url` concurrently over the pooled connections and return the responses in the
+        order of `payloads`. The services have no batch endpoints, so a batch is a set of parallel requests.
+        """
+        payloads = list(payloads)
+        if len(payloads) <= 1:
+            return [self.post(url, p, timeout) for p in payloads]
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(self.pool_size, thread_name_prefix="service")
+        futures = [self._executor.submit(self.post, url, p, timeout) for p in payloads]
+        return [f.result() for f in futures]
+
+    def _record(self, url, seconds):
+        endpoint = urlsplit(url)
+        endpoint = endpoint.netloc + endpoint.path
+        with self._lock:
+            histogram = self._histograms.get(endpoint)
+            if histogram is None:
+                histogram = self._histograms[endpoint] = Histogram(LATENCY_BUCKETS)
+            histogram.add(seconds)
+
+    def latencies(self):
+        """Returns the latency histogram of every endpoint as a dict"""
+        with self._lock:
+            return {endpoint: h.to_dict() for endpoint, h in self._histograms.items()}
+
+    def close(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False)
+                self._executor = None
+        self.session.close()
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_client():
+    """Returns the client that is shared by all modules of the process"""
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = ServiceClient()
+        return _client
+
+
+def post(url, json_data, timeout=None):
+    return get_client().post(url, json_data, timeout)
+
+
+def post_many(url, payloads, timeout=None):
+    return get_client().post_many(url, payloads, timeout)
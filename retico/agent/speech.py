@@ -1,13 +1,17 @@
 import pyaudio
 import wave
 import queue
+import threading
+import traceback
 from os.path import join
 from os import makedirs
 
 from retico.core.abstract import AbstractConsumingModule
 from retico.core.audio.common import AudioIU
+from retico.core.audio.tts import split_phrases
 from retico.core.audio.io import (
     AudioDispatcherModule,
+    AsyncAudioDispatcherModule,
     StreamingSpeakerModule,
     AudioRecorderModule,
 )
@@ -130,6 +134,82 @@ class DeviceStreamSpeakerModule(AbstractConsumingModule):
         self.audio_buffer = queue.Queue()
 
 
+class TTSPrefetcher:
+    """
+    Synthesizes the candidates for the next agent utterance into the TTS cache in a background thread, so that the
+    synthesis is done (or at least started) when the agent takes the turn.
+
+    `update` replaces the pending candidates: candidates that are no longer predicted are dropped and the new ones are
+    synthesized in the given order (most likely first). Candidates that are already in the cache are skipped. A
+    synthesis that has already started is not cancelled, a request for its text waits for it (see
+    TTSCache.get_or_put).
+    """
+
+    def __init__(self, tts):
+        self.tts = tts
+        self.pending = []
+        self.n_prefetched = 0
+        self.n_cancelled = 0
+        self.active = False
+        self.thread = None
+        self._cond = threading.Condition()
+
+    def _texts(self, text):
+        # a streaming tts synthesizes (and caches) the phrases of the text
+        return split_phrases(text) if getattr(self.tts, "streaming", False) else [text]
+
+    def _cached(self, text):
+        return all(self.tts.cache_key(t) in self.tts.cache for t in self._texts(text))
+
+    def update(self, candidates):
+        new = [c for c in dict.fromkeys(candidates) if c and not self._cached(c)]
+        with self._cond:
+            self.n_cancelled += len([c for c in self.pending if c not in new])
+            self.pending = new
+            self._cond.notify()
+
+    def start(self):
+        self.active = True
+        self.thread = threading.Thread(target=self._run, name="tts-prefetch", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        with self._cond:
+            self.active = False
+            self.pending = []
+            self._cond.notify()
+        if self.thread is not None:
+            self.thread.join()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while self.active and not self.pending:
+                    self._cond.wait()
+                if not self.active:
+                    return
+                text = self.pending.pop(0)
+            try:
+                for t in self._texts(text):
+                    self.tts.synthesize(t, prefetch=True)
+            except Exception:
+                traceback.print_exc()
+                continue
+            with self._cond:
+                self.n_prefetched += 1
+
+    def stats(self):
+        """The cache hit rate of the spoken utterances and the number of prefetched/cancelled candidates"""
+        requests = self.tts.cache_requests
+        return {
+            "requests": requests,
+            "hits": self.tts.cache_hits,
+            "hit_rate": self.tts.cache_hits / requests if requests > 0 else None,
+            "prefetched": self.n_prefetched,
+            "cancelled": self.n_cancelled,
+        }
+
+
 class Speech:
     """
     Connect the tts component of the Speech-class to a module which outputs `GeneratedTextIU`
@@ -156,6 +236,8 @@ class Speech:
         device_name="pulse_source_2",
         cache_dir="/tmp",
         result_dir="/tmp",
+        runner=None,
+        streaming=False,
         **kwargs,
     ):
         super().__init__(**kwargs)
@@ -179,6 +261,7 @@ class Speech:
                 sample_rate=sample_rate,
                 bytes_per_sample=bytes_per_sample,
                 caching=False,
+                streaming=streaming,
             )
         elif tts_client.lower() == "amazon":
             self.tts = AmazonTTSModule(
@@ -188,13 +271,14 @@ class Speech:
                 polly_sample_rate=16000,
                 cache_dir=cache_dir,
                 record=record,
+                streaming=streaming,
             )
         else:
             raise NotImplementedError(
                 f'tts_client {tts_client} is not implemented. Try ["google", "amazon"]'
             )
 
-        self.audio_dispatcher = AudioDispatcherModule(
+        dispatcher_kwargs = dict(
             target_chunk_size=self.chunk_size,
             rate=sample_rate,
             sample_width=bytes_per_sample,
@@ -203,6 +287,12 @@ class Speech:
             silence=None,
             interrupt=True,
         )
+        if runner is not None:
+            self.audio_dispatcher = AsyncAudioDispatcherModule(
+                runner=runner, **dispatcher_kwargs
+            )
+        else:
+            self.audio_dispatcher = AudioDispatcherModule(**dispatcher_kwargs)
 
         if bypass:
             self.streaming_speaker = DeviceStreamSpeakerModule(
@@ -220,6 +310,10 @@ class Speech:
                 sample_width=bytes_per_sample,
             )
 
+        self.prefetcher = None
+        if getattr(self.tts, "cache", None) is not None:
+            self.prefetcher = TTSPrefetcher(self.tts)
+
         self.tts.subscribe(self.audio_dispatcher)
         self.audio_dispatcher.subscribe(self.streaming_speaker)
 
@@ -246,6 +340,8 @@ class Speech:
         self.tts.run(**kwargs)
         self.audio_dispatcher.run(**kwargs)
         self.streaming_speaker.run(**kwargs)
+        if self.prefetcher is not None:
+            self.prefetcher.start()
         if self.debug:
             self.audio_dispatcher_debug.run(**kwargs)
             self.tts_debug.run(**kwargs)
@@ -254,6 +350,8 @@ class Speech:
         self.tts.stop(**kwargs)
         self.audio_dispatcher.stop(**kwargs)
         self.streaming_speaker.stop(**kwargs)
+        if self.prefetcher is not None:
+            self.prefetcher.stop()
         if self.debug:
             self.audio_dispatcher_debug.stop(**kwargs)
             self.tts_debug.stop(**kwargs)
@@ -11,6 +11,89 @@ import numpy as np
 import webrtcvad
 
 
+class RunningWindow:
+    """
+    A sliding window over the latest binary frame states that keeps a running count of the active frames. Adding a
+    frame and computing the mean are O(1) and do not allocate, independent of the size of the window.
+
+    Like the zero-filled numpy buffers it replaces, the window initially contains `size` inactive frames.
+    """
+
+    def __init__(self, size):
+        self.size = size
+        self.count = 0
+        self._frames = bytearray(size)
+        self._pos = 0
+
+    def add(self, value):
+        if not self.size:
+            return
+        value = 1 if value else 0
+        self.count += value - self._frames[self._pos]
+        self._frames[self._pos] = value
+        self._pos = (self._pos + 1) % self.size
+
+    def mean(self):
+        if not self.size:
+            return np.nan
+        return self.count / self.size
+
+    def __len__(self):
+        return self.size
+
+
+def window_means(frames, size):
+    """
+    The means of a RunningWindow of the given size after each of the frames (vectorized).
+
+    Args:
+        frames (np.ndarray): binary frame states
+        size (int): the size of the window
+
+    Returns:
+        np.ndarray: the mean of the window after each frame
+    """
+    frames = np.asarray(frames, dtype=np.int64)
+    if not size:
+        return np.full(len(frames), np.nan)
+    counts = np.concatenate((np.zeros(size, dtype=np.int64), np.cumsum(frames)))
+    return (counts[size:] - counts[:-size]) / size
+
+
+def smooth_transitions(is_speaking, on_size, off_size, prob_thresh, active=False):
+    """
+    Replays a whole stream of frame states through the onset/offset smoothing of VAD/VADModule in one call.
+
+    The window means are computed for all frames at once and the state machine only jumps between the frames where
+    the state changes.
+
+    Args:
+        is_speaking (list, np.ndarray): the `is_speaking` values of a stream of VadIUs
+        on_size (int): number of frames of the onset window
+        off_size (int): number of frames of the offset window
+        prob_thresh (float): the proportion of frames in a window that changes the state
+        active (bool): the initial state
+
+    Returns:
+        list: (frame index, active) for every change of the state
+    """
+    is_speaking = np.asarray(is_speaking, dtype=bool)
+    on_frames = np.flatnonzero(window_means(is_speaking, on_size) >= prob_thresh)
+    off_frames = np.flatnonzero(window_means(~is_speaking, off_size) >= prob_thresh)
+
+    transitions = []
+    frame = -1
+    while True:
+        candidates = off_frames if active else on_frames
+        i = np.searchsorted(candidates, frame, side="right")
+        if i == len(candidates):
+            break
+        frame = candidates[i]
+        active = not active
+        transitions.append((int(frame), active))
+    return transitions
+
+
 class VADFrames(AbstractModule):
     CHUNK_TIMES = [0.01, 0.02, 0.03]
     SAMPLE_RATES = [8000, 16000, 32000, 48000]
@@ -123,12 +206,12 @@ class VAD(AbstractModule):
         # Used to turn OFF speech activity
         self.offset_time = offset_time
         n_off = int(offset_time / chunk_time)  # number of frames to evaluate
-        self.vad_off_context = np.zeros(n_off)
+        self.vad_off_context = RunningWindow(n_off)
 
         # Used to turn ON speech activity
         self.onset_time = onset_time
         n_on = int(onset_time / chunk_time)
-        self.vad_on_context = np.zeros(n_on)
+        self.vad_on_context = RunningWindow(n_on)
 
         self.debug = debug
         if self.debug:
@@ -144,14 +227,19 @@ class VAD(AbstractModule):
         )
 
     def add_state(self, is_speaking):
-        is_silent = (not is_speaking) * 1.0
-        is_speaking *= 1.0
-
-        self.vad_on_context = np.concatenate(
-            (self.vad_on_context[1:], np.array((is_speaking,)))
-        )
-        self.vad_off_context = np.concatenate(
-            (self.vad_off_context[1:], np.array((is_silent,)))
+        self.vad_on_context.add(is_speaking)
+        self.vad_off_context.add(not is_speaking)
+
+    def replay(self, is_speaking):
+        """
+        Replays a recorded stream of VadIU `is_speaking` values and returns the (frame index, is_speaking) changes
+        that `process_iu` would produce for a freshly initialized module.
+        """
+        return smooth_transitions(
+            is_speaking,
+            len(self.vad_on_context),
+            len(self.vad_off_context),
+            self.prob_thresh,
         )
 
     def output(self):
@@ -270,20 +358,20 @@ class VADModule(AbstractConsumingModule):
         # TURN ==================================
         n_off = int(self.turn_offset / self.chunk_time)  # number of frames to evaluate
         n_on = int(self.turn_onset / self.chunk_time)
-        self.turn_off_buffer = np.zeros(n_off)
-        self.turn_on_buffer = np.zeros(n_on)
+        self.turn_off_buffer = RunningWindow(n_off)
+        self.turn_on_buffer = RunningWindow(n_on)
 
         # IPU ==================================
         n_off = int(self.ipu_offset / self.chunk_time)  # number of frames to evaluate
         n_on = int(self.ipu_onset / self.chunk_time)
-        self.ipu_off_buffer = np.zeros(n_off)
-        self.ipu_on_buffer = np.zeros(n_on)
+        self.ipu_off_buffer = RunningWindow(n_off)
+        self.ipu_on_buffer = RunningWindow(n_on)
 
         # Fast ==================================
         n_off = int(self.fast_offset / self.chunk_time)  # number of frames to evaluate
         n_on = int(self.fast_onset / self.chunk_time)
-        self.fast_off_buffer = np.zeros(n_off)
-        self.fast_on_buffer = np.zeros(n_on)
+        self.fast_off_buffer = RunningWindow(n_off)
+        self.fast_on_buffer = RunningWindow(n_on)
 
     def debug_callback(self, module, event_name, data):
         color = C.red
@@ -292,32 +380,29 @@ class VADModule(AbstractConsumingModule):
         print(color + f"{event_name}: {data['active']}" + C.end)
 
     def add_state(self, is_speaking):
-        is_silent = (not is_speaking) * 1.0
-        is_speaking *= 1.0
-
-        # TURN
-        self.turn_on_buffer = np.concatenate(
-            (self.turn_on_buffer[1:], np.array((is_speaking,)))
-        )
-        self.turn_off_buffer = np.concatenate(
-            (self.turn_off_buffer[1:], np.array((is_silent,)))
-        )
-
-        # IPU
-        self.ipu_on_buffer = np.concatenate(
-            (self.ipu_on_buffer[1:], np.array((is_speaking,)))
-        )
-        self.ipu_off_buffer = np.concatenate(
-            (self.ipu_off_buffer[1:], np.array((is_silent,)))
-        )
-
-        # Fast
-        self.fast_on_buffer = np.concatenate(
-            (self.fast_on_buffer[1:], np.array((is_speaking,)))
-        )
-        self.fast_off_buffer = np.concatenate(
-            (self.fast_off_buffer[1:], np.array((is_silent,)))
-        )
+        for buffer in (self.turn_on_buffer, self.ipu_on_buffer, self.fast_on_buffer):
+            buffer.add(is_speaking)
+        for buffer in (self.turn_off_buffer, self.ipu_off_buffer, self.fast_off_buffer):
+            buffer.add(not is_speaking)
+
+    def replay(self, is_speaking):
+        """
+        Replays a recorded stream of VadIU `is_speaking` values in one call.
+
+        Returns:
+            dict: the (frame index, active) changes of the turn, ipu and fast states, as they would be omitted by
+                `process_iu` for a freshly initialized module.
+        """
+        return {
+            name: smooth_transitions(
+                is_speaking, len(on_buffer), len(off_buffer), self.prob_thresh
+            )
+            for name, on_buffer, off_buffer in [
+                ("turn", self.turn_on_buffer, self.turn_off_buffer),
+                ("ipu", self.ipu_on_buffer, self.ipu_off_buffer),
+                ("fast", self.fast_on_buffer, self.fast_off_buffer),
+            ]
+        }
 
     def update(self, activity, on_buffer, off_buffer, offset_time, onset_time, event):
         if activity:
@@ -8,11 +8,18 @@ The Incremental Unit provides the basic data structure to exchange information
 between modules.
 """
 
+import collections
+import collections.abc
 import queue
+import sys
 import threading
 import time
 
+from retico.core import clock, events, metrics, trace
+
 QUEUE_TIMEOUT = 0.01
+HISTORY_SIZE = 64
+META_DATA_MAX_DEPTH = 8
 
 
 class IncrementalQueue(queue.Queue):
@@ -23,17 +30,128 @@ class IncrementalQueue(queue.Queue):
     every subscriber to the incremental queue. Every unit gets its own queue and
     may process the items at different speeds.
 
+    If the queue has a maximum size, the overflow policy determines what
+    happens when an IU is put into a full queue:
+        BLOCK: The producer blocks until there is space in the queue (lossless).
+        DROP_OLDEST: The oldest IU in the queue is dropped (real-time audio).
+        DROP_NEWEST: The new IU is dropped.
+        COALESCE: Queued IUs that the new IU revises (the IUs of its
+            previous_iu chain up to the last committed IU, e.g. earlier ASR
+            hypotheses of the same utterance) are replaced by the new IU. If
+            the queue is still full, the oldest IU is dropped.
+
+    By default, queues are unbounded and lossless. A bounded queue is created by
+    subscribing with a capacity and a policy, e.g.
+    `asr.subscribe(nlu, maxsize=8, overflow=IncrementalQueue.COALESCE)`.
+
     Attributes:
         provider (AbstractModule): The module that provides IUs for this queue.
         consumer (AbstractModule): The module that consumes IUs for this queue.
         maxsize (int): The maximum size of the queue, where 0 does not restrict
             the size.
+        overflow (str): The overflow policy of the queue.
+        dropped (int): The number of IUs that were dropped by the queue.
+        high_water_mark (int): The maximum number of IUs that were in the queue
+            at the same time.
     """
 
-    def __init__(self, provider, consumer, maxsize=0):
+    BLOCK = "block"
+    DROP_OLDEST = "drop_oldest"
+    DROP_NEWEST = "drop_newest"
+    COALESCE = "coalesce"
+    OVERFLOW_POLICIES = [BLOCK, DROP_OLDEST, DROP_NEWEST, COALESCE]
+
+    def __init__(self, provider, consumer, maxsize=0, overflow=BLOCK):
+        if overflow not in self.OVERFLOW_POLICIES:
+            raise ValueError(
+                "Unknown overflow policy %s. Please choose one of %s"
+                % (overflow, self.OVERFLOW_POLICIES)
+            )
         super().__init__(maxsize=maxsize)
         self.provider = provider
         self.consumer = consumer
+        self.overflow = overflow
+        self.dropped = 0
+        self.high_water_mark = 0
+        clock.track_queue(self)
+
+    def _put(self, item):
+        super()._put(item)
+        if len(self.queue) > self.high_water_mark:
+            self.high_water_mark = len(self.queue)
+
+    def _coalesce(self, item):
+        """Remove the queued IUs that are revised by the given IU (the IUs of
+        its previous_iu chain that are not committed).
+
+        Must be called while holding the mutex of the queue.
+        """
+        queued = {id(iu) for iu in self.queue}
+        revised = set()
+        previous = getattr(item, "previous_iu", None)
+        while previous is not None and not previous.committed:
+            if id(previous) in queued:
+                revised.add(id(previous))
+                if len(revised) == len(queued):
+                    break
+            previous = previous.previous_iu
+        if not revised:
+            return
+        kept = [iu for iu in self.queue if id(iu) not in revised]
+        removed = len(self.queue) - len(kept)
+        self.dropped += removed
+        self.unfinished_tasks -= removed
+        self.queue.clear()
+        self.queue.extend(kept)
+
+    def put(self, item, block=True, timeout=None):
+        """Put an item into the queue and wake up the consuming module.
+
+        If the queue is full, the item is handled according to the overflow
+        policy of the queue.
+
+        Args:
+            item (IncrementalUnit): The IU that is put into the queue.
+            block (bool): Whether to block if the queue is full. Only used by
+                the BLOCK policy.
+            timeout (float): The maximum time to block.
+        """
+        tracer = trace.get_tracer()
+        if tracer is not None and self.consumer is not None:
+            tracer.enqueue(item, self.consumer)
+        if self.overflow == self.BLOCK:
+            super().put(item, block=block, timeout=timeout)
+        else:
+            with self.not_full:
+                if self.overflow == self.COALESCE and 0 < self.maxsize <= self._qsize():
+                    self._coalesce(item)
+                if 0 < self.maxsize <= self._qsize():
+                    self.dropped += 1
+                    if self.overflow == self.DROP_NEWEST:
+                        return
+                    self._get()
+                    self.unfinished_tasks -= 1
+                self._put(item)
+                self.unfinished_tasks += 1
+                self.not_empty.notify()
+        if self.consumer is not None:
+            self.consumer.notify_input(self)
+
+    def stats(self):
+        """Return the counters of the queue.
+
+        Returns:
+            dict: A dictionary with the current size, the maximum size, the
+            number of dropped IUs and the high water mark of the queue.
+        """
+        with self.mutex:
+            return {
+                "size": self._qsize(),
+                "maxsize": self.maxsize,
+                "overflow": self.overflow,
+                "dropped": self.dropped,
+                "high_water_mark": self.high_water_mark,
+            }
 
     def remove(self):
         """Removes the queue from the consumer and the producer."""
@@ -41,6 +159,269 @@ class IncrementalQueue(queue.Queue):
         self.consumer.remove_left_buffer(self)
 
 
+class IUHistory:
+    """A fixed-capacity store of the latest IUs created by a module.
+
+    An IU references its previous IU and the IU it is grounded in directly
+    while it is in the history of its creator, so that a consumer can always
+    follow the immediate links of the IUs it receives. When the history of a
+    module is full, its oldest IU is evicted and its links are replaced by
+    references to the histories of the linked IUs (the history and an index).
+    Thus, IUs are not kept alive by long chains of links: a link that is
+    followed from an evicted IU resolves to None once the linked IU was evicted
+    as well.
+
+    Attributes:
+        capacity (int): The maximum number of IUs in the history.
+        added (int): The number of IUs that were added to the history.
+    """
+
+    def __init__(self, capacity=HISTORY_SIZE):
+        if capacity < 1:
+            raise ValueError("The capacity of an IU history must be positive")
+        self.capacity = capacity
+        self.added = 0
+        self._ring = [None] * capacity
+        self._lock = threading.Lock()
+
+    def add(self, iu):
+        """Add an IU to the history and evict the oldest IU if the history is
+        full.
+
+        Args:
+            iu (IncrementalUnit): The IU to add.
+
+        Returns:
+            int: The index of the IU in the history.
+        """
+        with self._lock:
+            index = self.added
+            evicted = self._ring[index % self.capacity]
+            self._ring[index % self.capacity] = iu
+            self.added = index + 1
+        iu._history = self
+        iu._history_index = index
+        if evicted is not None:
+            _weaken_links(evicted)
+        return index
+
+    def get(self, index):
+        """Return the IU with the given index.
+
+        Args:
+            index (int): The index returned by `add`.
+
+        Returns:
+            IncrementalUnit: The IU or None if it was evicted.
+        """
+        if index < self.added - self.capacity:
+            return None
+        return self._ring[index % self.capacity]
+
+    def __len__(self):
+        return min(self.added, self.capacity)
+
+    def __iter__(self):
+        """Iterate over the IUs in the history from the oldest to the latest."""
+        with self._lock:
+            start = max(0, self.added - self.capacity)
+            ius = [self._ring[i % self.capacity] for i in range(start, self.added)]
+        return iter(ius)
+
+    def clear(self):
+        """Evict all IUs from the history."""
+        with self._lock:
+            evicted = self._ring
+            self._ring = [None] * self.capacity
+            self.added += self.capacity
+        for iu in evicted:
+            if iu is not None:
+                _weaken_links(iu)
+
+    def stats(self):
+        """Return the number of IUs and an estimate of the memory they use.
+
+        The memory is the size of the IU objects and of their attributes
+        (without following references to other objects). Buffers shared by
+        several IUs are counted for every IU.
+
+        Returns:
+            dict: A dictionary with the number of IUs in the history, its
+            capacity, the number of evicted IUs and the estimated bytes.
+        """
+        n_bytes = 0
+        for iu in self:
+            n_bytes += sys.getsizeof(iu)
+            if getattr(iu, "__dict__", None):
+                n_bytes += sys.getsizeof(iu.__dict__)
+            for value in iu_state(iu).values():
+                if value is None:
+                    continue
+                if isinstance(value, memoryview):
+                    n_bytes += value.nbytes
+                elif not isinstance(value, (IncrementalUnit, AbstractModule, IUHistory)):
+                    n_bytes += sys.getsizeof(value)
+        return {
+            "size": len(self),
+            "capacity": self.capacity,
+            "evicted": max(0, self.added - self.capacity),
+            "bytes": n_bytes,
+        }
+
+
+def _link(iu):
+    """Return a reference to an IU that does not keep the IU alive if it is in
+    the history of its creator."""
+    if iu is None or isinstance(iu, tuple):
+        return iu
+    history = getattr(iu, "_history", None)
+    if history is not None:
+        return history, iu._history_index
+    return iu
+
+
+def _weaken_links(iu):
+    """Replace the direct links of an IU that was evicted from the history of
+    its creator by references through the histories of the linked IUs."""
+    iu._previous = _link(iu._previous)
+    iu._grounded = _link(iu._grounded)
+
+
+def _resolve(link):
+    if link is None or not isinstance(link, tuple):
+        return link
+    return link[0].get(link[1])
+
+
+_mutex_lock = threading.Lock()
+
+
+def iu_state(iu):
+    """Return the attributes of an IU (in slots and in its __dict__).
+
+    Args:
+        iu (IncrementalUnit): The IU.
+
+    Returns:
+        dict: The names and values of the attributes that are set.
+    """
+    state = {}
+    for cls in type(iu).__mro__:
+        for name in cls.__dict__.get("__slots__", ()):
+            if name in ("__dict__", "__weakref__") or name in state:
+                continue
+            try:
+                state[name] = getattr(iu, name)
+            except AttributeError:
+                pass
+    state.update(getattr(iu, "__dict__", {}))
+    return state
+
+
+_MISSING = object()
+_DELETED = object()
+
+
+class _MetaLayer:
+    """An immutable layer of meta data that is shared by several IUs."""
+
+    __slots__ = ("data", "parent", "depth")
+
+    def __init__(self, data, parent=None):
+        if parent is not None and parent.depth >= META_DATA_MAX_DEPTH:
+            data = {**parent.flatten(), **data}
+            parent = None
+        self.data = data
+        self.parent = parent
+        self.depth = 1 if parent is None else parent.depth + 1
+
+    def flatten(self):
+        layers = []
+        layer = self
+        while layer is not None:
+            layers.append(layer.data)
+            layer = layer.parent
+        flat = {}
+        for data in reversed(layers):
+            flat.update(data)
+        return flat
+
+
+class MetaData(collections.abc.MutableMapping):
+    """The meta data of an IU as a copy-on-write chained mapping.
+
+    The meta data of an IU is based on the meta data of the IU it is grounded
+    in. Instead of copying it, the meta data of the new IU references the
+    (immutable) layers of the meta data it is based on and keeps its own
+    changes in a separate dict. When an IU is grounded in this IU, the changes
+    become a new immutable layer, so later changes of one IU are never visible
+    to the other. A chain of layers is flattened when it is deeper than
+    META_DATA_MAX_DEPTH.
+
+    A MetaData can be used like a dict (and converted with `dict(meta_data)`).
+    """
+
+    __slots__ = ("_local", "_base")
+
+    def __init__(self, data=None, base=None):
+        """Initialize the meta data.
+
+        Args:
+            data (dict): The initial content (the dict is copied).
+            base (_MetaLayer): The shared layers the meta data is based on.
+        """
+        self._local = dict(data) if data else {}
+        self._base = base
+
+    def freeze(self):
+        """Return the current content as an immutable layer that may be shared
+        with other meta data. The changes made so far are moved into the layer.
+        """
+        if self._local:
+            self._base = _MetaLayer(self._local, self._base)
+            self._local = {}
+        return self._base
+
+    def __getitem__(self, key):
+        value = self._local.get(key, _MISSING)
+        layer = self._base
+        while value is _MISSING and layer is not None:
+            value = layer.data.get(key, _MISSING)
+            layer = layer.parent
+        if value is _MISSING or value is _DELETED:
+            raise KeyError(key)
+        return value
+
+    def __setitem__(self, key, value):
+        self._local[key] = value
+
+    def __delitem__(self, key):
+        if key not in self:
+            raise KeyError(key)
+        self._local[key] = _DELETED
+
+    def _flat(self):
+        if self._base is None:
+            flat = dict(self._local)
+        else:
+            flat = self._base.flatten()
+            flat.update(self._local)
+        return {k: v for k, v in flat.items() if v is not _DELETED}
+
+    def __iter__(self):
+        return iter(self._flat())
+
+    def __len__(self):
+        return len(self._flat())
+
+    def copy(self):
+        """Return the content of the meta data as a dict."""
+        return self._flat()
+
+    def __repr__(self):
+        return "MetaData(%r)" % self._flat()
+
+
 class IncrementalUnit:
     """An abstract incremental unit.
 
@@ -52,18 +433,46 @@ class IncrementalUnit:
     information because it is working in a simulated environemnt. This data can
     be used by later modules to keep the simulation going.
 
+    The links to the previous IU and to the IU this IU is grounded in are
+    direct while the IU is in the IU history of its creator. Afterwards they
+    are resolved through the IU histories of the linked IUs (see IUHistory),
+    so they may be None for old IUs.
+
+    IUs are created at a high rate (e.g. an AudioIU every 10 ms), so the
+    attributes of an IU are stored in slots, the mutex is only created when it
+    is used and the meta data is shared with the IU it is grounded in until it
+    is changed (see MetaData). Subclasses without `__slots__` (and attributes
+    that are not in the slots) use a `__dict__` as usual.
+
     Attributes:
         creator (AbstractModule): The module that created this IU
         previous_iu (IncrementalUnit): A link to the IU created before the
             current one.
         grounded_in (IncrementalUnit): A link to the IU this IU is based on.
         created_at (float): The UNIX timestamp of the moment the IU is created.
-        meta_data (dict): Meta data that offers optional meta information. This
-            field can be used to add information that is not available for all
-            uses of the specific incremental unit.
+        meta_data (MetaData): Meta data that offers optional meta information.
+            This field can be used to add information that is not available
+            for all uses of the specific incremental unit.
     """
 
-    MAX_DEPTH = 10
+    __slots__ = (
+        "creator",
+        "iuid",
+        "_history",
+        "_history_index",
+        "_previous",
+        "_grounded",
+        "_processed_list",
+        "payload",
+        "_mutex",
+        "committed",
+        "revoked",
+        "_meta_data",
+        "_meta_source",
+        "created_at",
+        "__dict__",
+        "__weakref__",
+    )
 
     def __init__(
         self,
@@ -88,37 +497,81 @@ class IncrementalUnit:
         """
         self.creator = creator
         self.iuid = iuid
-        self.previous_iu = previous_iu
-        self.grounded_in = grounded_in
-        self._processed_list = []
+        self._history = None
+        self._history_index = None
+        self._previous = previous_iu
+        self._grounded = grounded_in
+        self._processed_list = None
         self.payload = payload
-        self.mutex = threading.Lock()
+        self._mutex = None
 
         self.committed = False
         self.revoked = False
 
-        self.meta_data = {}
+        # The meta data is based on the (shared) meta data of grounded_in. The
+        # MetaData object is only created when the meta data is accessed
+        self._meta_data = None
+        self._meta_source = None
         if grounded_in:
-            self.meta_data = {**grounded_in.meta_data}
-
-        self.created_at = time.time()
-        self._remove_old_links()
-
-    def _remove_old_links(self):
-        current_depth = 0
-        previous_iu = self.previous_iu
-        while previous_iu:
-            if current_depth == self.MAX_DEPTH:
-                previous_iu.previous_iu = None
-            previous_iu = previous_iu.previous_iu
-            current_depth += 1
-        current_depth = 0
-        grounded_in = self.grounded_in
-        while grounded_in:
-            if current_depth == self.MAX_DEPTH:
-                grounded_in.grounded_in = None
-            grounded_in = grounded_in.grounded_in
-            current_depth += 1
+            self._meta_source = grounded_in._meta_layer()
+
+        self.created_at = clock.get_clock().time()
+
+    @property
+    def mutex(self):
+        """threading.Lock: The mutex of the IU (created when first used)."""
+        if self._mutex is None:
+            with _mutex_lock:
+                if self._mutex is None:
+                    self._mutex = threading.Lock()
+        return self._mutex
+
+    @mutex.setter
+    def mutex(self, mutex):
+        self._mutex = mutex
+
+    @property
+    def meta_data(self):
+        if self._meta_data is None:
+            self._meta_data = MetaData(base=self._meta_source)
+            self._meta_source = None
+        return self._meta_data
+
+    @meta_data.setter
+    def meta_data(self, meta_data):
+        if isinstance(meta_data, MetaData):
+            self._meta_data = MetaData(base=meta_data.freeze())
+        else:
+            self._meta_data = MetaData(meta_data)
+        self._meta_source = None
+
+    def _meta_layer(self):
+        """Return the immutable layers of the meta data to share them with an
+        IU grounded in this IU."""
+        if self._meta_data is None:
+            return self._meta_source
+        return self._meta_data.freeze()
+
+    @property
+    def previous_iu(self):
+        return _resolve(self._previous)
+
+    @previous_iu.setter
+    def previous_iu(self, iu):
+        self._previous = _link(iu) if self._evicted() else iu
+
+    @property
+    def grounded_in(self):
+        return _resolve(self._grounded)
+
+    @grounded_in.setter
+    def grounded_in(self, iu):
+        self._grounded = _link(iu) if self._evicted() else iu
+
+    def _evicted(self):
+        """Return whether the IU was evicted from the history of its creator."""
+        history = self._history
+        return history is not None and history.get(self._history_index) is not self
 
     def age(self):
         """Returns the age of the IU in seconds.
@@ -126,7 +579,7 @@ class IncrementalUnit:
         Returns:
             float: The age of the IU in seconds
         """
-        return time.time() - self.created_at
+        return clock.get_clock().time() - self.created_at
 
     def older_than(self, s):
         """Return whether the IU is older than s seconds.
@@ -148,7 +601,7 @@ class IncrementalUnit:
             list: A list of all modules that have alread processed this IU.
         """
         with self.mutex:
-            return list(self._processed_list)
+            return list(self._processed_list or [])
 
     def set_processed(self, module):
         """Add the module to the list of modules that have already processed
@@ -160,7 +613,10 @@ class IncrementalUnit:
         if not isinstance(module, AbstractModule):
             raise TypeError("Given object is not a module!")
         with self.mutex:
-            self._processed_list.append(module)
+            if self._processed_list is None:
+                self._processed_list = [module]
+            else:
+                self._processed_list.append(module)
 
     def is_processed_by(self, module):
         """Return True if the IU is processed by the given module.
@@ -176,12 +632,12 @@ class IncrementalUnit:
             bool: Whether or not the module has processed the IU.
         """
         with self.mutex:
-            return module in self._processed_list
+            return module in (self._processed_list or ())
 
     def __repr__(self):
         return "%s - (%s): %s" % (
             self.type(),
-            self.creator.name(),
+            self.creator.name() if self.creator is not None else None,
             str(self.payload)[0:10],
         )
 
@@ -257,7 +713,15 @@ class AbstractModule:
                 d[k] = v
         return d
 
-    def __init__(self, queue_class=IncrementalQueue, meta_data={}, **kwargs):
+    def __new__(cls, *args, **kwargs):
+        module = super().__new__(cls)
+        # The arguments are kept to re-create the module in a worker process
+        # (see retico.core.process)
+        module._init_args = (args, kwargs)
+        return module
+
+    def __init__(self, queue_class=IncrementalQueue, meta_data={},
+                 history_size=HISTORY_SIZE, **kwargs):
         """Initialize the module with a default IncrementalQueue.
 
         Args:
@@ -268,11 +732,17 @@ class AbstractModule:
             meta_data (dict): A dict with meta data about the module. This may
                 be coordinates of the visualization of this module or other
                 auxiliary information.
+            history_size (int): The number of IUs created by the module that
+                are kept in its IU history (see IUHistory).
         """
         self._right_buffers = []
         self.is_running = False
         self._previous_iu = None
         self._left_buffers = []
+        self._input_ready = collections.deque()
+        self._input_ready_set = set()
+        self._input_condition = threading.Condition()
+        self._thread_ident = None
         self.mutex = threading.Lock()
         self.events = {}
 
@@ -285,6 +755,8 @@ class AbstractModule:
             self.queue_class = queue_class
 
         self.iu_counter = 0
+        self.iu_history = IUHistory(history_size)
+        self._metrics = metrics.ModuleMetrics()
 
     def add_left_buffer(self, left_buffer):
         """Add a new left buffer for the module.
@@ -376,10 +848,11 @@ class AbstractModule:
             return
         if not isinstance(iu, IncrementalUnit):
             raise TypeError("IU is of type %s but should be IncrementalUnit" % type(iu))
+        self._metrics.appended()
         for q in self._right_buffers:
             q.put(iu)
 
-    def subscribe(self, module, q=None):
+    def subscribe(self, module, q=None, maxsize=0, overflow=IncrementalQueue.BLOCK):
         """Subscribe a module to the queue.
 
         It returns a queue where the IUs for that module are placed. The queue
@@ -390,10 +863,14 @@ class AbstractModule:
             module (AbstractModule): The module that wants to subscribe to the
                 output of the module.
             q (IncrementalQueue): A optional queue that is used. If q is None,
-                the a new queue will be used"""
+                the a new queue will be used
+            maxsize (int): The capacity of the new queue, where 0 does not
+                restrict the size.
+            overflow (str): The overflow policy of the new queue (one of
+                IncrementalQueue.OVERFLOW_POLICIES)."""
         if not q:
             self.event_call(self.EVENT_SUBSCRIBE, {"module": module})
-            q = self.queue_class(self, module)
+            q = self.queue_class(self, module, maxsize=maxsize, overflow=overflow)
             module.add_left_buffer(q)
         self._right_buffers.append(q)
         return q
@@ -475,36 +952,113 @@ class AbstractModule:
         """
         raise NotImplementedError()
 
+    def notify_input(self, left_buffer):
+        """Notify the module that a new IU was put into one of its left buffers.
+
+        The buffers are remembered in the order in which they received data,
+        so that the module wakes up as soon as any of its left buffers receives
+        data. A buffer is remembered only once until it is drained and buffers
+        with several IUs take turns with the other ready buffers, so the number
+        of remembered buffers is bounded by the number of left buffers.
+
+        Args:
+            left_buffer (IncrementalQueue): The left buffer that received an IU.
+        """
+        with self._input_condition:
+            if left_buffer not in self._input_ready_set:
+                self._input_ready_set.add(left_buffer)
+                self._input_ready.append(left_buffer)
+            self._input_condition.notify()
+
+    def _take_input(self, buffer):
+        """Take the next IU from a ready left buffer.
+
+        The buffer stays ready (at the end of the ready buffers) as long as it
+        holds IUs.
+
+        Args:
+            buffer (IncrementalQueue): A buffer taken from the ready buffers.
+
+        Returns:
+            IncrementalUnit: The next IU of the buffer or None if the buffer
+            was cleared or removed since it became ready.
+        """
+        input_iu = None
+        if buffer in self._left_buffers:
+            # The module is busy from taking the IU until it is processed, so
+            # that a virtual clock does not advance in between.
+            clock.get_clock().begin()
+            try:
+                input_iu = buffer.get_nowait()
+            except queue.Empty:
+                clock.get_clock().end()
+        with self._input_condition:
+            if buffer in self._left_buffers and not buffer.empty():
+                self._input_ready.append(buffer)
+            else:
+                self._input_ready_set.discard(buffer)
+        if input_iu is not None:
+            tracer = trace.get_tracer()
+            if tracer is not None:
+                tracer.dequeue(input_iu, self)
+        return input_iu
+
+    def _next_input(self, timeout=QUEUE_TIMEOUT):
+        """Wait for the next IU of any left buffer.
+
+        Args:
+            timeout (float): The maximum time in seconds to wait for input.
+
+        Returns:
+            IncrementalUnit: The next IU of the ready buffers or None if no IU
+            arrived during the timeout.
+        """
+        with self._input_condition:
+            if not self._input_ready:
+                self._input_condition.wait(timeout)
+            if not self._input_ready:
+                return None
+            buffer = self._input_ready.popleft()
+        return self._take_input(buffer)
+
     def _run(self):
+        self._thread_ident = threading.get_ident()
         self.prepare_run()
         self.is_running = True
         while self.is_running:
-            for buffer in self._left_buffers:
-                with self.mutex:
-                    try:
-                        input_iu = buffer.get(timeout=QUEUE_TIMEOUT)
-                    except queue.Empty:
-                        input_iu = None
-                    if input_iu:
-                        if not self.is_valid_input_iu(input_iu):
-                            raise TypeError(
-                                "This module can't handle this " "type of IU"
-                            )
-                        self.event_call(self.EVENT_PROCESS_IU, {"iu": input_iu})
-                        output_iu = self.process_iu(input_iu)
-                        input_iu.set_processed(self)
-                        if output_iu:
-                            if self.output_iu() is not None or isinstance(
-                                output_iu, self.output_iu()
-                            ):
-                                self.append(output_iu)
-                            else:
-                                raise TypeError(
-                                    "This module should not produce"
-                                    " IUs of this type."
-                                )
+            input_iu = self._next_input()
+            if not input_iu:
+                continue
+            try:
+                self._process_input(input_iu)
+            finally:
+                clock.get_clock().end()
         self.shutdown()
 
+    def _process_input(self, input_iu):
+        with self.mutex:
+            if not self.is_valid_input_iu(input_iu):
+                raise TypeError("This module can't handle this " "type of IU")
+            self.event_call(self.EVENT_PROCESS_IU, {"iu": input_iu})
+            tracer = trace.get_tracer()
+            if tracer is not None:
+                tracer.start(input_iu, self)
+            start = time.perf_counter()
+            output_iu = self.process_iu(input_iu)
+            self._metrics.processed(time.perf_counter() - start)
+            if tracer is not None:
+                tracer.end(input_iu, self, output_iu)
+            input_iu.set_processed(self)
+            if output_iu:
+                if self.output_iu() is not None or isinstance(
+                    output_iu, self.output_iu()
+                ):
+                    self.append(output_iu)
+                else:
+                    raise TypeError(
+                        "This module should not produce" " IUs of this type."
+                    )
+
     def is_valid_input_iu(self, iu):
         """Return whether the given IU is a valid input IU.
 
@@ -575,6 +1129,8 @@ class AbstractModule:
         next possible point in time. This may be after the next incoming IU is
         processed."""
         self.is_running = False
+        with self._input_condition:
+            self._input_condition.notify_all()
         if clear_buffer:
             for buffer in self.right_buffers():
                 while not buffer.empty():
@@ -606,7 +1162,11 @@ class AbstractModule:
             grounded_in=grounded_in,
         )
         self.iu_counter += 1
+        self.iu_history.add(new_iu)
         self._previous_iu = new_iu
+        tracer = trace.get_tracer()
+        if tracer is not None:
+            tracer.create(new_iu, self, grounded_in)
         return new_iu
 
     def latest_iu(self):
@@ -623,10 +1183,31 @@ class AbstractModule:
         """
         return self._previous_iu
 
+    def metrics(self):
+        """Return a snapshot of the live metrics of the module.
+
+        The module counts the IUs it processed and appended and records the
+        duration of `process_iu` (see retico.core.metrics).
+
+        Returns:
+            dict: The IUs in and out (in total and per second), the number of
+            IUs waiting in the left buffers, the IUs dropped by the left
+            buffers, the stats of every left buffer and the histogram of the
+            processing time.
+        """
+        return metrics.module_metrics(self)
+
     def __repr__(self):
         return self.name()
 
-    def event_subscribe(self, event_name, callback):
+    def event_subscribe(
+        self,
+        event_name,
+        callback,
+        sync=False,
+        maxsize=events.DEFAULT_MAXSIZE,
+        overflow=events.DROP_OLDEST,
+    ):
         """
         Subscribe a callback to an event with the given name. If tge event name
         is "*", then the callback will be called after every event.
@@ -635,13 +1216,32 @@ class AbstractModule:
         triggered the event (AbstractModule), the name of the event (str) and a
         dict (dict) that may contain data relevant to the event.
 
+        The callback is called by the shared event dispatcher and receives the
+        events in the order in which they were called. If the callback falls
+        behind by more than `maxsize` events, events are dropped or coalesced
+        according to the `overflow` policy (see retico.core.events).
+
         Args:
             event_name (str): The name of the event to subscribe to
             callback (function): A function that is called once the event occurs
+            sync (bool): If True, the callback is called directly in the thread
+                that calls the event. This should only be used for callbacks
+                that return quickly.
+            maxsize (int): The maximum number of events waiting for the
+                callback. If 0, the number is not limited.
+            overflow (str): The policy applied when `maxsize` is reached. One of
+                the overflow policies of retico.core.events.
+
+        Returns:
+            EventSubscription: The subscription of the callback.
         """
+        subscription = events.EventSubscription(
+            callback, sync=sync, maxsize=maxsize, overflow=overflow
+        )
         if not self.events.get(event_name):
             self.events[event_name] = []
-        self.events[event_name].append(callback)
+        self.events[event_name].append(subscription)
+        return subscription
 
     def event_call(self, event_name, data={}):
         """
@@ -662,12 +1262,13 @@ class AbstractModule:
             data = {}
         if event_name == "*":
             return
+        dispatcher = events.get_dispatcher()
         if self.events.get(event_name):
-            for callback in self.events[event_name]:
-                threading.Thread(target=callback, args=(self, event_name, data)).start()
+            for subscription in self.events[event_name]:
+                dispatcher.dispatch(subscription, self, event_name, data)
         if self.events.get("*"):
-            for callback in self.events["*"]:
-                threading.Thread(target=callback, args=(self, event_name, data)).start()
+            for subscription in self.events["*"]:
+                dispatcher.dispatch(subscription, self, event_name, data)
 
 
 class AbstractProducingModule(AbstractModule):
@@ -740,7 +1341,7 @@ class AbstractConsumingModule(AbstractModule):
     def output_iu():
         return None
 
-    def subscribe(self, module, q=None):
+    def subscribe(self, module, q=None, **kwargs):
         raise ValueError("Consuming Modules do not produce any output")
 
     def process_iu(self, input_iu):
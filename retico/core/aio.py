@@ -0,0 +1,305 @@
+"""
+An asyncio runtime for incremental modules.
+
+The threaded runtime of the AbstractModule starts one thread per module (and
+additional threads for timed loops like the one of the AudioDispatcherModule).
+The AsyncModule defined here runs as a task on an asyncio event loop instead.
+All AsyncModules of a network that share an EventLoopRunner run on the same
+event loop thread, their `process_iu` methods may be coroutines, and timed loops
+can be written as coroutines that `await asyncio.sleep(...)` instead of sleeping
+threads.
+
+AsyncModules use the same IncrementalQueues as the threaded modules, so both
+kinds of modules can be mixed in one network.
+
+Example:
+    runner = EventLoopRunner()
+    runner.run(modules)  # AsyncModules run on the loop, others in threads
+    input()
+    runner.stop(modules)
+"""
+
+import asyncio
+import functools
+import inspect
+import threading
+import time
+import traceback
+
+from retico.core import abstract, clock, trace
+
+
+async def _maybe_await(result):
+    if inspect.isawaitable(result):
+        return await result
+    return result
+
+
+class EventLoopRunner:
+    """An asyncio event loop running in its own thread that executes
+    AsyncModules and coroutines.
+
+    Attributes:
+        loop (asyncio.AbstractEventLoop): The event loop of the runner.
+        thread (threading.Thread): The thread the loop is running in.
+    """
+
+    _default = None
+    _default_lock = threading.Lock()
+
+    @classmethod
+    def default(cls):
+        """Return the runner shared by all AsyncModules that are not given a
+        runner explicitly.
+
+        Returns:
+            EventLoopRunner: The default runner.
+        """
+        with cls._default_lock:
+            if cls._default is None:
+                cls._default = cls()
+            return cls._default
+
+    def __init__(self):
+        self.loop = asyncio.new_event_loop()
+        self.thread = None
+        self._mutex = threading.Lock()
+
+    def start(self):
+        """Start the thread of the event loop if it is not already running."""
+        with self._mutex:
+            if self.thread is not None:
+                return
+            self.thread = threading.Thread(target=self._run_loop, daemon=True)
+            self.thread.start()
+
+    def _run_loop(self):
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_forever()
+
+    def in_loop(self):
+        """Return whether the current thread is the thread of the event loop.
+
+        Returns:
+            bool: Whether the caller runs inside the event loop.
+        """
+        return threading.current_thread() is self.thread
+
+    def submit(self, coroutine):
+        """Schedule a coroutine on the event loop.
+
+        Args:
+            coroutine: The coroutine to execute.
+
+        Returns:
+            concurrent.futures.Future: A future for the result of the coroutine.
+        """
+        self.start()
+        return asyncio.run_coroutine_threadsafe(coroutine, self.loop)
+
+    def call_soon(self, callback, *args):
+        """Call the callback in the event loop.
+
+        If the caller already runs inside the loop, the callback is called
+        immediately.
+
+        Args:
+            callback (function): The function to call.
+        """
+        if self.in_loop():
+            callback(*args)
+        else:
+            self.loop.call_soon_threadsafe(callback, *args)
+
+    def run(self, modules):
+        """Set up and run all modules of a network.
+
+        AsyncModules are executed on the event loop of this runner, all other
+        modules are executed in their own threads. If this is called from the
+        event loop, the setup coroutines of the AsyncModules are awaited by
+        their tasks.
+
+        Args:
+            modules (list): A list of modules of the network.
+        """
+        in_loop = self.in_loop()
+        for module in modules:
+            if isinstance(module, AsyncModule):
+                module.runner = self
+                if not in_loop:
+                    module.run_setup()
+            else:
+                module.setup()
+        for module in modules:
+            module.run(run_setup=in_loop and isinstance(module, AsyncModule))
+
+    def stop(self, modules):
+        """Stop all modules of a network.
+
+        Args:
+            modules (list): A list of modules of the network.
+        """
+        for module in modules:
+            module.stop()
+
+    def close(self):
+        """Stop the event loop and wait for its thread to finish."""
+        if self.thread is None:
+            return
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+        self.thread = None
+
+
+class AsyncModule(abstract.AbstractModule):
+    """An abstract module that runs as a task on an asyncio event loop.
+
+    The methods `process_iu`, `setup`, `prepare_run` and `shutdown` may be
+    defined as coroutines. Blocking calls (e.g. HTTP requests with a
+    synchronous client) should be awaited through `run_blocking`, so that they
+    do not block the other modules on the loop.
+
+    Attributes:
+        runner (EventLoopRunner): The runner that executes the module. If None,
+            the default runner is used.
+    """
+
+    def __init__(self, *args, runner=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.runner = runner
+        self._wakeup = None
+        self._task = None
+
+    def notify_input(self, left_buffer):
+        with self._input_condition:
+            if left_buffer not in self._input_ready_set:
+                self._input_ready_set.add(left_buffer)
+                self._input_ready.append(left_buffer)
+        if self._wakeup is not None:
+            self.runner.call_soon(self._wakeup.set)
+
+    def _next_input_nowait(self):
+        while True:
+            with self._input_condition:
+                if not self._input_ready:
+                    return None
+                buffer = self._input_ready.popleft()
+            input_iu = self._take_input(buffer)
+            if input_iu is not None:
+                return input_iu
+
+    async def _run_async(self, setup=None):
+        if setup is not None:
+            await setup
+        self._wakeup = asyncio.Event()
+        await _maybe_await(self.prepare_run())
+        while self.is_running:
+            input_iu = self._next_input_nowait()
+            if not input_iu:
+                self._wakeup.clear()
+                if not self._input_ready and self.is_running:
+                    await self._wakeup.wait()
+                continue
+            try:
+                if not self.is_valid_input_iu(input_iu):
+                    raise TypeError("This module can't handle this " "type of IU")
+                self.event_call(self.EVENT_PROCESS_IU, {"iu": input_iu})
+                tracer = trace.get_tracer()
+                if tracer is not None:
+                    tracer.start(input_iu, self)
+                start = time.perf_counter()
+                output_iu = await _maybe_await(self.process_iu(input_iu))
+                self._metrics.processed(time.perf_counter() - start)
+                if tracer is not None:
+                    tracer.end(input_iu, self, output_iu)
+                input_iu.set_processed(self)
+                if output_iu:
+                    self.append(output_iu)
+            finally:
+                clock.get_clock().end()
+        self._wakeup = None
+        await _maybe_await(self.shutdown())
+
+    def run(self, run_setup=True):
+        """Run the processing pipeline of this module as a task on the event
+        loop of its runner. The task can be stopped by calling the stop()
+        method.
+
+        Args:
+            run_setup (bool): Whether or not the setup method should be executed
+                before the task is started. A setup coroutine is awaited on the
+                event loop.
+        """
+        if self.runner is None:
+            self.runner = EventLoopRunner.default()
+        setup = self.run_setup() if run_setup else None
+        for q in self.right_buffers():
+            with q.mutex:
+                q.queue.clear()
+        self.is_running = True
+        self._task = self.runner.submit(self._run_async(setup))
+        self._task.add_done_callback(self._task_done)
+        self.event_call(self.EVENT_START)
+
+    def _task_done(self, future):
+        """Report an exception that ended the task of the module and stop the
+        module (like the thread of a threaded module)."""
+        if future.cancelled() or future.exception() is None:
+            return
+        error = future.exception()
+        print("Exception in the task of %s:" % self.name())
+        traceback.print_exception(type(error), error, error.__traceback__)
+        self.stop()
+
+    def run_setup(self):
+        """Execute the setup method of the module and wait until it is done.
+
+        A setup coroutine is awaited on the event loop of the runner. If this
+        method is called from the event loop itself, it can not wait for the
+        coroutine; the coroutine is scheduled instead.
+
+        Returns:
+            asyncio.Task: The task of the setup coroutine if it was scheduled
+            (and may be awaited by the caller), None otherwise.
+        """
+        if self.runner is None:
+            self.runner = EventLoopRunner.default()
+        if self.runner.in_loop():
+            result = self.setup()
+            if inspect.isawaitable(result):
+                return asyncio.ensure_future(result)
+            return None
+        self.runner.submit(_maybe_await(self.setup())).result()
+        return None
+
+    def stop(self, clear_buffer=True):
+        super().stop(clear_buffer=clear_buffer)
+        if self._wakeup is not None:
+            self.runner.call_soon(self._wakeup.set)
+
+    def start_task(self, coroutine):
+        """Schedule a coroutine (e.g. a timed loop) on the event loop of the
+        module.
+
+        Args:
+            coroutine: The coroutine to execute.
+
+        Returns:
+            concurrent.futures.Future: A future for the result of the coroutine.
+        """
+        if self.runner is None:
+            self.runner = EventLoopRunner.default()
+        return self.runner.submit(coroutine)
+
+    async def run_blocking(self, func, *args, **kwargs):
+        """Execute a blocking function in the executor of the event loop and
+        await its result.
+
+        Args:
+            func (function): The blocking function to call.
+
+        Returns:
+            The return value of the function.
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, functools.partial(func, *args, **kwargs))
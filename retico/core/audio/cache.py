@@ -0,0 +1,346 @@
+"""
+A module for caching synthesized speech.
+
+All TTS modules share the same cache layer. An entry is addressed by a hash of
+the settings that determine the synthesized audio (backend, voice, sample rate,
+sample width and text), so any text (long or containing punctuation) maps to a
+file name of a fixed length. An entry contains the raw PCM audio and a dict of
+additional information (e.g. the timings of the words).
+
+The cache has two tiers:
+
+- A directory on disk that is bounded in size. When the size is exceeded, the
+  least recently used entries are removed. Entries are written to a temporary
+  file and then renamed, so an entry is never read half-written (even if
+  several processes share the directory).
+- An in-memory tier of the most recently used entries, so repeated prompts are
+  served without reading from disk.
+
+A synthesis that is in progress (e.g. started by a prefetch) is registered in
+the cache by `get_or_put`, so that a request for the same key waits for it
+instead of synthesizing the text a second time.
+
+Example:
+    cache = get_cache("data/tts_cache")
+    key = cache.key("mary", "bits1-hsmm", 44100, 2, "Hallo Welt")
+    entry = cache.get(key)
+    if entry is None:
+        entry = cache.put(key, synthesize("Hallo Welt"))
+    raw_audio, info = entry
+"""
+
+import collections
+import concurrent.futures
+import json
+import os
+import struct
+import tempfile
+import threading
+from hashlib import blake2b
+
+DEFAULT_MAX_BYTES = 1024 * 2 ** 20
+"""The default maximum size of the cache on disk in bytes."""
+
+DEFAULT_HOT_BYTES = 64 * 2 ** 20
+"""The default maximum size of the in-memory tier in bytes."""
+
+EXTENSION = ".tts"
+"""The file extension of cache entries."""
+
+_HEADER = struct.Struct("<4sI")
+_MAGIC = b"TTSC"
+
+
+class TTSCache:
+    """A content-addressed, size-bounded cache of synthesized speech.
+
+    Attributes:
+        directory (str): The directory of the cache on disk.
+        max_bytes (int): The maximum size of the cache on disk. If 0, the size
+            is not limited.
+        hot_bytes (int): The maximum size of the in-memory tier. If 0, entries
+            are not kept in memory.
+        hits (int): The number of requests served from memory.
+        disk_hits (int): The number of requests served from disk.
+        misses (int): The number of requests that were not in the cache.
+    """
+
+    def __init__(self, directory, max_bytes=DEFAULT_MAX_BYTES,
+                 hot_bytes=DEFAULT_HOT_BYTES):
+        """Initialize the cache.
+
+        Args:
+            directory (str): The directory of the cache on disk. It is created
+                if it does not exist.
+            max_bytes (int): The maximum size of the cache on disk.
+            hot_bytes (int): The maximum size of the in-memory tier.
+        """
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hot_bytes = hot_bytes
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self._hot = collections.OrderedDict()
+        self._hot_size = 0
+        self._pending = {}
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        self._disk_size = self._scan_size()
+
+    @staticmethod
+    def key(backend, voice, rate, sample_width, text, **settings):
+        """Return the key of a synthesis.
+
+        Args:
+            backend (str): The name of the TTS backend (e.g. "amazon").
+            voice (str): The voice (including the language if the voice name
+                does not contain it).
+            rate (int): The sample rate of the audio.
+            sample_width (int): The width of a sample in bytes.
+            text (str): The synthesized text.
+            **settings: Other settings that change the synthesized audio (e.g.
+                the speaking rate).
+
+        Returns:
+            str: The hex digest identifying the synthesis.
+        """
+        fields = [backend, voice, rate, sample_width, text]
+        fields += ["%s=%s" % (k, settings[k]) for k in sorted(settings)]
+        h = blake2b(digest_size=16)
+        for field in fields:
+            data = str(field).encode("utf-8")
+            h.update(struct.pack("<I", len(data)))
+            h.update(data)
+        return h.hexdigest()
+
+    def path(self, key):
+        """Return the path of the file of an entry on disk.
+
+        Args:
+            key (str): The key of the entry.
+        """
+        return os.path.join(self.directory, key + EXTENSION)
+
+    def get(self, key):
+        """Return an entry of the cache.
+
+        Args:
+            key (str): The key of the entry.
+
+        Returns:
+            (bytes, dict): The raw audio and the information of the entry or
+            None if the entry is not in the cache.
+        """
+        with self._lock:
+            entry = self._hot.get(key)
+            if entry is not None:
+                self._hot.move_to_end(key)
+                self.hits += 1
+                return entry[0], dict(entry[1])
+        entry = self._read(key)
+        with self._lock:
+            if entry is None:
+                self.misses += 1
+                return None
+            self.disk_hits += 1
+            self._keep_hot(key, entry)
+        return entry[0], dict(entry[1])
+
+    def put(self, key, raw_audio, info=None):
+        """Add an entry to the cache.
+
+        Args:
+            key (str): The key of the entry.
+            raw_audio (bytes): The raw PCM audio.
+            info (dict): Additional information that can be serialized to JSON
+                (e.g. the timings of the words).
+
+        Returns:
+            (bytes, dict): The raw audio and the information of the entry.
+        """
+        raw_audio = bytes(raw_audio)
+        info = dict(info or {})
+        growth = self._write(key, raw_audio, info)
+        with self._lock:
+            self._keep_hot(key, (raw_audio, info))
+            self._disk_size += growth
+            evict = self.max_bytes and self._disk_size > self.max_bytes
+        if evict:
+            self.evict()
+        return raw_audio, dict(info)
+
+    def get_or_put(self, key, synthesize):
+        """Return an entry of the cache and synthesize it if it is missing.
+
+        If the entry is being synthesized by another thread, the result of that
+        synthesis is awaited instead of synthesizing it again.
+
+        Args:
+            key (str): The key of the entry.
+            synthesize (function): A function without arguments that returns
+                the raw audio and the information of the entry.
+
+        Returns:
+            ((bytes, dict), bool): The raw audio and the information of the
+            entry and whether the entry was in the cache (or being
+            synthesized).
+        """
+        entry = self.get(key)
+        if entry is not None:
+            return entry, True
+        with self._lock:
+            future = self._pending.get(key)
+            owner = future is None
+            if owner:
+                future = concurrent.futures.Future()
+                self._pending[key] = future
+        if not owner:
+            raw_audio, info = future.result()
+            return (raw_audio, dict(info)), True
+        try:
+            raw_audio, info = synthesize()
+            entry = self.put(key, raw_audio, info)
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                del self._pending[key]
+        future.set_result(entry)
+        return (entry[0], dict(entry[1])), False
+
+    def __contains__(self, key):
+        with self._lock:
+            if key in self._hot:
+                return True
+        return os.path.isfile(self.path(key))
+
+    def _keep_hot(self, key, entry):
+        size = len(entry[0])
+        if size > self.hot_bytes:
+            return
+        old = self._hot.pop(key, None)
+        if old is not None:
+            self._hot_size -= len(old[0])
+        self._hot[key] = entry
+        self._hot_size += size
+        while self._hot_size > self.hot_bytes:
+            _, old = self._hot.popitem(last=False)
+            self._hot_size -= len(old[0])
+
+    def _read(self, key):
+        path = self.path(key)
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+        except OSError:
+            return None
+        if len(data) < _HEADER.size:
+            return None
+        magic, info_size = _HEADER.unpack_from(data)
+        if magic != _MAGIC or len(data) < _HEADER.size + info_size:
+            return None
+        try:
+            info = json.loads(data[_HEADER.size:_HEADER.size + info_size])
+        except ValueError:
+            return None
+        try:
+            os.utime(path)  # Mark the entry as recently used
+        except OSError:
+            pass
+        return data[_HEADER.size + info_size:], info
+
+    def _write(self, key, raw_audio, info):
+        """Write an entry to disk and return by how much the size of the cache
+        on disk changed (an existing entry of the key is replaced)."""
+        info_data = json.dumps(info).encode("utf-8")
+        path = self.path(key)
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(_HEADER.pack(_MAGIC, len(info_data)))
+                f.write(info_data)
+                f.write(raw_audio)
+            try:
+                old_size = os.stat(path).st_size
+            except OSError:
+                old_size = 0
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        return _HEADER.size + len(info_data) + len(raw_audio) - old_size
+
+    def _entries(self):
+        entries = []
+        with os.scandir(self.directory) as it:
+            for entry in it:
+                if not entry.name.endswith(EXTENSION):
+                    continue
+                try:
+                    stat = entry.stat()
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+        return entries
+
+    def _scan_size(self):
+        return sum(size for _, size, _ in self._entries())
+
+    def evict(self):
+        """Remove the least recently used entries from the disk until the cache
+        is smaller than its maximum size."""
+        entries = sorted(self._entries())
+        size = sum(e[1] for e in entries)
+        for _, entry_size, path in entries:
+            if not self.max_bytes or size <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            size -= entry_size
+        with self._lock:
+            self._disk_size = size
+
+    def clear(self):
+        """Remove all entries from memory and from disk."""
+        with self._lock:
+            self._hot.clear()
+            self._hot_size = 0
+        for _, _, path in self._entries():
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+        with self._lock:
+            self._disk_size = 0
+
+
+_caches = {}
+_caches_lock = threading.Lock()
+
+
+def get_cache(directory, max_bytes=DEFAULT_MAX_BYTES, hot_bytes=DEFAULT_HOT_BYTES):
+    """Return the cache of the given directory that is shared by all modules of
+    the process.
+
+    The size limits are only used when the cache is created.
+
+    Args:
+        directory (str): The directory of the cache on disk.
+        max_bytes (int): The maximum size of the cache on disk.
+        hot_bytes (int): The maximum size of the in-memory tier.
+
+    Returns:
+        TTSCache: The shared cache.
+    """
+    directory = os.path.abspath(directory)
+    with _caches_lock:
+        cache = _caches.get(directory)
+        if cache is None:
+            cache = TTSCache(directory, max_bytes, hot_bytes)
+            _caches[directory] = cache
+        return cache
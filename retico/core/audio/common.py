@@ -2,9 +2,35 @@
 This module redefines the abstract classes to fit the needs of audio processing.
 """
 
+import numpy as np
+
 from retico.core import abstract
 
 
+def as_audio_buffer(raw_audio):
+    """Return the given audio data as a read-only bytes-like object without
+    copying it.
+
+    bytes are returned as they are. Other objects supporting the buffer protocol
+    (bytearray, memoryview, np.ndarray) are wrapped in a read-only memoryview
+    that shares the memory of the given object.
+
+    Args:
+        raw_audio: The audio data (bytes, bytearray, memoryview or np.ndarray).
+
+    Returns:
+        bytes or memoryview: A read-only view on the audio data.
+    """
+    if raw_audio is None or isinstance(raw_audio, bytes):
+        return raw_audio
+    if isinstance(raw_audio, np.ndarray):
+        raw_audio = np.ascontiguousarray(raw_audio)
+    view = memoryview(raw_audio)
+    if view.format != "B" or view.ndim != 1:
+        view = view.cast("B")
+    return view.toreadonly()
+
+
 class AudioIU(abstract.IncrementalUnit):
     """An audio incremental unit that receives raw audio data from a source.
 
@@ -16,12 +42,15 @@ class AudioIU(abstract.IncrementalUnit):
             current one.
         grounded_in (IncrementalUnit): A link to the IU this IU is based on.
         created_at (float): The UNIX timestamp of the moment the IU is created.
-        raw_audio (bytes[]): The raw audio of this IU
+        raw_audio (bytes[]): The raw audio of this IU. This may be a read-only
+            memoryview that shares its memory with the audio of another IU.
         rate (int): The frame rate of this IU
         nframes (int): The number of frames of this IU
         sample_width (int): The bytes per sample of this IU
     """
 
+    __slots__ = ("raw_audio", "rate", "nframes", "sample_width")
+
     @staticmethod
     def type():
         return "Audio IU"
@@ -45,19 +74,44 @@ class AudioIU(abstract.IncrementalUnit):
             grounded_in=grounded_in,
             payload=raw_audio,
         )
-        self.raw_audio = raw_audio
+        self.raw_audio = as_audio_buffer(raw_audio)
         self.rate = rate
         self.nframes = nframes
         self.sample_width = sample_width
 
     def set_audio(self, raw_audio, nframes, rate, sample_width):
-        """Sets the audio content of the IU."""
+        """Sets the audio content of the IU.
+
+        The audio is not copied. Slices of a memoryview or a np.ndarray may be
+        given to share the audio with other IUs.
+        """
+        raw_audio = as_audio_buffer(raw_audio)
         self.raw_audio = raw_audio
         self.payload = raw_audio
         self.nframes = int(nframes)
         self.rate = int(rate)
         self.sample_width = int(sample_width)
 
+    def audio_view(self):
+        """Return a memoryview of the raw audio of this IU.
+
+        Slicing the memoryview does not copy the audio.
+
+        Returns:
+            memoryview: A read-only byte view on the raw audio.
+        """
+        return memoryview(self.raw_audio)
+
+    def audio_array(self):
+        """Return the raw audio of this IU as a np.ndarray of samples.
+
+        The array shares the memory of the raw audio and is thus read-only.
+
+        Returns:
+            np.ndarray: The samples of the audio as little-endian integers.
+        """
+        return np.frombuffer(self.raw_audio, dtype="<i%d" % self.sample_width)
+
     def audio_length(self):
         """Return the length of the audio IU in seconds.
 
@@ -73,6 +127,21 @@ class SpeechIU(AudioIU):
 
     This IU can be processed by an AudioDispatcherModule which converts this
     type of IU to AudioIU.
+
+    A streaming TTS module may output an utterance as a stream of SpeechIUs
+    (e.g. one for every phrase). The AudioDispatcherModule dispatches the IUs of
+    a stream one after another without interrupting the stream.
+
+    Attributes:
+        dispatch (bool): Whether the audio should be dispatched.
+        stream_id (int): The id of the stream the IU belongs to or None if the
+            IU contains a whole utterance.
+        stream_index (int): The position of the IU in its stream.
+        stream_final (bool): Whether the IU is the last one of its stream.
+        stream_start (float): The completion of the utterance at the start of
+            the audio of the IU.
+        stream_end (float): The completion of the utterance at the end of the
+            audio of the IU.
     """
 
     @staticmethod
@@ -82,6 +151,29 @@ class SpeechIU(AudioIU):
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
         self.dispatch = False
+        self.stream_id = None
+        self.stream_index = 0
+        self.stream_final = True
+        self.stream_start = 0.0
+        self.stream_end = 1.0
+
+    def set_stream(self, stream_id, index, final, start, end):
+        """Mark the IU as a part of a stream.
+
+        Args:
+            stream_id (int): The id of the stream.
+            index (int): The position of the IU in the stream.
+            final (bool): Whether the IU is the last one of the stream.
+            start (float): The completion of the utterance at the start of the
+                audio of the IU.
+            end (float): The completion of the utterance at the end of the audio
+                of the IU.
+        """
+        self.stream_id = stream_id
+        self.stream_index = index
+        self.stream_final = final
+        self.stream_start = start
+        self.stream_end = end
 
 
 class DispatchedAudioIU(AudioIU):
@@ -91,6 +183,8 @@ class DispatchedAudioIU(AudioIU):
     wants to track the status of the current dispatched audio.
     """
 
+    __slots__ = ("completion", "is_dispatching", "completion_words")
+
     @staticmethod
     def type():
         return "Dispatched Audio IU"
@@ -0,0 +1,255 @@
+"""
+A module for converting audio in-process.
+
+The TTS modules and the post-processing of agent sessions convert audio with
+these functions instead of writing temporary files and calling sox or ffmpeg:
+
+- `resample` converts the sample rate with a polyphase filter (a Kaiser
+  windowed sinc low-pass filter, like `sox` or `scipy.signal.resample_poly`).
+- `decode_wav` and `encode_wav` convert between WAV files (in memory) and raw
+  PCM audio.
+- `merge_wavs` merges mono WAV files into one multi-channel file (like
+  `sox -M`).
+
+All audio is little-endian signed integer PCM.
+"""
+
+import io
+import math
+import wave
+
+import numpy as np
+
+HALF_WIDTH = 16
+"""The number of zero crossings of the sinc filter on each side."""
+
+BETA = 8.0
+"""The beta parameter of the Kaiser window of the filter."""
+
+_filters = {}
+
+
+def _dtype(sample_width):
+    if sample_width == 1:
+        return np.dtype("u1")
+    if sample_width not in (2, 4):
+        raise ValueError("Unsupported sample width %d" % sample_width)
+    return np.dtype("<i%d" % sample_width)
+
+
+def to_samples(raw_audio, sample_width=2):
+    """Return the samples of raw PCM audio as a float array in [-1, 1).
+
+    Args:
+        raw_audio (bytes): The raw audio.
+        sample_width (int): The width of a sample in bytes.
+
+    Returns:
+        np.ndarray: The samples as float64.
+    """
+    samples = np.frombuffer(raw_audio, dtype=_dtype(sample_width)).astype(np.float64)
+    if sample_width == 1:  # 8 bit WAV audio is unsigned
+        return (samples - 128) / 128
+    return samples / float(2 ** (8 * sample_width - 1))
+
+
+def to_pcm(samples, sample_width=2):
+    """Return float samples in [-1, 1) as raw PCM audio.
+
+    Samples outside of the range are clipped.
+
+    Args:
+        samples (np.ndarray): The samples.
+        sample_width (int): The width of a sample in bytes.
+
+    Returns:
+        bytes: The raw audio.
+    """
+    dtype = _dtype(sample_width)
+    if sample_width == 1:
+        scaled = np.rint(samples * 128 + 128)
+    else:
+        scaled = np.rint(samples * float(2 ** (8 * sample_width - 1)))
+    info = np.iinfo(dtype)
+    return np.clip(scaled, info.min, info.max).astype(dtype).tobytes()
+
+
+def _polyphase_filter(up, down):
+    """Return the low-pass filter for resampling by up / down split into its
+    `up` phases (one row per phase)."""
+    key = (up, down)
+    if key not in _filters:
+        factor = max(up, down)
+        n_taps = 2 * HALF_WIDTH * factor + 1
+        t = np.arange(n_taps) - (n_taps - 1) / 2
+        h = np.sinc(t / factor) * np.kaiser(n_taps, BETA) * up / factor
+        length = int(math.ceil(n_taps / up))
+        h = np.concatenate([h, np.zeros(length * up - n_taps)])
+        # phases[p, j] = h[p + j * up]
+        _filters[key] = (h.reshape(length, up).T.copy(), (n_taps - 1) // 2)
+    return _filters[key]
+
+
+def resample(samples, rate_in, rate_out):
+    """Resample a signal with a polyphase filter.
+
+    The signal is upsampled by `up`, low-pass filtered and downsampled by
+    `down` (with rate_out / rate_in = up / down), but only the output samples
+    are computed and only from the non-zero samples of the upsampled signal.
+
+    Args:
+        samples (np.ndarray): The samples of the signal.
+        rate_in (int): The sample rate of the signal.
+        rate_out (int): The sample rate of the result.
+
+    Returns:
+        np.ndarray: The resampled signal (float64) with
+        ceil(len(samples) * rate_out / rate_in) samples.
+    """
+    samples = np.asarray(samples, dtype=np.float64)
+    if rate_in == rate_out:
+        return samples
+    g = math.gcd(int(rate_in), int(rate_out))
+    up, down = int(rate_out) // g, int(rate_in) // g
+    phases, delay = _polyphase_filter(up, down)
+    length = phases.shape[1]
+
+    n_out = int(math.ceil(len(samples) * up / down))
+    # Pad the signal, so that every output sample reads valid input samples
+    padded = np.concatenate([np.zeros(length), samples, np.zeros(length)])
+    windows = np.lib.stride_tricks.sliding_window_view(padded, length)
+    out = np.empty(n_out)
+    # The output samples m0, m0 + up, m0 + 2 * up, ... use the same phase of
+    # the filter and the input positions base0, base0 + down, ...
+    # out[m] = sum_j h[phase + j * up] * x[base - j]
+    for m0 in range(min(up, n_out)):
+        base0, phase = divmod(m0 * down + delay, up)
+        count = len(range(m0, n_out, up))
+        rows = windows[base0 + 1 :: down][:count]
+        out[m0::up] = rows @ phases[phase][::-1]
+    return out
+
+
+def resample_pcm(raw_audio, rate_in, rate_out, sample_width=2):
+    """Resample raw mono PCM audio.
+
+    Args:
+        raw_audio (bytes): The raw audio.
+        rate_in (int): The sample rate of the audio.
+        rate_out (int): The sample rate of the result.
+        sample_width (int): The width of a sample in bytes.
+
+    Returns:
+        bytes: The resampled raw audio.
+    """
+    if rate_in == rate_out:
+        return bytes(raw_audio)
+    samples = resample(to_samples(raw_audio, sample_width), rate_in, rate_out)
+    return to_pcm(samples, sample_width)
+
+
+def decode_wav(data):
+    """Decode a WAV file in memory.
+
+    Args:
+        data (bytes): The content of the WAV file.
+
+    Returns:
+        (bytes, int, int, int): The raw audio, the sample rate, the number of
+        channels and the sample width.
+    """
+    with wave.open(io.BytesIO(data), "rb") as wav_file:
+        raw_audio = wav_file.readframes(wav_file.getnframes())
+        return (raw_audio, wav_file.getframerate(), wav_file.getnchannels(),
+                wav_file.getsampwidth())
+
+
+def encode_wav(raw_audio, rate, channels=1, sample_width=2):
+    """Encode raw PCM audio as a WAV file in memory.
+
+    Args:
+        raw_audio (bytes): The raw (interleaved) audio.
+        rate (int): The sample rate.
+        channels (int): The number of channels.
+        sample_width (int): The width of a sample in bytes.
+
+    Returns:
+        bytes: The content of the WAV file.
+    """
+    f = io.BytesIO()
+    with wave.open(f, "wb") as wav_file:
+        wav_file.setnchannels(channels)
+        wav_file.setsampwidth(sample_width)
+        wav_file.setframerate(rate)
+        wav_file.writeframes(raw_audio)
+    return f.getvalue()
+
+
+def to_mono(raw_audio, channels, sample_width=2):
+    """Mix interleaved multi-channel PCM audio down to mono.
+
+    Args:
+        raw_audio (bytes): The raw interleaved audio.
+        channels (int): The number of channels.
+        sample_width (int): The width of a sample in bytes.
+
+    Returns:
+        bytes: The raw mono audio.
+    """
+    if channels == 1:
+        return bytes(raw_audio)
+    samples = to_samples(raw_audio, sample_width)
+    samples = samples[: len(samples) - len(samples) % channels]
+    return to_pcm(samples.reshape(-1, channels).mean(axis=1), sample_width)
+
+
+def convert_wav(data, rate, sample_width=2):
+    """Decode a WAV file in memory to raw mono PCM audio with the given sample
+    rate and sample width.
+
+    Args:
+        data (bytes): The content of the WAV file.
+        rate (int): The sample rate of the result.
+        sample_width (int): The sample width of the result.
+
+    Returns:
+        bytes: The raw audio.
+    """
+    raw_audio, wav_rate, channels, wav_width = decode_wav(data)
+    samples = to_samples(raw_audio, wav_width)
+    if channels > 1:
+        samples = samples[: len(samples) - len(samples) % channels]
+        samples = samples.reshape(-1, channels).mean(axis=1)
+    return to_pcm(resample(samples, wav_rate, rate), sample_width)
+
+
+def merge_wavs(paths, output_path):
+    """Merge mono WAV files into one WAV file with one channel per file (like
+    `sox -M`).
+
+    Shorter files are padded with silence. Files with a different sample rate
+    than the first file are resampled.
+
+    Args:
+        paths (list): The paths of the WAV files.
+        output_path (str): The path of the merged WAV file.
+    """
+    channels = []
+    rate = sample_width = None
+    for path in paths:
+        with open(path, "rb") as f:
+            raw_audio, wav_rate, n_channels, wav_width = decode_wav(f.read())
+        samples = to_samples(raw_audio, wav_width)
+        if n_channels > 1:
+            samples = samples[: len(samples) - len(samples) % n_channels]
+            samples = samples.reshape(-1, n_channels).mean(axis=1)
+        if rate is None:
+            rate, sample_width = wav_rate, wav_width
+        channels.append(resample(samples, wav_rate, rate))
+
+    merged = np.zeros((max(len(c) for c in channels), len(channels)))
+    for i, samples in enumerate(channels):
+        merged[: len(samples), i] = samples
+    with open(output_path, "wb") as f:
+        f.write(encode_wav(to_pcm(merged.reshape(-1), sample_width), rate,
+                           len(channels), sample_width))
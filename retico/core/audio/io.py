@@ -2,12 +2,12 @@
 A module for handling audio related input and output stuff.
 """
 
+import asyncio
 import threading
 import queue
-import time
 import wave
 import pyaudio
-from retico.core import abstract
+from retico.core import abstract, aio, clock
 from retico.core.audio.common import AudioIU, SpeechIU, DispatchedAudioIU
 
 import numpy as np
@@ -148,7 +148,7 @@ class SpeakerModule(abstract.AbstractConsumingModule):
         self.time = None
 
     def process_iu(self, input_iu):
-        self.stream.write(bytes(input_iu.raw_audio))
+        self.stream.write(input_iu.raw_audio)
         return None
 
     def setup(self):
@@ -283,6 +283,12 @@ class AudioDispatcherModule(abstract.AbstractModule):
     utterance, but this utterance should not be transmitted as a whole but in
     an incremental way.
 
+    The SpeechIUs of a stream (see SpeechIU) are dispatched one after another.
+    An IU that continues the stream that is currently dispatched does not
+    interrupt it, and if the next IU of the stream is not received in time, the
+    dispatcher pauses (dispatching silence) until it arrives. The completion
+    only reaches 1 with the last IU of the stream.
+
     Attributes:
         target_chunk_size (int): The size of each output IU in samples.
         silence (bytes): A bytes array containing [target_chunk_size] samples
@@ -368,6 +374,10 @@ class AudioDispatcherModule(abstract.AbstractModule):
         self.run_loop = False
         self.speed = speed
         self.interrupt = interrupt
+        self._stream_id = None
+        self._stream_open = False
+        self._stream_words = []
+        self._completion = 0.0
 
     def is_dispatching(self):
         """Return whether or not the audio dispatcher is dispatching a Speech
@@ -390,11 +400,21 @@ class AudioDispatcherModule(abstract.AbstractModule):
 
     def process_iu(self, input_iu):
         cur_width = self.target_chunk_size * self.sample_width
+        # The next IU of the stream that is currently dispatched continues the
+        # stream instead of interrupting it.
+        stream_id = getattr(input_iu, "stream_id", None)
+        continues_stream = (
+            stream_id is not None
+            and stream_id == self._stream_id
+            and input_iu.stream_index > 0
+        )
         # If the AudioDispatcherModule is set to intterupt mode or if the
         # incoming IU is set to not dispatch, we stop dispatching and clean the
         # buffer
-        if self.interrupt or not input_iu.dispatch:
-            self.set_dispatching(False)
+        if (self.interrupt and not continues_stream) or not input_iu.dispatch:
+            with self.dispatching_mutex:
+                self._is_dispatching = False
+                self._stream_open = False
             self.audio_buffer = []
 
         if input_iu.dispatch:
@@ -402,20 +422,35 @@ class AudioDispatcherModule(abstract.AbstractModule):
             # and add them to the buffer to be dispatched by the
             # _dispatch_audio_loop
             print("---- dispatch!")
+            stream_start = getattr(input_iu, "stream_start", 0.0)
+            stream_end = getattr(input_iu, "stream_end", 1.0)
+            if not continues_stream:
+                self._stream_words = []
+            prev_words = self._stream_words
             add_completed_words = False
             if hasattr(input_iu, "words") and hasattr(input_iu, "ends"):
                 rel_starts = np.array(input_iu.starts) / input_iu.duration
                 add_completed_words = True
+                self._stream_words = prev_words + list(input_iu.words)
 
+            # The chunks are views on the audio of the input IU, only the last
+            # chunk is copied to pad it with silence.
+            raw_audio = input_iu.audio_view()
             for i in range(0, input_iu.nframes, self.target_chunk_size):
                 cur_pos = i * self.sample_width
-                data = input_iu.raw_audio[cur_pos : cur_pos + cur_width]
+                data = raw_audio[cur_pos : cur_pos + cur_width]
                 distance = cur_width - len(data)
-                data += b"\0" * distance
+                if distance > 0:
+                    data = bytes(data) + b"\0" * distance
 
                 completion = float((i + self.target_chunk_size) / input_iu.nframes)
                 if completion > 1:
                     completion = 1
+                completion_words = completion
+
+                # The completion of a part of a stream is mapped to the range
+                # of the utterance it covers
+                completion = stream_start + (stream_end - stream_start) * completion
 
                 current_iu = self.create_iu(input_iu)
                 current_iu.set_dispatching(completion, True)
@@ -423,22 +458,28 @@ class AudioDispatcherModule(abstract.AbstractModule):
                     data, self.target_chunk_size, self.rate, self.sample_width
                 )
                 if add_completed_words:
-                    n_completed = (rel_starts <= completion).sum()
-                    current_iu.completion_words = " ".join(input_iu.words[:n_completed])
+                    n_completed = (rel_starts <= completion_words).sum()
+                    current_iu.completion_words = " ".join(
+                        prev_words + list(input_iu.words[:n_completed])
+                    )
                 self.audio_buffer.append(current_iu)
-            self.set_dispatching(True)
+            with self.dispatching_mutex:
+                self._stream_id = stream_id
+                self._stream_open = not getattr(input_iu, "stream_final", True)
+                self._is_dispatching = True
         return None
 
-    def _dispatch_audio_loop(self):
-        """A method run in a thread that adds IU to the output queue."""
-        while self.run_loop:
-            with self.dispatching_mutex:
-                if self._is_dispatching:
-                    if self.audio_buffer:
-                        self.append(self.audio_buffer.pop(0))
-                    else:
-                        self._is_dispatching = False
-                if not self._is_dispatching:  # no else here! bc line above
+    def _dispatch_step(self):
+        """Add the next chunk of audio (or silence) to the output queue."""
+        with self.dispatching_mutex:
+            if self._is_dispatching:
+                if self.audio_buffer:
+                    current_iu = self.audio_buffer.pop(0)
+                    self._completion = current_iu.completion
+                    self.append(current_iu)
+                elif self._stream_open:
+                    # The next part of the stream is not synthesized yet, the
+                    # utterance is paused but not finished
                     if self.continuous:
                         current_iu = self.create_iu(None)
                         current_iu.set_audio(
@@ -447,9 +488,32 @@ class AudioDispatcherModule(abstract.AbstractModule):
                             self.rate,
                             self.sample_width,
                         )
-                        current_iu.set_dispatching(0.0, False)
+                        current_iu.set_dispatching(self._completion, True)
                         self.append(current_iu)
-            time.sleep((self.target_chunk_size / self.rate) / self.speed)
+                else:
+                    self._is_dispatching = False
+            if not self._is_dispatching:  # no else here! bc line above
+                if self.continuous:
+                    current_iu = self.create_iu(None)
+                    current_iu.set_audio(
+                        self.silence,
+                        self.target_chunk_size,
+                        self.rate,
+                        self.sample_width,
+                    )
+                    current_iu.set_dispatching(0.0, False)
+                    self.append(current_iu)
+
+    def _dispatch_audio_loop(self):
+        """A method run in a thread that adds IU to the output queue."""
+        timer = clock.get_clock()
+        timer.register()
+        try:
+            while self.run_loop:
+                self._dispatch_step()
+                timer.sleep((self.target_chunk_size / self.rate) / self.speed)
+        finally:
+            timer.unregister()
 
     def setup(self):
         self.run_loop = True
@@ -461,6 +525,31 @@ class AudioDispatcherModule(abstract.AbstractModule):
         self.audio_buffer = []
 
 
+class AsyncAudioDispatcherModule(aio.AsyncModule, AudioDispatcherModule):
+    """An AudioDispatcherModule that runs on an asyncio event loop.
+
+    The timed dispatching loop is a coroutine on the event loop of the module
+    instead of a separate thread. The coroutine always sleeps in wall-clock
+    time, so this module can not be used with a VirtualClock.
+    """
+
+    @staticmethod
+    def name():
+        return "Async Audio Dispatching Module"
+
+    def setup(self):
+        self.run_loop = True
+
+    def prepare_run(self):
+        asyncio.ensure_future(self._dispatch_audio_loop_async())
+
+    async def _dispatch_audio_loop_async(self):
+        """A coroutine that adds IU to the output queue."""
+        while self.run_loop:
+            self._dispatch_step()
+            await asyncio.sleep((self.target_chunk_size / self.rate) / self.speed)
+
+
 class AudioRecorderModule(abstract.AbstractConsumingModule):
     """A Module that consumes AudioIUs and saves them as a PCM wave file to
     disk."""
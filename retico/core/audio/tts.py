@@ -0,0 +1,97 @@
+"""
+A module with helpers for streaming text-to-speech.
+
+Instead of synthesizing a whole utterance into one SpeechIU, a streaming TTS
+module splits the text into phrases and outputs a SpeechIU for every phrase as
+soon as it is synthesized. The AudioDispatcherModule continues dispatching the
+chunks of a stream without interrupting it, so the playback starts after the
+synthesis of the first phrase.
+"""
+
+import itertools
+import re
+
+MIN_PHRASE_WORDS = 3
+"""The minimum number of words of a phrase (except for the last one)."""
+
+_PHRASE_END = re.compile(r"[,.;:!?]$")
+_stream_ids = itertools.count()
+
+
+def split_phrases(text, min_words=MIN_PHRASE_WORDS):
+    """Split a text into phrases at punctuation marks.
+
+    A phrase ends with a word that ends with a punctuation mark, but only if
+    the phrase has at least `min_words` words, so that short phrases ("Yes,")
+    are synthesized together with the following phrase.
+
+    Args:
+        text (str): The text to split.
+        min_words (int): The minimum number of words of a phrase.
+
+    Returns:
+        list: The phrases of the text. Joining them with spaces results in the
+        text (with normalized whitespace).
+    """
+    phrases = []
+    phrase = []
+    for word in text.split():
+        phrase.append(word)
+        if len(phrase) >= min_words and _PHRASE_END.search(word):
+            phrases.append(" ".join(phrase))
+            phrase = []
+    if phrase:
+        phrases.append(" ".join(phrase))
+    return phrases
+
+
+def stream_speech(module, input_iu, synthesize, rate, sample_width,
+                  min_words=MIN_PHRASE_WORDS):
+    """Synthesize the text of an IU phrase by phrase and yield a SpeechIU for
+    every phrase.
+
+    The SpeechIUs of one text belong to the same stream. Their completion range
+    is the range of the characters of the phrase in the text, so that the
+    completion of the dispatched audio approximates the completion of the whole
+    utterance although its length is not known before the last phrase is
+    synthesized.
+
+    If a new IU is waiting in an input queue of the module (e.g. to interrupt
+    the utterance), the synthesis of the remaining phrases is aborted.
+
+    Args:
+        module (AbstractModule): The TTS module that creates the IUs.
+        input_iu (IncrementalUnit): The IU with the text to synthesize.
+        synthesize (function): A function that takes a text and returns the
+            raw audio and a dict with the word timings ("words", "starts",
+            "ends" and "duration") that may be empty.
+        rate (int): The sample rate of the synthesized audio.
+        sample_width (int): The sample width of the synthesized audio.
+        min_words (int): The minimum number of words of a phrase.
+
+    Yields:
+        SpeechIU: The IU of every phrase.
+    """
+    phrases = split_phrases(input_iu.get_text(), min_words)
+    total = max(sum(len(p) for p in phrases), 1)
+    stream_id = next(_stream_ids)
+    start = 0
+    for i, phrase in enumerate(phrases):
+        if i > 0 and any(not q.empty() for q in module.left_buffers()):
+            return
+        raw_audio, info = synthesize(phrase)
+        end = start + len(phrase)
+        final = i == len(phrases) - 1
+        output_iu = module.create_iu(input_iu)
+        output_iu.set_audio(raw_audio, len(raw_audio) / sample_width, rate,
+                            sample_width)
+        output_iu.set_stream(stream_id, i, final, start / total,
+                             1.0 if final else end / total)
+        if info.get("words") is not None:
+            output_iu.words = info["words"]
+            output_iu.starts = info["starts"]
+            output_iu.ends = info.get("ends")
+            output_iu.duration = info.get("duration") or output_iu.audio_length()
+        output_iu.dispatch = input_iu.dispatch
+        start = end
+        yield output_iu
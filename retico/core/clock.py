@@ -0,0 +1,253 @@
+"""
+A module that defines the clock used by the modules of a network.
+
+By default, the network runs in wall-clock time (WallClock). Timed loops (like
+the one of the AudioDispatcherModule or the dialogue loop of the
+TurnTakingDialogueManagerModule), the age of IUs and delays of the network
+degradations use the clock returned by `get_clock`, so that a simulation can
+run with a VirtualClock instead.
+
+The VirtualClock is a discrete-event clock. Its time only advances when every
+thread that waits for time to pass is sleeping in the clock and the network is
+idle (no IU is waiting in a queue of a running module, no module is processing
+an IU and no event is waiting for its callbacks). Then the time jumps to the
+next wake-up time and the threads due at that time are woken. A simulation thus
+runs as fast as the CPU allows and the order of the timed actions does not
+depend on the load of the machine.
+
+Example:
+    clock.set_clock(clock.VirtualClock())
+    modules, _ = headless.load("simulation.rtc")
+    headless.run(modules)
+"""
+
+import heapq
+import itertools
+import threading
+import time
+import weakref
+
+_queues = weakref.WeakSet()
+_queues_lock = threading.Lock()
+
+
+def track_queue(q):
+    """Register an IncrementalQueue whose content is checked by the
+    VirtualClock before it advances the time.
+
+    Args:
+        q (IncrementalQueue): The queue to track.
+    """
+    with _queues_lock:
+        _queues.add(q)
+
+
+def _network_idle(sleeping):
+    with _queues_lock:
+        queues = list(_queues)
+    for q in queues:
+        consumer = q.consumer
+        if consumer is None or not consumer.is_running:
+            continue
+        # A module that sleeps in the clock can only continue after the time
+        # advanced, so the IUs waiting for it do not keep the clock back.
+        if getattr(consumer, "_thread_ident", None) in sleeping:
+            continue
+        if not q.empty():
+            return False
+    return True
+
+
+class WallClock:
+    """A clock that follows the time of the system."""
+
+    def time(self):
+        """Return the current time in seconds since the epoch.
+
+        Returns:
+            float: The current time.
+        """
+        return time.time()
+
+    def sleep(self, seconds):
+        """Suspend the calling thread for the given number of seconds.
+
+        Args:
+            seconds (float): The time to sleep.
+        """
+        if seconds > 0:
+            time.sleep(seconds)
+
+    def register(self):
+        """Register the calling thread as a timed loop that regularly sleeps in
+        the clock. The time does not advance while a registered thread is
+        running."""
+        pass
+
+    def unregister(self):
+        """Unregister the calling thread."""
+        pass
+
+    def begin(self):
+        """Mark the calling thread as busy (e.g. while processing an IU)."""
+        pass
+
+    def end(self):
+        """Mark the end of work started in the calling thread with `begin`."""
+        pass
+
+    def begin_task(self):
+        """Mark the start of work that is finished in another thread (e.g. an
+        event waiting for its callbacks)."""
+        pass
+
+    def end_task(self):
+        """Mark the end of work started with `begin_task`."""
+        pass
+
+
+class VirtualClock(WallClock):
+    """A discrete-event clock for simulations.
+
+    Attributes:
+        now (float): The current virtual time in seconds.
+    """
+
+    CHECK_INTERVAL = 0.01
+    """The interval in (wall-clock) seconds in which the scheduler checks
+    whether the network is idle, if it was not notified of a change."""
+
+    def __init__(self, start=0.0):
+        """Initialize the clock.
+
+        Args:
+            start (float): The virtual time at which the clock starts.
+        """
+        self.now = start
+        self._cond = threading.Condition()
+        self._participants = set()
+        self._sleeping = set()
+        self._sleepers = []
+        self._seq = itertools.count()
+        self._held = {}
+        self._busy = 0
+        self._busy_sleeping = 0
+        self._tasks = 0
+        self._scheduler = None
+
+    def time(self):
+        return self.now
+
+    def _start_scheduler(self):
+        if self._scheduler is None:
+            self._scheduler = threading.Thread(target=self._schedule, daemon=True)
+            self._scheduler.start()
+
+    def register(self):
+        with self._cond:
+            self._participants.add(threading.get_ident())
+            self._start_scheduler()
+
+    def unregister(self):
+        with self._cond:
+            self._participants.discard(threading.get_ident())
+            self._cond.notify_all()
+
+    def begin(self):
+        ident = threading.get_ident()
+        with self._cond:
+            self._held[ident] = self._held.get(ident, 0) + 1
+            self._busy += 1
+
+    def end(self):
+        ident = threading.get_ident()
+        with self._cond:
+            held = self._held.get(ident, 0)
+            if held <= 1:
+                self._held.pop(ident, None)
+            else:
+                self._held[ident] = held - 1
+            if held:
+                self._busy -= 1
+            self._cond.notify_all()
+
+    def begin_task(self):
+        with self._cond:
+            self._tasks += 1
+
+    def end_task(self):
+        with self._cond:
+            self._tasks -= 1
+            self._cond.notify_all()
+
+    def sleep(self, seconds):
+        """Suspend the calling thread until the virtual time advanced by the
+        given number of seconds.
+
+        A thread that is not registered counts as registered while it sleeps.
+        If the thread is busy (e.g. a module that delays an IU), it does not
+        keep the time from advancing while it sleeps.
+
+        Args:
+            seconds (float): The virtual time to sleep.
+        """
+        ident = threading.get_ident()
+        with self._cond:
+            self._start_scheduler()
+            temporary = ident not in self._participants
+            self._participants.add(ident)
+            held = self._held.get(ident, 0)
+            self._busy_sleeping += held
+            entry = [self.now + max(seconds, 0), next(self._seq), False]
+            heapq.heappush(self._sleepers, entry)
+            self._sleeping.add(ident)
+            self._cond.notify_all()
+            while not entry[2]:
+                self._cond.wait()
+            self._sleeping.discard(ident)
+            self._busy_sleeping -= held
+            if temporary:
+                self._participants.discard(ident)
+
+    def _can_advance(self):
+        return (
+            self._sleepers
+            and len(self._sleepers) >= len(self._participants)
+            and self._busy - self._busy_sleeping <= 0
+            and self._tasks <= 0
+            and _network_idle(self._sleeping)
+        )
+
+    def _schedule(self):
+        with self._cond:
+            while True:
+                self._cond.wait(self.CHECK_INTERVAL)
+                if not self._can_advance():
+                    continue
+                self.now = max(self.now, self._sleepers[0][0])
+                while self._sleepers and self._sleepers[0][0] <= self.now:
+                    heapq.heappop(self._sleepers)[2] = True
+                self._cond.notify_all()
+
+
+_clock = WallClock()
+
+
+def get_clock():
+    """Return the clock that is used by the modules.
+
+    Returns:
+        WallClock: The current clock.
+    """
+    return _clock
+
+
+def set_clock(new_clock):
+    """Set the clock that is used by the modules. This should be done before
+    the network is built and run.
+
+    Args:
+        new_clock (WallClock): The new clock (e.g. a VirtualClock).
+    """
+    global _clock
+    _clock = new_clock
@@ -0,0 +1,303 @@
+"""
+A module for dispatching the events of modules to their subscribed callbacks.
+
+Instead of starting a new thread for every callback on every event, events are
+handed to a shared pool of worker threads. Every subscription has its own queue
+of pending events that is worked off by at most one worker at a time, so a
+callback receives the events of a module in the order in which they were
+called. If a callback can not keep up, the queue of its subscription is bounded
+and events are dropped or coalesced according to its overflow policy.
+
+Callbacks may block (e.g. on a TTS or HTTP request). When all workers are busy,
+a new worker is started for the next subscription, so blocking callbacks never
+hold up the other subscriptions. Workers beyond `max_workers` exit when they
+are idle for IDLE_TIMEOUT seconds.
+
+Callbacks that are cheap and thread safe may be subscribed with `sync=True`. They
+are called directly in the thread of the module that calls the event.
+"""
+
+import collections
+import concurrent.futures
+import threading
+import traceback
+
+from retico.core import clock
+
+DROP_OLDEST = "drop_oldest"
+"""Overflow policy: Drop the oldest pending event to make room for a new one."""
+DROP_NEWEST = "drop_newest"
+"""Overflow policy: Drop the new event if the subscription is full."""
+COALESCE = "coalesce"
+"""Overflow policy: Replace a pending event with the same name by the new one.
+If no such event is pending, the oldest event is dropped."""
+OVERFLOW_POLICIES = [DROP_OLDEST, DROP_NEWEST, COALESCE]
+
+DEFAULT_MAXSIZE = 1000
+"""The default number of pending events of a subscription."""
+
+DEFAULT_WORKERS = 8
+"""The default number of worker threads that the dispatcher keeps when they are
+idle."""
+
+IDLE_TIMEOUT = 5.0
+"""The time in seconds after which an idle worker beyond `max_workers` exits."""
+
+THREAD_NAME_PREFIX = "retico-events"
+"""The name prefix of the worker threads of the dispatcher."""
+
+BATCH_SIZE = 32
+"""The number of events a worker delivers to one subscription before it gives
+other subscriptions a turn."""
+
+
+class EventSubscription:
+    """A callback that is subscribed to events of a module.
+
+    Attributes:
+        callback (function): The function that is called with the module, the
+            name of the event and the data of the event.
+        sync (bool): Whether the callback is called directly in the thread
+            that calls the event.
+        maxsize (int): The maximum number of pending events. If 0, the number
+            of pending events is not limited.
+        overflow (str): The overflow policy that is applied if the maximum
+            number of pending events is reached.
+        dropped (int): The number of events that were dropped or coalesced.
+    """
+
+    def __init__(self, callback, sync=False, maxsize=DEFAULT_MAXSIZE, overflow=DROP_OLDEST):
+        if overflow not in OVERFLOW_POLICIES:
+            raise ValueError(
+                "Unknown overflow policy %s, choose one of %s"
+                % (overflow, OVERFLOW_POLICIES)
+            )
+        self.callback = callback
+        self.sync = sync
+        self.maxsize = maxsize
+        self.overflow = overflow
+        self.dropped = 0
+        self._pending = collections.deque()
+        self._scheduled = False
+        self._mutex = threading.Lock()
+
+    def push(self, module, event_name, data):
+        """Add an event to the pending events of this subscription.
+
+        Returns:
+            (bool, bool): Whether the subscription has to be scheduled on a
+            worker and whether an event was dropped.
+        """
+        event = (module, event_name, data)
+        dropped = False
+        with self._mutex:
+            if self.maxsize > 0 and len(self._pending) >= self.maxsize:
+                self.dropped += 1
+                dropped = True
+                if self.overflow == DROP_NEWEST:
+                    return False, dropped
+                if self.overflow == COALESCE:
+                    for i, pending in enumerate(self._pending):
+                        if pending[1] == event_name:
+                            del self._pending[i]
+                            break
+                    else:
+                        self._pending.popleft()
+                else:
+                    self._pending.popleft()
+            self._pending.append(event)
+            if self._scheduled:
+                return False, dropped
+            self._scheduled = True
+            return True, dropped
+
+    def pop(self):
+        """Return the next pending event or None if there is none.
+
+        If there are no pending events, the subscription is marked as not
+        scheduled so that the next event schedules it again.
+        """
+        with self._mutex:
+            if self._pending:
+                return self._pending.popleft()
+            self._scheduled = False
+            return None
+
+    def clear(self):
+        """Remove all pending events and mark the subscription as not
+        scheduled.
+
+        Returns:
+            int: The number of removed events.
+        """
+        with self._mutex:
+            n = len(self._pending)
+            self._pending.clear()
+            self._scheduled = False
+            return n
+
+    def __len__(self):
+        return len(self._pending)
+
+
+class EventDispatcher:
+    """Delivers events to subscriptions with a pool of worker threads.
+
+    Attributes:
+        max_workers (int): The number of worker threads that are kept when
+            they are idle. More workers are started while all workers are busy.
+    """
+
+    def __init__(self, max_workers=DEFAULT_WORKERS):
+        self.max_workers = max_workers
+        self._work = collections.deque()
+        self._workers = set()
+        self._idle = 0
+        self._started = 0
+        self._shutdown = False
+        self._condition = threading.Condition()
+
+    def dispatch(self, subscription, module, event_name, data):
+        """Deliver an event to a subscription.
+
+        Args:
+            subscription (EventSubscription): The subscription of the callback.
+            module (AbstractModule): The module that called the event.
+            event_name (str): The name of the event.
+            data (dict): The data of the event.
+        """
+        if subscription.sync:
+            _call(subscription.callback, (module, event_name, data))
+            return
+        # Pending events keep a virtual clock from advancing
+        clock.get_clock().begin_task()
+        schedule, dropped = subscription.push(module, event_name, data)
+        if dropped:
+            clock.get_clock().end_task()
+        if schedule and not self._submit(subscription):
+            # The dispatcher is shut down, the events are not delivered
+            for _ in range(subscription.clear()):
+                clock.get_clock().end_task()
+
+    def _submit(self, subscription):
+        """Hand a subscription to an idle worker or to a new worker if all
+        workers are busy.
+
+        Returns:
+            bool: Whether the subscription was submitted (False after
+            `shutdown`).
+        """
+        with self._condition:
+            if self._shutdown:
+                return False
+            self._work.append(subscription)
+            if len(self._work) <= self._idle:
+                self._condition.notify()
+                return True
+            worker = threading.Thread(
+                target=self._run_worker,
+                name="%s-%d" % (THREAD_NAME_PREFIX, self._started),
+                daemon=True,
+            )
+            self._workers.add(worker)
+            self._started += 1
+        worker.start()
+        return True
+
+    def _run_worker(self):
+        worker = threading.current_thread()
+        while True:
+            with self._condition:
+                while not self._work and not self._shutdown:
+                    self._idle += 1
+                    notified = self._condition.wait(IDLE_TIMEOUT)
+                    self._idle -= 1
+                    if (
+                        not notified
+                        and not self._work
+                        and len(self._workers) > self.max_workers
+                    ):
+                        self._workers.discard(worker)
+                        return
+                if not self._work:
+                    self._workers.discard(worker)
+                    return
+                subscription = self._work.popleft()
+            self._deliver(subscription)
+
+    def _deliver(self, subscription):
+        delivered = 0
+        while True:
+            event = subscription.pop()
+            if event is None:
+                return
+            try:
+                _call(subscription.callback, event)
+            finally:
+                clock.get_clock().end_task()
+            delivered += 1
+            if delivered >= BATCH_SIZE and not self._shutdown:
+                break
+        # Give the other subscriptions a turn before continuing
+        with self._condition:
+            if not self._shutdown:
+                self._work.append(subscription)
+                return
+        # After the shutdown, the remaining events are delivered by this worker
+        self._deliver(subscription)
+
+    def shutdown(self, wait=True):
+        """Shut down the worker threads of the dispatcher.
+
+        Events of subscriptions that are already scheduled are still
+        delivered, new events are dropped.
+
+        Args:
+            wait (bool): Whether to wait for the pending events to be delivered.
+        """
+        with self._condition:
+            self._shutdown = True
+            self._condition.notify_all()
+            workers = list(self._workers)
+        if wait:
+            for worker in workers:
+                if worker is not threading.current_thread():
+                    worker.join()
+
+
+def _call(callback, event):
+    try:
+        callback(*event)
+    except Exception:
+        traceback.print_exc()
+
+
+_dispatcher = None
+_dispatcher_lock = threading.Lock()
+
+
+def get_dispatcher():
+    """Return the event dispatcher that is shared by all modules.
+
+    Returns:
+        EventDispatcher: The shared event dispatcher.
+    """
+    global _dispatcher
+    dispatcher = _dispatcher
+    if dispatcher is None:
+        with _dispatcher_lock:
+            if _dispatcher is None:
+                _dispatcher = EventDispatcher()
+            dispatcher = _dispatcher
+    return dispatcher
+
+
+def set_dispatcher(dispatcher):
+    """Replace the event dispatcher that is shared by all modules.
+
+    Args:
+        dispatcher (EventDispatcher): The new event dispatcher.
+    """
+    global _dispatcher
+    with _dispatcher_lock:
+        _dispatcher = dispatcher
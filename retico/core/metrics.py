@@ -0,0 +1,426 @@
+"""
+A module for the live metrics of the modules of a network.
+
+Every module counts the IUs it takes from its left buffers and the IUs it
+appends to its right buffers and records the duration of every call of
+`process_iu` in a histogram. The input counters and the histogram are only
+written by the thread of the module and read without a lock, so that they are
+cheap enough to be always on. IUs may be appended from other threads (e.g. the
+producer threads of a streaming TTS or the receiving thread of a process
+backend), so the output counter is guarded by a lock, as are the samples for
+the IUs per second, which are updated by the readers. Together
+with the counters of the left buffers (see IncrementalQueue.stats) they are
+exposed by `AbstractModule.metrics()`.
+
+The metrics of a network can be served in the text format of Prometheus by a
+local HTTP server (MetricsServer) or shown in the terminal (`dashboard`), so
+that overloaded modules are visible while a network runs.
+
+Example:
+    modules, _ = headless.load("agent.rtc")
+    server = metrics.MetricsServer(modules, port=9100)
+    server.start()
+    ...
+    metrics.dashboard(modules)
+"""
+
+import bisect
+import collections
+import json
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+PROCESSING_BUCKETS = (
+    0.0001,
+    0.0002,
+    0.0005,
+    0.001,
+    0.002,
+    0.005,
+    0.01,
+    0.02,
+    0.05,
+    0.1,
+    0.2,
+    0.5,
+    1.0,
+    2.0,
+    5.0,
+    10.0,
+)
+"""The upper bounds (in seconds) of the buckets of the processing histogram."""
+
+RATE_WINDOW = 5.0
+"""The time in seconds over which the IUs per second are computed."""
+
+
+class Histogram:
+    """A histogram of durations (in seconds) with fixed bucket bounds.
+
+    It is used for the processing times of the modules and for the latencies
+    of the services of the agent (see retico.agent.service).
+
+    Attributes:
+        buckets (tuple): The upper bounds of the buckets. The last bucket
+            counts the durations above the last bound.
+        counts (list): The number of durations per bucket.
+        count (int): The number of durations.
+        total (float): The sum of the durations.
+        max (float): The longest duration.
+    """
+
+    __slots__ = ("buckets", "counts", "count", "total", "max")
+
+    def __init__(self, buckets=PROCESSING_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, seconds):
+        """Add a duration to the histogram.
+
+        Args:
+            seconds (float): The duration.
+        """
+        self.counts[bisect.bisect_left(self.buckets, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    @property
+    def mean(self):
+        return self.total / self.count if self.count else 0.0
+
+    def quantile(self, q):
+        """Return the upper bound of the bucket that contains the quantile.
+
+        Args:
+            q (float): The quantile (between 0 and 1).
+
+        Returns:
+            float: The upper bound of the bucket (or the maximum if the
+            quantile is in the last bucket).
+        """
+        if self.count == 0:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for bound, n in zip(self.buckets, self.counts):
+            seen += n
+            if seen >= rank:
+                return min(bound, self.max)
+        return self.max
+
+    def to_dict(self):
+        """Return the histogram as a dict.
+
+        Returns:
+            dict: The count, mean, median, 95th and 99th percentile and
+            maximum of the durations and the counts per bucket.
+        """
+        return {
+            "count": self.count,
+            "mean": self.mean,
+            "p50": self.quantile(0.5),
+            "p95": self.quantile(0.95),
+            "p99": self.quantile(0.99),
+            "max": self.max,
+            "buckets": list(self.buckets),
+            "counts": list(self.counts),
+        }
+
+
+class ModuleMetrics:
+    """The counters of a module.
+
+    Attributes:
+        ius_in (int): The number of IUs taken from the left buffers.
+        ius_out (int): The number of IUs appended to the right buffers.
+        processing (Histogram): The durations of `process_iu`.
+        started_at (float): The time at which the counters were created.
+    """
+
+    __slots__ = ("ius_in", "ius_out", "processing", "started_at", "_samples", "_lock")
+
+    def __init__(self, buckets=PROCESSING_BUCKETS):
+        self.ius_in = 0
+        self.ius_out = 0
+        self.processing = Histogram(buckets)
+        self.started_at = time.monotonic()
+        self._samples = collections.deque([(self.started_at, 0, 0)])
+        self._lock = threading.Lock()
+
+    def processed(self, seconds):
+        """Count an input IU that was processed in the given time."""
+        self.ius_in += 1
+        # Histogram.add inlined, as it is called for every IU
+        histogram = self.processing
+        histogram.counts[bisect.bisect_left(histogram.buckets, seconds)] += 1
+        histogram.count += 1
+        histogram.total += seconds
+        if seconds > histogram.max:
+            histogram.max = seconds
+
+    def appended(self):
+        """Count an IU appended to the right buffers (from any thread)."""
+        with self._lock:
+            self.ius_out += 1
+
+    def rates(self):
+        """Return the IUs in and out per second over the last RATE_WINDOW
+        seconds (or since the counters were created).
+
+        Returns:
+            (float, float): The IUs in and out per second.
+        """
+        # The metrics may be read from several threads (e.g. the HTTP server)
+        with self._lock:
+            now = time.monotonic()
+            ius_in, ius_out = self.ius_in, self.ius_out
+            samples = self._samples
+            samples.append((now, ius_in, ius_out))
+            while len(samples) > 2 and now - samples[1][0] >= RATE_WINDOW:
+                samples.popleft()
+            t, n_in, n_out = samples[0]
+        if now <= t:
+            return 0.0, 0.0
+        return (ius_in - n_in) / (now - t), (ius_out - n_out) / (now - t)
+
+
+def module_metrics(module):
+    """Return a snapshot of the metrics of a module.
+
+    Args:
+        module (AbstractModule): The module.
+
+    Returns:
+        dict: The name of the module, whether it is running, the IUs in and out
+        (in total and per second), the number of IUs waiting in its left
+        buffers ("queue_depth"), the IUs dropped by its left buffers, the
+        stats of every left buffer and the processing histogram.
+    """
+    counters = module._metrics
+    in_rate, out_rate = counters.rates()
+    buffers = [q.stats() for q in module.left_buffers()]
+    for q, stats in zip(module.left_buffers(), buffers):
+        stats["provider"] = q.provider.name() if q.provider is not None else None
+    return {
+        "name": module.name(),
+        "running": module.is_running,
+        "ius_in": counters.ius_in,
+        "ius_out": counters.ius_out,
+        "in_per_second": in_rate,
+        "out_per_second": out_rate,
+        "queue_depth": sum(s["size"] for s in buffers),
+        "dropped": sum(s["dropped"] for s in buffers),
+        "left_buffers": buffers,
+        "processing": counters.processing.to_dict(),
+    }
+
+
+def collect(modules):
+    """Return the metrics of all given modules.
+
+    Args:
+        modules (list): The modules of a network.
+
+    Returns:
+        list: The metrics of every module (see `module_metrics`).
+    """
+    return [module.metrics() for module in modules]
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def to_prometheus(modules):
+    """Format the metrics of the modules in the text format of Prometheus.
+
+    The modules are labeled with their name and their index in the list, as
+    the names of the modules of a network need not be unique.
+
+    Args:
+        modules (list): The modules of a network.
+
+    Returns:
+        str: The metrics in the Prometheus text exposition format.
+    """
+    lines = []
+    series = collections.defaultdict(list)
+    for index, m in enumerate(collect(modules)):
+        labels = 'module="%s",index="%d"' % (_escape(m["name"]), index)
+        series["retico_ius_in_total"].append("{%s} %d" % (labels, m["ius_in"]))
+        series["retico_ius_out_total"].append("{%s} %d" % (labels, m["ius_out"]))
+        series["retico_ius_in_per_second"].append("{%s} %f" % (labels, m["in_per_second"]))
+        series["retico_ius_out_per_second"].append(
+            "{%s} %f" % (labels, m["out_per_second"])
+        )
+        series["retico_queue_depth"].append("{%s} %d" % (labels, m["queue_depth"]))
+        series["retico_dropped_total"].append("{%s} %d" % (labels, m["dropped"]))
+        processing = m["processing"]
+        cumulative = 0
+        for bound, n in zip(processing["buckets"], processing["counts"]):
+            cumulative += n
+            series["retico_process_seconds"].append(
+                '_bucket{%s,le="%g"} %d' % (labels, bound, cumulative)
+            )
+        series["retico_process_seconds"].append(
+            '_bucket{%s,le="+Inf"} %d' % (labels, processing["count"])
+        )
+        series["retico_process_seconds"].append(
+            "_sum{%s} %f" % (labels, processing["mean"] * processing["count"])
+        )
+        series["retico_process_seconds"].append(
+            "_count{%s} %d" % (labels, processing["count"])
+        )
+    types = {
+        "retico_ius_in_total": ("counter", "IUs taken from the left buffers."),
+        "retico_ius_out_total": ("counter", "IUs appended to the right buffers."),
+        "retico_ius_in_per_second": ("gauge", "IUs in per second."),
+        "retico_ius_out_per_second": ("gauge", "IUs out per second."),
+        "retico_queue_depth": ("gauge", "IUs waiting in the left buffers."),
+        "retico_dropped_total": ("counter", "IUs dropped by the left buffers."),
+        "retico_process_seconds": ("histogram", "Duration of process_iu."),
+    }
+    for name, (metric_type, description) in types.items():
+        lines.append("# HELP %s %s" % (name, description))
+        lines.append("# TYPE %s %s" % (name, metric_type))
+        for sample in series[name]:
+            lines.append(name + sample)
+    return "\n".join(lines) + "\n"
+
+
+class MetricsServer:
+    """A local HTTP server for the metrics of a network.
+
+    The metrics are served in the text format of Prometheus at /metrics and as
+    JSON at /metrics.json.
+
+    Attributes:
+        modules (list): The modules of the network.
+        host (str): The address the server binds to.
+        port (int): The port of the server (0 for a free port, which is set
+            when the server is started).
+    """
+
+    def __init__(self, modules, port=9100, host="127.0.0.1"):
+        self.modules = modules
+        self.host = host
+        self.port = port
+        self._server = None
+        self._thread = None
+
+    def _handler(self):
+        server = self
+
+        class MetricsHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path == "/metrics":
+                    body = to_prometheus(server.modules).encode()
+                    content_type = "text/plain; version=0.0.4"
+                elif self.path == "/metrics.json":
+                    body = json.dumps(collect(server.modules)).encode()
+                    content_type = "application/json"
+                else:
+                    self.send_error(404)
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        return MetricsHandler
+
+    def start(self):
+        """Start serving the metrics in a background thread."""
+        if self._server is not None:
+            return
+        self._server = ThreadingHTTPServer((self.host, self.port), self._handler())
+        self._server.daemon_threads = True
+        self.port = self._server.server_port
+        self._thread = threading.Thread(
+            target=self._server.serve_forever, name="retico-metrics", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self):
+        """Stop the server."""
+        if self._server is None:
+            return
+        self._server.shutdown()
+        self._server.server_close()
+        self._thread.join()
+        self._server = None
+        self._thread = None
+
+
+def format_table(snapshots):
+    """Format the metrics of modules as a table.
+
+    Args:
+        snapshots (list): The metrics of the modules (see `collect`).
+
+    Returns:
+        str: The table with a line per module.
+    """
+    header = "%-30s %8s %8s %6s %7s %9s %9s %9s" % (
+        "module",
+        "in/s",
+        "out/s",
+        "queue",
+        "dropped",
+        "p50 (ms)",
+        "p95 (ms)",
+        "max (ms)",
+    )
+    lines = [header, "-" * len(header)]
+    for m in snapshots:
+        p = m["processing"]
+        lines.append(
+            "%-30s %8.1f %8.1f %6d %7d %9.2f %9.2f %9.2f"
+            % (
+                m["name"][:30],
+                m["in_per_second"],
+                m["out_per_second"],
+                m["queue_depth"],
+                m["dropped"],
+                p["p50"] * 1000,
+                p["p95"] * 1000,
+                p["max"] * 1000,
+            )
+        )
+    return "\n".join(lines)
+
+
+def dashboard(modules, interval=1.0, iterations=None, stream=None):
+    """Show the metrics of the modules in the terminal until interrupted.
+
+    Args:
+        modules (list): The modules of a network.
+        interval (float): The time in seconds between two updates.
+        iterations (int): The number of updates (None for no limit).
+        stream: The stream to write to (sys.stdout by default).
+    """
+    stream = stream or sys.stdout
+    n = 0
+    try:
+        while iterations is None or n < iterations:
+            if stream.isatty():
+                stream.write("\x1b[H\x1b[2J")  # clear the screen
+            stream.write(format_table(collect(modules)) + "\n\n")
+            stream.flush()
+            n += 1
+            if iterations is None or n < iterations:
+                time.sleep(interval)
+    except KeyboardInterrupt:
+        pass
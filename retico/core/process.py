@@ -0,0 +1,448 @@
+"""
+A module that allows the processing of chosen modules to be executed in a
+worker process.
+
+Every module runs in its own thread, so CPU-heavy modules share the global
+interpreter lock with all other modules of the network (e.g. the audio path).
+With `run_in_process`, the processing of a module is moved to a worker process,
+while the module itself stays in the network. Thus, the network can be built
+and changed with `subscribe` and `remove_from_rb` as usual.
+
+The worker process is started with the "spawn" method when the module is set
+up, as forking a process whose network threads (and the event dispatcher) are
+already running may deadlock on locks held at the time of the fork. The module
+is re-created in the worker by calling its class with the arguments it was
+created with, so objects that can not be pickled (e.g. the Vad of VADFrames)
+are created again by `__init__` (or `setup`, which runs in the worker). The
+attributes that can be pickled are copied to the worker afterwards. Thus, the
+arguments of the module have to be picklable and the classes of the module and
+its IUs have to be importable by the worker (not defined in a function or in
+an unguarded `__main__` script).
+
+If the worker process fails, the error is printed, the module is stopped and
+the IUs that were sent to the worker are no longer awaited by the clock (see
+retico.core.clock).
+
+IUs are sent to the worker without their links to other IUs and modules and
+the IUs produced by the worker are re-linked to the module and the IU they are
+grounded in before they are appended to the right buffers. Events called in
+the worker process are called on the module in the main process, so callbacks
+subscribed with `event_subscribe` work as usual.
+
+Example:
+    vad_frames = VADFrames(chunk_time=0.01, sample_rate=16000)
+    run_in_process(vad_frames)
+    microphone.subscribe(vad_frames)
+    vad_frames.run()
+"""
+
+import collections
+import multiprocessing
+import pickle
+import queue
+import threading
+import traceback
+
+from retico.core import abstract, clock
+
+LINK_ATTRIBUTES = {
+    "creator",
+    "_previous",
+    "_grounded",
+    "_history",
+    "_history_index",
+    "_mutex",
+    "_processed_list",
+    "_meta_data",
+    "_meta_source",
+    "_backend_seq",
+}
+"""Attributes of an IU that are not sent to or received from another
+process."""
+
+PATCHED_METHODS = ["setup", "prepare_run", "process_iu", "shutdown"]
+"""Methods of the module that are replaced by the process backend in the main
+process."""
+
+RUNTIME_ATTRIBUTES = {
+    "_right_buffers",
+    "_left_buffers",
+    "_previous_iu",
+    "_input_ready",
+    "_input_ready_set",
+    "_input_condition",
+    "_thread_ident",
+    "_metrics",
+    "_init_args",
+    "mutex",
+    "events",
+    "iu_history",
+    "is_running",
+}
+"""Attributes of a module that belong to the network in the main process and
+are not sent to the worker process."""
+
+
+def _portable(value):
+    """Return a version of the value that can be sent to another process."""
+    if isinstance(value, memoryview):
+        return bytes(value)
+    return value
+
+
+def detach_iu(iu):
+    """Return the class and the state of an IU without the links to other IUs
+    and modules.
+
+    Audio that is shared with other IUs is copied, so that the state can be
+    sent to another process.
+
+    Args:
+        iu (IncrementalUnit): The IU to detach.
+
+    Returns:
+        (class, dict): The class of the IU and its state.
+    """
+    state = {
+        k: _portable(v)
+        for k, v in abstract.iu_state(iu).items()
+        if k not in LINK_ATTRIBUTES
+    }
+    state["meta_data"] = iu.meta_data.copy()
+    return iu.__class__, state
+
+
+def attach_iu(iu_class, state, creator=None, previous_iu=None, grounded_in=None):
+    """Create an IU from the class and state returned by `detach_iu`.
+
+    Args:
+        iu_class (class): The class of the IU.
+        state (dict): The state of the IU.
+        creator (AbstractModule): The module that created the IU.
+        previous_iu (IncrementalUnit): The IU created before by the creator.
+        grounded_in (IncrementalUnit): The IU the new IU is based on.
+
+    Returns:
+        IncrementalUnit: The new IU.
+    """
+    iu = iu_class.__new__(iu_class)
+    iu._meta_data = None
+    iu._meta_source = None
+    for k, v in state.items():
+        setattr(iu, k, v)
+    iu.creator = creator
+    iu._history = None
+    iu._history_index = None
+    iu.previous_iu = previous_iu
+    iu.grounded_in = grounded_in
+    iu._mutex = None
+    iu._processed_list = None
+    return iu
+
+
+def _export_data(data):
+    """Return event data that can be sent to another process."""
+    exported = {}
+    for k, v in data.items():
+        if isinstance(v, abstract.IncrementalUnit):
+            exported[k] = ("iu",) + detach_iu(v)
+        elif isinstance(v, abstract.AbstractModule):
+            continue
+        else:
+            exported[k] = _portable(v)
+    return exported
+
+
+def _module_state(module):
+    """Return the attributes of a module that are sent to the worker process.
+
+    Attributes of the network (see RUNTIME_ATTRIBUTES) and the methods patched
+    by the ProcessBackend are left out.
+
+    Returns:
+        (dict, list): The attributes that can be pickled and the names of the
+        attributes that can not be pickled.
+    """
+    state = {}
+    dropped = []
+    for k, v in module.__dict__.items():
+        if k in RUNTIME_ATTRIBUTES or k in PATCHED_METHODS:
+            continue
+        try:
+            pickle.dumps(v)
+        except Exception:
+            dropped.append(k)
+            continue
+        state[k] = v
+    return state, dropped
+
+
+def _create_module(module_class, init_args, state, dropped):
+    """Re-create a module in the worker process.
+
+    Raises:
+        TypeError: When an attribute that could not be sent to the worker is
+            not created again by the constructor of the module.
+    """
+    args, kwargs = init_args
+    module = module_class(*args, **kwargs)
+    module.__dict__.update(state)
+    missing = [k for k in dropped if k not in module.__dict__]
+    if missing:
+        raise TypeError(
+            "The attributes %s of %s can not be sent to the worker process"
+            % (", ".join(missing), module_class.__name__)
+        )
+    return module
+
+
+def _worker(module_class, init_args, state, dropped, in_queue, out_queue):
+    """The main loop of the worker process.
+
+    The module is re-created with `_create_module` and the output of the module
+    is redirected to the main process. An error is sent to the main process
+    before the worker exits.
+    """
+
+    def append(iu):
+        if not iu:
+            return
+        iu_class, state = detach_iu(iu)
+        seq = getattr(iu.grounded_in, "_backend_seq", None)
+        out_queue.put(("iu", iu_class, state, seq))
+
+    def event_call(event_name, data={}):
+        out_queue.put(("event", event_name, _export_data(data or {})))
+
+    try:
+        module = _create_module(module_class, init_args, state, dropped)
+        module.append = append
+        module.event_call = event_call
+        module.setup()
+        module.prepare_run()
+        module.is_running = True
+        while True:
+            message = in_queue.get()
+            if message is None:
+                break
+            seq, iu_class, state = message
+            input_iu = attach_iu(iu_class, state)
+            input_iu._backend_seq = seq
+            append(module.process_iu(input_iu))
+            out_queue.put(("done",))
+        module.is_running = False
+        module.shutdown()
+    except BaseException:
+        out_queue.put(("error", traceback.format_exc()))
+    finally:
+        out_queue.put(None)
+
+
+class ProcessBackend:
+    """Executes the processing of a module in a worker process.
+
+    The backend replaces the setup, prepare_run, process_iu and shutdown methods
+    of the module in the main process. The thread of the module in the main
+    process only forwards the incoming IUs to the worker process, while a
+    receiving thread appends the IUs produced by the worker and calls the
+    events triggered in the worker.
+
+    Attributes:
+        module (AbstractModule): The module that is executed in a worker
+            process.
+        process (multiprocessing.Process): The worker process, if it is
+            running.
+        error (str): The error of the worker process if it failed.
+    """
+
+    HISTORY_SIZE = 1000
+    """The number of input IUs remembered to ground the output IUs in."""
+
+    POLL_TIME = 0.5
+    """The time in seconds after which the receiving thread checks whether
+    the worker process is still alive."""
+
+    START_METHOD = "spawn"
+    """The multiprocessing start method of the worker process. A method that
+    forks the main process ("fork") is not safe once threads are running."""
+
+    def __init__(self, module):
+        """Initialize the backend and patch the given module.
+
+        Args:
+            module (AbstractModule): The module that should be executed in a
+                worker process.
+        """
+        if isinstance(module, abstract.AbstractProducingModule):
+            raise TypeError("Producing modules can not be run in a process")
+        self.module = module
+        self.process = None
+        self.error = None
+        self._context = multiprocessing.get_context(self.START_METHOD)
+        self._in_queue = None
+        self._out_queue = None
+        self._receiver = None
+        self._seq = 0
+        self._inputs = collections.OrderedDict()
+        self._tasks = 0
+        self._tasks_lock = threading.Lock()
+
+        module.setup = self.start
+        module.prepare_run = self.start
+        module.process_iu = self.process_iu
+        module.shutdown = self.stop
+
+    def start(self):
+        """Start the worker process if it is not already running.
+
+        The worker is started when the module is set up. It is spawned, so it
+        does not inherit the threads and locks of the main process.
+
+        Raises:
+            TypeError: When the arguments the module was created with can not
+                be pickled.
+        """
+        if self.process is not None:
+            return
+        init_args = self.module._init_args
+        try:
+            pickle.dumps(init_args)
+        except Exception as e:
+            raise TypeError(
+                "The arguments of %s can not be sent to a worker process: %s"
+                % (self.module.__class__.__name__, e)
+            )
+        state, dropped = _module_state(self.module)
+        self.error = None
+        self._in_queue = self._context.Queue()
+        self._out_queue = self._context.Queue()
+        self.process = self._context.Process(
+            target=_worker,
+            args=(
+                self.module.__class__,
+                init_args,
+                state,
+                dropped,
+                self._in_queue,
+                self._out_queue,
+            ),
+            daemon=True,
+        )
+        self.process.start()
+        self._receiver = threading.Thread(target=self._receive, args=(self.process,))
+        self._receiver.start()
+
+    def process_iu(self, input_iu):
+        """Send the IU to the worker process.
+
+        Returns:
+            None: The output IUs are appended by the receiving thread. IUs are
+            dropped if the worker process failed.
+        """
+        self._seq += 1
+        self._inputs[self._seq] = input_iu
+        if len(self._inputs) > self.HISTORY_SIZE:
+            self._inputs.popitem(last=False)
+        iu_class, state = detach_iu(input_iu)
+        with self._tasks_lock:
+            if self.error is not None:
+                return None
+            # The IU is processed until the worker reports it as done
+            clock.get_clock().begin_task()
+            self._tasks += 1
+        self._in_queue.put((self._seq, iu_class, state))
+        return None
+
+    def _import_iu(self, iu_class, state, seq=None):
+        """Create an IU of the module in the main process from the state of an
+        IU produced in the worker process."""
+        grounded_in = self._inputs.get(seq) if seq is not None else None
+        output_iu = self.module.create_iu(grounded_in)
+        output_iu.__class__ = iu_class
+        for k, v in state.items():
+            if k not in ("iuid", "created_at"):
+                setattr(output_iu, k, v)
+        return output_iu
+
+    def _import_data(self, data):
+        imported = {}
+        for k, v in data.items():
+            if isinstance(v, tuple) and len(v) == 3 and v[0] == "iu":
+                imported[k] = attach_iu(v[1], v[2])
+            else:
+                imported[k] = v
+        return imported
+
+    def _next_message(self, process):
+        """Return the next message of the worker or an error if the worker
+        process exited without sending one."""
+        while True:
+            try:
+                return self._out_queue.get(timeout=self.POLL_TIME)
+            except queue.Empty:
+                if process.is_alive():
+                    continue
+            try:
+                # The last messages may arrive after the process exited
+                return self._out_queue.get(timeout=self.POLL_TIME)
+            except queue.Empty:
+                return (
+                    "error",
+                    "The worker process exited with code %s" % process.exitcode,
+                )
+
+    def _fail(self, error):
+        """Report the error of the worker process and stop the module."""
+        print("The worker process of %s failed:\n%s" % (self.module.name(), error))
+        with self._tasks_lock:
+            self.error = error
+            for _ in range(self._tasks):
+                clock.get_clock().end_task()
+            self._tasks = 0
+        self.module.stop()
+
+    def _receive(self, process):
+        while True:
+            message = self._next_message(process)
+            if message is None:
+                break
+            if message[0] == "error":
+                self._fail(message[1])
+                break
+            if message[0] == "iu":
+                _, iu_class, state, seq = message
+                self.module.append(self._import_iu(iu_class, state, seq))
+            elif message[0] == "event":
+                _, event_name, data = message
+                self.module.event_call(event_name, self._import_data(data))
+            elif message[0] == "done":
+                with self._tasks_lock:
+                    if self._tasks > 0:
+                        self._tasks -= 1
+                        clock.get_clock().end_task()
+
+    def stop(self):
+        """Shut down the worker process and wait for the remaining output."""
+        if self.process is None:
+            return
+        self._in_queue.put(None)
+        self._receiver.join()
+        self.process.join()
+        self.process = None
+        self._receiver = None
+        self._inputs.clear()
+
+
+def run_in_process(module):
+    """Execute the processing of the given module in a worker process.
+
+    This has to be called before the module is set up and run. The connections
+    of the module to other modules are not changed.
+
+    Args:
+        module (AbstractModule): The module to execute in a worker process.
+
+    Returns:
+        ProcessBackend: The backend that executes the module.
+    """
+    return ProcessBackend(module)
@@ -0,0 +1,386 @@
+"""
+A module for recording the IUs of a network and replaying them.
+
+The Recorder captures every IU that enters a module of a network (with the
+time at which the module started processing it) and every event called by the
+modules. The IUs are stored without their links (see
+retico.core.process.detach_iu), large binary attributes like the raw audio of
+AudioIUs are stored by reference into a separate chunk file.
+
+The Replayer feeds the IUs that the source modules of the recorded network
+(the modules without left buffers, e.g. the microphone) produced back into
+the same network loaded through `retico.headless.load`. The source modules are
+not run, so no microphone or cloud service is needed for them. The IUs are fed
+in real time (or faster or slower) on the clock of the network or as fast as
+possible. With a VirtualClock (see retico.core.clock) a real-time replay runs
+as fast as the CPU allows and the timing of the replay does not depend on the
+load of the machine, so that policies can be compared on identical input.
+
+Example:
+    modules, _ = headless.load("agent.rtc")
+    recorder = replay.Recorder(modules, "recordings/session1")
+    recorder.start()
+    ...  # run the network
+    recorder.stop()
+
+    clock.set_clock(clock.VirtualClock())
+    modules, _ = headless.load("agent.rtc")
+    replay.Replayer("recordings/session1").replay(modules)
+"""
+
+import collections
+import os
+import pickle
+import queue
+import threading
+
+from retico.core import abstract, clock, process
+
+STREAM_FILE = "stream.pickle"
+"""The name of the file with the records in a recording directory."""
+
+CHUNK_FILE = "chunks.raw"
+"""The name of the file with the binary attributes of the IUs."""
+
+CHUNK_MIN_SIZE = 256
+"""The size in bytes from which a binary attribute is stored in the chunk file."""
+
+RECENT_IUS = 4096
+"""The number of recently recorded IUs that are not recorded again when they
+enter another module."""
+
+ChunkRef = collections.namedtuple("ChunkRef", ["offset", "length"])
+"""A reference to a binary attribute of an IU in the chunk file."""
+
+
+def _storable(value):
+    """Return the value if it can be pickled and its representation otherwise."""
+    try:
+        pickle.dumps(value)
+    except (pickle.PicklingError, TypeError, AttributeError):
+        return repr(value)
+    return value
+
+
+class Recorder:
+    """Records the IUs entering the modules of a network and their events.
+
+    The recorder subscribes synchronously to all events of the modules. The
+    IUs are detached in the thread of the module and written to the recording
+    by a background thread.
+
+    Attributes:
+        modules (list): The modules of the network.
+        path (str): The directory of the recording.
+    """
+
+    def __init__(self, modules, path):
+        """Initialize the recorder.
+
+        Args:
+            modules (list): The modules of the network (in the order of
+                `headless.load`).
+            path (str): The directory in which the recording is stored.
+        """
+        self.modules = list(modules)
+        self.path = path
+        self._indices = {id(m): i for i, m in enumerate(self.modules)}
+        self._subscriptions = []
+        self._recent = collections.OrderedDict()
+        self._lock = threading.Lock()
+        self._records = queue.SimpleQueue()
+        self._writer = None
+        self._started_at = 0.0
+
+    def _key(self, iu):
+        if iu is None:
+            return None
+        index = self._indices.get(id(iu.creator), -1)
+        if index < 0:
+            return (index, id(iu))
+        return (index, iu.iuid)
+
+    def start(self):
+        """Start recording. The recording directory is created if needed and
+        a previous recording in it is overwritten."""
+        if self._writer is not None:
+            return
+        os.makedirs(self.path, exist_ok=True)
+        network = {
+            "names": [m.name() for m in self.modules],
+            "sources": [not m.left_buffers() for m in self.modules],
+            "connections": [
+                (self._indices.get(id(q.provider), -1), i)
+                for i, m in enumerate(self.modules)
+                for q in m.left_buffers()
+            ],
+        }
+        self._records.put(("network", network))
+        self._writer = threading.Thread(target=self._write, name="retico-recorder")
+        self._writer.start()
+        self._started_at = clock.get_clock().time()
+        for module in self.modules:
+            subscription = module.event_subscribe("*", self._record, sync=True)
+            self._subscriptions.append((module, subscription))
+
+    def stop(self):
+        """Stop recording and wait until all records are written."""
+        if self._writer is None:
+            return
+        for module, subscription in self._subscriptions:
+            module.events["*"].remove(subscription)
+        self._subscriptions = []
+        self._records.put(None)
+        self._writer.join()
+        self._writer = None
+
+    def _record(self, module, event_name, data):
+        t = clock.get_clock().time() - self._started_at
+        index = self._indices[id(module)]
+        if event_name == abstract.AbstractModule.EVENT_PROCESS_IU:
+            iu = data["iu"]
+            key = self._key(iu)
+            with self._lock:
+                new = key not in self._recent
+                self._recent[key] = True
+                if len(self._recent) > RECENT_IUS:
+                    self._recent.popitem(last=False)
+            if new:
+                iu_class, state = process.detach_iu(iu)
+                grounded_key = self._key(iu.grounded_in)
+                previous_key = self._key(iu.previous_iu)
+                self._records.put(("iu", key, iu_class, state, grounded_key, previous_key))
+            self._records.put(("process", t, index, key))
+            return
+        exported = {}
+        for k, v in data.items():
+            if isinstance(v, abstract.IncrementalUnit):
+                exported[k] = ("iu", self._key(v))
+            elif isinstance(v, abstract.AbstractModule):
+                exported[k] = ("module", self._indices.get(id(v), -1))
+            else:
+                exported[k] = v
+        self._records.put(("event", t, index, event_name, exported))
+
+    def _write(self):
+        with open(os.path.join(self.path, STREAM_FILE), "wb") as stream, open(
+            os.path.join(self.path, CHUNK_FILE), "wb"
+        ) as chunks:
+            while True:
+                record = self._records.get()
+                if record is None:
+                    break
+                if record[0] == "iu":
+                    state = record[3]
+                    refs = {}  # e.g. the payload and the raw audio of an AudioIU
+                    for k, v in state.items():
+                        if isinstance(v, bytes) and len(v) >= CHUNK_MIN_SIZE:
+                            if id(v) not in refs:
+                                refs[id(v)] = ChunkRef(chunks.tell(), len(v))
+                                chunks.write(v)
+                            state[k] = refs[id(v)]
+                try:
+                    data = pickle.dumps(record, protocol=pickle.HIGHEST_PROTOCOL)
+                except (pickle.PicklingError, TypeError, AttributeError):
+                    # Values that can not be stored are kept as text
+                    values = record[3] if record[0] == "iu" else record[4]
+                    for k, v in values.items():
+                        values[k] = _storable(v)
+                    data = pickle.dumps(record, protocol=pickle.HIGHEST_PROTOCOL)
+                stream.write(data)
+
+
+class Replayer:
+    """Replays a recording into a network.
+
+    Attributes:
+        path (str): The directory of the recording.
+        names (list): The names of the modules of the recorded network.
+        sources (list): The indices of the source modules of the recorded
+            network.
+    """
+
+    def __init__(self, path):
+        """Load a recording.
+
+        Args:
+            path (str): The directory of the recording.
+        """
+        self.path = path
+        with open(os.path.join(path, CHUNK_FILE), "rb") as f:
+            self._chunks = memoryview(f.read())
+        self._ius = {}
+        self._processed = []
+        self._events = []
+        with open(os.path.join(path, STREAM_FILE), "rb") as f:
+            while True:
+                try:
+                    record = pickle.load(f)
+                except EOFError:
+                    break
+                if record[0] == "network":
+                    network = record[1]
+                elif record[0] == "iu":
+                    _, key, iu_class, state, grounded_key, previous_key = record
+                    state = self._resolve_chunks(state)
+                    self._ius[key] = (iu_class, state, grounded_key, previous_key)
+                elif record[0] == "process":
+                    self._processed.append(record[1:])
+                else:
+                    self._events.append(record[1:])
+        self.names = network["names"]
+        self.sources = [i for i, source in enumerate(network["sources"]) if source]
+
+    def _resolve_chunks(self, state):
+        for k, v in state.items():
+            if isinstance(v, ChunkRef):
+                state[k] = self._chunks[v.offset : v.offset + v.length]
+        return state
+
+    def __len__(self):
+        return len(self._processed)
+
+    @property
+    def duration(self):
+        """The time from the start of the recording to the last IU."""
+        return self._processed[-1][0] if self._processed else 0.0
+
+    def _attach(self, key, attached, modules=None):
+        if key not in self._ius:
+            return None
+        if key not in attached:
+            iu_class, state, grounded_key, previous_key = self._ius[key]
+            creator = modules[key[0]] if modules is not None and key[0] >= 0 else None
+            attached[key] = process.attach_iu(
+                iu_class,
+                dict(state),
+                creator=creator,
+                previous_iu=attached.get(previous_key),
+                grounded_in=attached.get(grounded_key),
+            )
+        return attached[key]
+
+    def stream(self, module_name=None):
+        """Return the recorded IUs that entered the modules.
+
+        Args:
+            module_name (str): If given, only the IUs that entered the modules
+                with this name are returned.
+
+        Returns:
+            list: Tuples (time, module name, IU) in the recorded order. The IUs
+            are linked to the IUs they are grounded in if those were recorded.
+        """
+        attached = {}
+        stream = []
+        for t, index, key in self._processed:
+            iu = self._attach(key, attached)
+            if module_name is None or self.names[index] == module_name:
+                stream.append((t, self.names[index], iu))
+        return stream
+
+    def events(self, module_name=None):
+        """Return the recorded events.
+
+        Args:
+            module_name (str): If given, only the events of the modules with
+                this name are returned.
+
+        Returns:
+            list: Tuples (time, module name, event name, data) in the recorded
+            order. IUs in the data are given as ("iu", key) and modules as
+            ("module", index).
+        """
+        return [
+            (t, self.names[index], event_name, data)
+            for t, index, event_name, data in self._events
+            if module_name is None or self.names[index] == module_name
+        ]
+
+    def check(self, modules):
+        """Check that the modules are the recorded network.
+
+        Args:
+            modules (list): The modules of the network.
+
+        Raises:
+            ValueError: When the modules do not match the recorded modules.
+        """
+        names = [m.name() for m in modules]
+        if names != self.names:
+            raise ValueError(
+                "The network does not match the recording: %s != %s" % (names, self.names)
+            )
+
+    def feed(self, modules, speed=1.0):
+        """Feed the IUs of the source modules into their consumers.
+
+        The IUs are put into the left buffers that connect the source modules
+        with their consumers in the recorded order. This method blocks until
+        all IUs are fed.
+
+        Args:
+            modules (list): The modules of the network (see `check`).
+            speed (float): The speed of the replay relative to the recording
+                (on the clock of the network). If None, the IUs are fed as fast
+                as possible.
+
+        Returns:
+            int: The number of IUs that were fed.
+        """
+        self.check(modules)
+        sources = set(self.sources)
+        buffers = {}
+        for consumer, module in enumerate(modules):
+            for q in module.left_buffers():
+                buffers[(id(q.provider), consumer)] = q
+        attached = {}
+        timer = clock.get_clock()
+        start = timer.time()
+        fed = 0
+        for t, index, key in self._processed:
+            if key[0] not in sources:
+                continue
+            q = buffers.get((id(modules[key[0]]), index))
+            if q is None:
+                continue
+            iu = self._attach(key, attached, modules)
+            if speed is not None:
+                timer.sleep(start + t / speed - timer.time())
+            q.put(iu)
+            fed += 1
+        return fed
+
+    def replay(self, modules, speed=1.0, settle_time=1.0):
+        """Replay the recording with a network.
+
+        All modules except the source modules are set up and run, the IUs of
+        the source modules are fed and the modules are stopped once their left
+        buffers are empty and `settle_time` passed (e.g. for timeouts of the
+        dialogue manager).
+
+        Args:
+            modules (list): The modules of the network (see `check`).
+            speed (float): The speed of the replay (see `feed`).
+            settle_time (float): The time on the clock of the network that the
+                network keeps running after the last IU.
+
+        Returns:
+            int: The number of IUs that were fed.
+        """
+        self.check(modules)
+        running = [m for i, m in enumerate(modules) if i not in self.sources]
+        for module in running:
+            module.setup()
+        for module in running:
+            module.run(run_setup=False)
+        try:
+            fed = self.feed(modules, speed=speed)
+            timer = clock.get_clock()
+            while any(not q.empty() for m in running for q in m.left_buffers()):
+                timer.sleep(abstract.QUEUE_TIMEOUT)
+            timer.sleep(settle_time)
+        finally:
+            for module in running:
+                module.stop()
+        return fed
@@ -38,7 +38,8 @@ class TextRecorderModule(AbstractConsumingModule):
 
     def process_iu(self, input_iu):
         if self.txt_file:
-            self.txt_file.write(str(input_iu.grounded_in.creator))
+            grounded_in = input_iu.grounded_in
+            self.txt_file.write(str(grounded_in.creator if grounded_in else None))
             self.txt_file.write(self.separator)
             self.txt_file.write(str(input_iu.created_at))
             self.txt_file.write(self.separator)
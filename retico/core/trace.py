@@ -0,0 +1,395 @@
+"""
+A module for tracing the latency of IUs through a network of modules.
+
+When tracing is enabled, every IU is stamped when it is created by a module,
+put into the left buffer of a consuming module, taken from that buffer and
+when the consuming module starts and ends processing it. The IU it is grounded
+in is recorded on creation, so that the causal chain of an IU (e.g. from the
+audio chunk over the ASR hypothesis and the dialogue manager to the TTS audio)
+can be followed after the IUs themselves were released.
+
+The recorded trace can be summarized per module, broken down along the causal
+chain of an IU and exported in the trace event format of Chrome (which can be
+opened with chrome://tracing or https://ui.perfetto.dev).
+
+Tracing is disabled by default. The modules only check whether a tracer is set,
+so that tracing has (almost) no cost when it is disabled.
+
+Example:
+    tracer = trace.enable()
+    modules, _ = headless.load("agent.rtc")
+    ...
+    trace.disable()
+    tracer.save("agent_trace.json")
+    print(tracer.summary())
+"""
+
+import collections
+import json
+import os
+import threading
+import time
+
+CREATE = "create"
+ENQUEUE = "enqueue"
+DEQUEUE = "dequeue"
+START = "start"
+END = "end"
+PHASES = [CREATE, ENQUEUE, DEQUEUE, START, END]
+
+DEFAULT_MAX_EVENTS = 1000000
+"""The default number of events kept by a tracer. Older events are dropped."""
+
+
+def iu_key(iu):
+    """Return the key by which the tracer identifies an IU.
+
+    The key consists of the id of the creating module and the IU id, which is
+    unique within a module. IUs without a creator are identified by their id.
+
+    Args:
+        iu (IncrementalUnit): The IU.
+
+    Returns:
+        tuple: The key of the IU.
+    """
+    if iu.creator is None:
+        return (0, id(iu))
+    return (id(iu.creator), iu.iuid)
+
+
+class Tracer:
+    """A tracer that records the timestamps of the IUs of a network.
+
+    Every event is recorded as a tuple (time, phase, module, IU key, data) in a
+    bounded deque, so that the modules can record events from their threads
+    without a lock.
+
+    Attributes:
+        timer (function): The function that returns the current time in
+            seconds (time.perf_counter by default).
+        started_at (float): The time at which the tracer was created.
+    """
+
+    def __init__(self, timer=time.perf_counter, max_events=DEFAULT_MAX_EVENTS):
+        """Initialize the tracer.
+
+        Args:
+            timer (function): The function that returns the current time in
+                seconds. A simulation may use the time of its clock instead.
+            max_events (int): The maximum number of events that are kept.
+        """
+        self.timer = timer
+        self.started_at = timer()
+        self._events = collections.deque(maxlen=max_events)
+        self._modules = {}
+
+    def _module(self, module):
+        module_id = id(module)
+        if module_id not in self._modules:
+            self._modules[module_id] = module.name()
+        return module_id
+
+    def create(self, iu, module, grounded_in=None):
+        """Record the creation of an IU by a module.
+
+        Args:
+            iu (IncrementalUnit): The new IU.
+            module (AbstractModule): The module that created the IU.
+            grounded_in (IncrementalUnit): The IU the new IU is based on.
+        """
+        parent = iu_key(grounded_in) if grounded_in is not None else None
+        data = (parent, type(iu).__name__)
+        self._events.append((self.timer(), CREATE, self._module(module), iu_key(iu), data))
+
+    def enqueue(self, iu, module):
+        """Record that an IU was put into a left buffer of a module."""
+        self._events.append((self.timer(), ENQUEUE, self._module(module), iu_key(iu), None))
+
+    def dequeue(self, iu, module):
+        """Record that a module took an IU from one of its left buffers."""
+        self._events.append((self.timer(), DEQUEUE, self._module(module), iu_key(iu), None))
+
+    def start(self, iu, module):
+        """Record that a module started processing an IU."""
+        self._events.append((self.timer(), START, self._module(module), iu_key(iu), None))
+
+    def end(self, iu, module, output_iu=None):
+        """Record that a module finished processing an IU.
+
+        Args:
+            iu (IncrementalUnit): The processed IU.
+            module (AbstractModule): The processing module.
+            output_iu (IncrementalUnit): The IU that was returned by the module.
+        """
+        output = iu_key(output_iu) if output_iu is not None else None
+        self._events.append((self.timer(), END, self._module(module), iu_key(iu), output))
+
+    def events(self):
+        """Return the recorded events.
+
+        Returns:
+            list: The events as tuples (time, phase, module name, IU key,
+            data), where data is the key of the IU the IU is grounded in and
+            the name of the IU type (for CREATE) or the key of the output IU
+            (for END).
+        """
+        return [
+            (t, phase, self._modules[m], key, data)
+            for t, phase, m, key, data in list(self._events)
+        ]
+
+    def clear(self):
+        """Remove all recorded events."""
+        self._events.clear()
+
+    def _hops(self):
+        """Collect the timestamps of the events per module and IU."""
+        created = {}
+        hops = {}
+        for t, phase, m, key, data in list(self._events):
+            if phase == CREATE:
+                created[key] = (t, m) + data
+                continue
+            hop = hops.setdefault((m, key), {})
+            # A module may receive the same IU from several left buffers
+            hop.setdefault(phase, t)
+        return created, hops
+
+    def summary(self):
+        """Summarize the queue waiting and the processing times per module.
+
+        Returns:
+            dict: A dictionary mapping the name of each module to a dict with
+            the number of processed IUs and the mean and maximum time (in
+            seconds) that the IUs waited in the left buffers ("queue_mean",
+            "queue_max") and that the module processed them
+            ("processing_mean", "processing_max").
+        """
+        waits = collections.defaultdict(list)
+        processing = collections.defaultdict(list)
+        _, hops = self._hops()
+        for (m, _), hop in hops.items():
+            if ENQUEUE in hop and DEQUEUE in hop:
+                waits[m].append(hop[DEQUEUE] - hop[ENQUEUE])
+            if START in hop and END in hop:
+                processing[m].append(hop[END] - hop[START])
+        summary = {}
+        for m in set(waits) | set(processing):
+            w = waits.get(m, [])
+            p = processing.get(m, [])
+            summary[self._modules[m]] = {
+                "count": len(p),
+                "queue_mean": sum(w) / len(w) if w else 0.0,
+                "queue_max": max(w, default=0.0),
+                "processing_mean": sum(p) / len(p) if p else 0.0,
+                "processing_max": max(p, default=0.0),
+            }
+        return summary
+
+    def chain(self, iu):
+        """Return the causal chain of an IU as recorded by the tracer.
+
+        Args:
+            iu: The IU or the key of the IU (see `iu_key`).
+
+        Returns:
+            list: The keys of the IUs along grounded_in, starting with the IU
+            that is not grounded in any traced IU and ending with the given IU.
+        """
+        key = iu if isinstance(iu, tuple) else iu_key(iu)
+        created, _ = self._hops()
+        chain = []
+        while key is not None and key not in chain:
+            chain.append(key)
+            key = created[key][2] if key in created else None
+        chain.reverse()
+        return chain
+
+    def breakdown(self, iu):
+        """Break the latency of an IU down along its causal chain.
+
+        For every IU of the chain that is grounded in another IU, the time the
+        IU it is grounded in waited in the left buffer of the creating module
+        and the time from the start of processing until the IU was created are
+        reported.
+
+        Args:
+            iu: The IU or the key of the IU (see `iu_key`).
+
+        Returns:
+            list: A list with a dict per IU of the chain with the name of the
+            creating module ("module"), the type of the IU ("iu"), the time the
+            IU was created relative to the first IU of the chain ("created"),
+            the queue waiting time ("queue") and the processing time
+            ("processing"). Unknown times are None.
+        """
+        created, hops = self._hops()
+        chain = self.chain(iu)
+        if not chain or chain[0] not in created:
+            return []
+        origin = created[chain[0]][0]
+        breakdown = []
+        for parent, key in zip([None] + chain[:-1], chain):
+            if key not in created:
+                continue
+            t, m, _, type_name = created[key]
+            hop = hops.get((m, parent), {}) if parent is not None else {}
+            queue_time = None
+            if ENQUEUE in hop and DEQUEUE in hop:
+                queue_time = hop[DEQUEUE] - hop[ENQUEUE]
+            processing = t - hop[START] if START in hop else None
+            breakdown.append(
+                {
+                    "module": self._modules[m],
+                    "iu": type_name,
+                    "created": t - origin,
+                    "queue": queue_time,
+                    "processing": processing,
+                }
+            )
+        return breakdown
+
+    def to_chrome(self):
+        """Convert the trace into the trace event format of Chrome.
+
+        Every module is shown as a thread of the current process. The
+        processing of an IU is a complete event ("X"), the time an IU waits in
+        a left buffer is an async event of the category "queue" and the causal
+        links from the creation of an IU to the start of its processing by
+        another module are flow events.
+
+        Returns:
+            dict: The trace as a JSON serializable dict.
+        """
+        pid = os.getpid()
+        tids = {m: i + 1 for i, m in enumerate(self._modules)}
+        trace_events = [
+            {
+                "name": "thread_name",
+                "ph": "M",
+                "pid": pid,
+                "tid": tid,
+                "args": {"name": self._modules[m]},
+            }
+            for m, tid in tids.items()
+        ]
+
+        def us(t):
+            return (t - self.started_at) * 1e6
+
+        created, hops = self._hops()
+        flow_id = 0
+        async_id = 0
+        for (m, key), hop in hops.items():
+            name = created[key][3] if key in created else "IU"
+            args = {"iu": "%s#%d" % (name, key[1])}
+            if key in created:
+                args["creator"] = self._modules[created[key][1]]
+            if ENQUEUE in hop and DEQUEUE in hop:
+                async_id += 1
+                for ph, t in (("b", hop[ENQUEUE]), ("e", hop[DEQUEUE])):
+                    trace_events.append(
+                        {
+                            "name": name,
+                            "cat": "queue",
+                            "ph": ph,
+                            "id": async_id,
+                            "ts": us(t),
+                            "pid": pid,
+                            "tid": tids[m],
+                            "args": args,
+                        }
+                    )
+            if START in hop and END in hop:
+                trace_events.append(
+                    {
+                        "name": name,
+                        "cat": "process",
+                        "ph": "X",
+                        "ts": us(hop[START]),
+                        "dur": us(hop[END]) - us(hop[START]),
+                        "pid": pid,
+                        "tid": tids[m],
+                        "args": args,
+                    }
+                )
+                if key in created:
+                    flow_id += 1
+                    t, creator, _, _ = created[key]
+                    trace_events.append(
+                        {
+                            "name": "grounded_in",
+                            "cat": "flow",
+                            "ph": "s",
+                            "id": flow_id,
+                            "ts": us(t),
+                            "pid": pid,
+                            "tid": tids[creator],
+                        }
+                    )
+                    trace_events.append(
+                        {
+                            "name": "grounded_in",
+                            "cat": "flow",
+                            "ph": "f",
+                            "bp": "e",
+                            "id": flow_id,
+                            "ts": us(hop[START]),
+                            "pid": pid,
+                            "tid": tids[m],
+                        }
+                    )
+        trace_events.sort(key=lambda e: e.get("ts", 0))
+        return {"traceEvents": trace_events, "displayTimeUnit": "ms"}
+
+    def save(self, path):
+        """Save the trace in the trace event format of Chrome.
+
+        Args:
+            path (str): The path of the JSON file.
+        """
+        with open(path, "w") as f:
+            json.dump(self.to_chrome(), f)
+
+
+_tracer = None
+_tracer_lock = threading.Lock()
+
+
+def get_tracer():
+    """Return the current tracer.
+
+    Returns:
+        Tracer: The tracer or None if tracing is disabled.
+    """
+    return _tracer
+
+
+def enable(tracer=None):
+    """Enable tracing for all modules.
+
+    Args:
+        tracer (Tracer): The tracer to use. If None, a new tracer is created.
+
+    Returns:
+        Tracer: The tracer that records the events.
+    """
+    global _tracer
+    with _tracer_lock:
+        _tracer = tracer if tracer is not None else Tracer()
+        return _tracer
+
+
+def disable():
+    """Disable tracing.
+
+    Returns:
+        Tracer: The tracer that was used (or None), so that its trace can still
+        be exported.
+    """
+    global _tracer
+    with _tracer_lock:
+        tracer = _tracer
+        _tracer = None
+        return tracer
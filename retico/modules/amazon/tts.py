@@ -1,16 +1,16 @@
 from boto3 import Session
 from contextlib import closing
 from os import makedirs
-from os.path import join, exists
+from os.path import join
 import json
-import subprocess
 import wave
-import shutil
 
 from retico.core.text.common import GeneratedTextIU
 from retico.core.audio.common import SpeechIU
 from retico.core import abstract
-from retico.agent.utils import read_json, write_json
+from retico.core.audio import convert
+from retico.core.audio.cache import get_cache
+from retico.core.audio.tts import stream_speech
 
 """
 Amazon Polly
@@ -176,10 +176,12 @@ class AmazonTTSModule(abstract.AbstractModule):
         cache_dir="/tmp/tts",
         result_dir="/tmp",
         record=False,
+        streaming=False,
         **kwargs,
     ):
         super().__init__(**kwargs)
         self.sample_rate = sample_rate
+        self.streaming = streaming
         self.polly_sample_rate = tts_sample_rate
         self.tts = TTSPolly(
             sample_rate=tts_sample_rate, output_word_times=output_word_times
@@ -189,7 +191,9 @@ class AmazonTTSModule(abstract.AbstractModule):
 
         # cache files
         self.cache_dir = cache_dir
-        makedirs(self.cache_dir, exist_ok=True)  # cache path
+        self.cache = get_cache(self.cache_dir)
+        self.cache_requests = 0
+        self.cache_hits = 0
 
         # result files
         self.result_dir = result_dir
@@ -209,50 +213,64 @@ class AmazonTTSModule(abstract.AbstractModule):
             obj.setframerate(self.polly_sample_rate)
             obj.writeframesraw(raw_audio)
 
-    def resample_sox(self, wav_path):
-        tmp_path = wav_path.replace(".wav", "_tmp.wav")
-        subprocess.call(
-            ["sox", wav_path, "-r", str(self.sample_rate), tmp_path]
-        )  # resample to tmp file
-        shutil.move(tmp_path, wav_path)  # move tmp file to original
-        raw_audio, _ = self.read_audio(wav_path)  # open new sampled audio
-        return raw_audio
+    def resample(self, raw_audio):
+        return convert.resample_pcm(
+            raw_audio, self.polly_sample_rate, self.sample_rate, self.bytes_per_sample
+        )
+
+    def cache_key(self, text):
+        return self.cache.key(
+            "amazon",
+            f"{self.tts.voice['LanguageCode']}/{self.tts.voice['Id']}/{self.tts.engine}",
+            self.sample_rate,
+            self.bytes_per_sample,
+            text,
+            speaking_rate=self.tts.speaking_rate,
+            word_times=self.tts.output_word_times,
+        )
+
+    def synthesize(self, text, prefetch=False):
+        """
+        Returns the raw audio (at `self.sample_rate`) and the word timings of the text, from the TTS cache if the text
+        was synthesized before. Requests with `prefetch=True` do not count towards the cache hit rate.
+        """
+        def synthesize():
+            words, starts, ends, duration, raw_audio = self.tts.tts(text)
+            if self.sample_rate != self.polly_sample_rate:
+                raw_audio = self.resample(raw_audio)
+            return raw_audio, {"words": words, "starts": starts, "ends": ends, "duration": duration}
+
+        entry, cached = self.cache.get_or_put(self.cache_key(text), synthesize)
+        if not prefetch:
+            self.cache_requests += 1
+            self.cache_hits += cached
+        return entry
 
     def stop(self, **kwargs):
         super().stop(**kwargs)
 
     def process_iu(self, input_iu):
+        if self.streaming and input_iu.dispatch and input_iu.get_text() != "":
+            # output every phrase as soon as it is synthesized
+            for output_iu in stream_speech(
+                self,
+                input_iu,
+                self.synthesize,
+                self.sample_rate,
+                self.bytes_per_sample,
+            ):
+                self.append(output_iu)
+            return None
+
         output_iu = self.create_iu(input_iu)
         if input_iu.get_text() != "":
             text = input_iu.get_text()
 
-            cache_file = join(self.cache_dir, "_".join(text.split()) + ".wav")
-            if exists(cache_file):
-                # print("Using Cache TTS")
-                raw_audio, _ = self.read_audio(cache_file)
-                info = read_json(cache_file.replace(".wav", ".json"))
-                words = info["words"]
-                starts = info["starts"]
-                ends = info["ends"]
-                duration = info["duration"]
-            else:
-                words, starts, ends, duration, raw_audio = self.tts.tts(
-                    input_iu.get_text()
-                )
-                # print("SAVE Cache TTS")
-                self.write_audio(raw_audio, cache_file)
-                if self.sample_rate != self.polly_sample_rate:
-                    print("RESAMPLE Cache TTS")
-                    raw_audio = self.resample_sox(cache_file)
-                write_json(
-                    {
-                        "words": words,
-                        "starts": starts,
-                        "ends": ends,
-                        "duration": duration,
-                    },
-                    cache_file.replace(".wav", ".json"),
-                )
+            raw_audio, info = self.synthesize(text)
+            words = info["words"]
+            starts = info["starts"]
+            ends = info["ends"]
+            duration = info["duration"]
 
             # if self.record:
             #     _ = self.save_audio_file(raw_audio, words)
@@ -3,14 +3,13 @@ A module that uses Google TTS to create speech from text.
 """
 import http.client
 import json
-import os
 import subprocess
 import base64
-import random
-import wave
-from hashlib import blake2b
 
 from retico.core import abstract, text, audio
+from retico.core.audio import convert
+from retico.core.audio.cache import get_cache
+from retico.core.audio.tts import stream_speech
 
 # Helper functions ==============
 
@@ -32,12 +31,10 @@ class GoogleTTS:
     """
     A google TTS class that is able to return the audio as pcm.
 
-    This class relies on gcloud and ffmpeg to be installed and available.
+    This class relies on gcloud to be installed and available.
     """
 
     CACHING_DIR = "data/gtts_cache/"
-    TEMP_DIR = "/tmp"
-    TEMP_NAME = "tmp_tts_%s" % random.randint(1000,10000)
 
     def __init__(self, language_code="en-US", voice_name="en-US-Wavenet-A", speaking_rate=1.4, caching=True):
         """
@@ -56,12 +53,10 @@ class GoogleTTS:
         self._gcloud_token = None
         self.speaking_rate = speaking_rate
 
-        self.wav_sample_rate = 44100 # 44100 sample rate / See ffmpeg
-        self.wav_codec = "pcm_s16le" # 16-bit little endian codec / See ffmpeg
+        self.wav_sample_rate = 44100 # 44100 sample rate
+        self.wav_codec = "pcm_s16le" # 16-bit little endian codec
 
-        # Create caching directory if it not already exists
-        if not os.path.exists(self.CACHING_DIR):
-            os.mkdir(self.CACHING_DIR)
+        self.cache = get_cache(self.CACHING_DIR) if caching else None
 
     def gcloud_token(self, use_cache=True):
         """ Return the gcloud token.
@@ -77,27 +72,18 @@ class GoogleTTS:
             self._gcloud_token = get_gcloud_token()
         return self._gcloud_token
 
-    def get_cache_path(self, text):
+    def get_cache_key(self, text):
         """
-        Creates a hash of the given TTS settings and returns a unique path to the cached version of the synthesis.
-        This method does not check for the cached file to exist!
+        Returns the key of the synthesis of the given text with the TTS settings in the TTS cache.
 
         Args:
-            text (str): The text to synthesis (this is included in the hash that is used for the cache path)
+            text (str): The text to synthesis (this is included in the hash that is used for the cache key)
 
-        Returns (str): Path to a cached version of that synthesis.
+        Returns (str): The key of the synthesis.
 
         """
-        h = blake2b(digest_size=16)
-        h.update(bytes(text, 'utf-8'))
-        h.update(bytes(self.voice_name, 'utf-8'))
-        h.update(bytes(self.language_code, 'utf-8'))
-        h.update(bytes(self.wav_codec, 'utf-8'))
-        h.update(bytes(str(self.wav_sample_rate), 'utf-8')) # Wait this makes no sense. FIXME
-        h.update(bytes(str(self.speaking_rate), 'utf-8'))  # Wait this makes no sense. FIXME
-        text_digest = h.hexdigest()
-
-        return os.path.join(self.CACHING_DIR, text_digest)
+        return self.cache.key("google", "%s/%s" % (self.language_code, self.voice_name), self.wav_sample_rate, 2,
+                              text, codec=self.wav_codec, speaking_rate=self.speaking_rate)
 
     def tts(self, text):
         """
@@ -110,26 +96,22 @@ class GoogleTTS:
 
         Returns (bytes): The synthesized text in raw PCM format.
         """
-        cache_path = self.get_cache_path(text)
-        if os.path.isfile(cache_path):
-            wav_audio = None
-            with open(cache_path, 'rb') as cfile:
-                wav_audio = cfile.read()
-        else:
-            mp3_audio = self.google_tts_call(text)
-            wav_audio = self.convert_audio(mp3_audio)
-            with open(cache_path, 'wb') as cfile:
-                cfile.write(wav_audio)
-
-        return wav_audio
+        if self.cache is None:
+            return self.convert_audio(self.google_tts_call(text))
+        key = self.get_cache_key(text)
+        entry = self.cache.get(key)
+        if entry is None:
+            wav_audio = self.google_tts_call(text)
+            entry = self.cache.put(key, self.convert_audio(wav_audio))
+        return entry[0]
 
     def google_tts_call(self, text):
         """
-        This method does a Google TTS call and returns the response (audio data in MP3 format) as bytes
+        This method does a Google TTS call and returns the response (audio data in WAVE format) as bytes
         Args:
             text (str): The string to be synthesized
 
-        Returns (bytes): Audio data in MP3 format as bytes.
+        Returns (bytes): Audio data in WAVE format as bytes.
 
         """
         request_data = {'input': {
@@ -140,8 +122,9 @@ class GoogleTTS:
                 'ssmlGender': self.ssml_gender},
             'audioConfig': {
                 'speakingRate': self.speaking_rate,
-                'audioEncoding': 'MP3'} # We always use MP3 audio encoding, because it is fast to download.
-        }                               # We convert that later on to the format we want
+                'audioEncoding': 'LINEAR16', # WAV audio, decoded in convert_audio
+                'sampleRateHertz': self.wav_sample_rate}
+        }
 
         json_data = json.dumps(request_data)
 
@@ -159,38 +142,16 @@ class GoogleTTS:
 
     def convert_audio(self, audio):
         """
-        Converts the given mp3 audio to the respecitve pcm data through ffmpeg.
-        This function assumes ffmpeg is installed and readily available.
+        Converts the given wav audio to the respecitve pcm data.
 
         Args:
-            audio (bytes): The mp3 audio data as given by Google TTS
+            audio (bytes): The wav audio data as given by Google TTS
 
         Returns (bytes): The pcm data as specified by wav_codec and wav_sample_rate. Note that this byte array does not
             contain the wave header (or any other header) but is just the raw audio data.
 
         """
-        tmp_mp3_name = self.TEMP_NAME + ".mp3"
-        tmp_wav_name = self.TEMP_NAME + ".wav"
-        tmp_mp3_path = os.path.join(self.TEMP_DIR, tmp_mp3_name)
-        tmp_wav_path = os.path.join(self.TEMP_DIR, tmp_wav_name)
-
-        with open(tmp_mp3_path, 'wb') as f:
-            f.write(audio)
-
-        subprocess.call(["ffmpeg", "-i", tmp_mp3_path, "-acodec", self.wav_codec, "-ar", str(self.wav_sample_rate), tmp_wav_path, "-y"],
-                        stdout=subprocess.DEVNULL,
-                        stderr=subprocess.DEVNULL)
-
-        wav_audio = None
-        with wave.open(tmp_wav_path, 'rb') as wav_file:
-            w_length = wav_file.getnframes()
-            wav_audio = wav_file.readframes(w_length)
-
-        # Cleanup
-        os.remove(tmp_mp3_path)
-        os.remove(tmp_wav_path)
-
-        return wav_audio
+        return convert.convert_wav(audio, self.wav_sample_rate, sample_width=2)
 
 class GoogleTTSModule(abstract.AbstractModule):
     """A Google TTS Module that uses Googles TTS service to synthesize audio."""
@@ -210,9 +171,10 @@ class GoogleTTSModule(abstract.AbstractModule):
     def output_iu():
         return audio.common.SpeechIU
 
-    def __init__(self, language_code, voice_name, speaking_rate=1.4, caching=True, **kwargs):
+    def __init__(self, language_code, voice_name, speaking_rate=1.4, caching=True, streaming=False, **kwargs):
         super().__init__(**kwargs)
         self.language_code = language_code
+        self.streaming = streaming
         self.voice_name = voice_name
         self.speaking_rate = speaking_rate
         self.caching = caching
@@ -225,6 +187,13 @@ class GoogleTTSModule(abstract.AbstractModule):
         self.gtts.gcloud_token(use_cache=False)
 
     def process_iu(self, input_iu):
+        if self.streaming and input_iu.dispatch and input_iu.get_text() != "":
+            # output every phrase as soon as it is synthesized
+            for output_iu in stream_speech(self, input_iu, lambda text: (self.gtts.tts(text), {}), self.rate,
+                                           self.sample_width):
+                self.append(output_iu)
+            return None
+
         output_iu = self.create_iu(input_iu)
         raw_audio = self.gtts.tts(input_iu.get_text())
         nframes = len(raw_audio) / self.sample_width
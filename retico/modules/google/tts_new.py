@@ -1,6 +1,9 @@
 from retico.core import abstract
 from retico.core.text.common import GeneratedTextIU
+from retico.core.audio import convert
 from retico.core.audio.common import SpeechIU
+from retico.core.audio.cache import get_cache
+from retico.core.audio.tts import stream_speech
 
 from google.cloud import texttospeech_v1beta1 as texttospeech
 from os import environ
@@ -101,7 +104,9 @@ class TTSGoogle(object):
         for t in response.timepoints:
             starts.append(t.time_seconds)
             words.append(t.mark_name)
-        return words, starts, response.audio_content
+        # LINEAR16 audio is returned with a WAV header
+        raw_audio = convert.convert_wav(response.audio_content, self.sample_rate)
+        return words, starts, raw_audio
 
 
 class GoogleTTSModule(abstract.AbstractModule):
@@ -123,16 +128,71 @@ class GoogleTTSModule(abstract.AbstractModule):
     def output_iu():
         return SpeechIU
 
-    def __init__(self, sample_rate=16000, bytes_per_sample=2, caching=True, **kwargs):
+    CACHE_DIR = "/tmp/tts"
+
+    def __init__(
+        self,
+        sample_rate=16000,
+        bytes_per_sample=2,
+        caching=True,
+        cache_dir=CACHE_DIR,
+        streaming=False,
+        **kwargs,
+    ):
         super().__init__(**kwargs)
         self.caching = caching
+        self.streaming = streaming
         self.gtts = TTSGoogle(sample_rate=sample_rate)
         self.bytes_per_sample = bytes_per_sample
         self.sample_rate = self.gtts.sample_rate
+        self.cache = get_cache(cache_dir) if caching else None
+        self.cache_requests = 0
+        self.cache_hits = 0
+
+    def cache_key(self, text):
+        return self.cache.key(
+            "google",
+            f"{self.gtts.language_code}/{self.gtts.name}",
+            self.sample_rate,
+            self.bytes_per_sample,
+            text,
+            speaking_rate=self.gtts.speaking_rate,
+            pitch=self.gtts.pitch,
+            gender=self.gtts.gender,
+        )
+
+    def synthesize(self, text, prefetch=False):
+        """
+        Returns the raw audio and the word timings (words, starts) of the text. Requests with `prefetch=True` do not
+        count towards the cache hit rate.
+        """
+        def synthesize():
+            words, starts, raw_audio = self.gtts.tts(text)
+            return raw_audio, {"words": words, "starts": starts}
+
+        if self.cache is None:
+            return synthesize()
+        entry, cached = self.cache.get_or_put(self.cache_key(text), synthesize)
+        if not prefetch:
+            self.cache_requests += 1
+            self.cache_hits += cached
+        return entry
 
     def process_iu(self, input_iu):
+        if self.streaming and input_iu.dispatch and input_iu.get_text() != "":
+            # output every phrase as soon as it is synthesized
+            for output_iu in stream_speech(
+                self,
+                input_iu,
+                self.synthesize,
+                self.sample_rate,
+                self.bytes_per_sample,
+            ):
+                self.append(output_iu)
+            return None
+
         output_iu = self.create_iu(input_iu)
-        _, _, raw_audio = self.gtts.tts(input_iu.get_text())
+        raw_audio, _ = self.synthesize(input_iu.get_text())
         nframes = len(raw_audio) / self.bytes_per_sample
         output_iu.set_audio(raw_audio, nframes, self.sample_rate, self.bytes_per_sample)
         # output_iu.words = words
@@ -1,25 +1,20 @@
 import http.client
-import os
-import subprocess
-import wave
 import urllib
-import random
-from hashlib import blake2b
 
 from retico.core import abstract, text, audio
+from retico.core.audio import convert
+from retico.core.audio.cache import get_cache
+from retico.core.audio.tts import stream_speech
 
 
 class MaryTTS:
     """
     A mary TTS class that is able to return the audio as pcm.
 
-    This class relies on a mary tts server rinning and ffmpeg to be installed
-    and available.
+    This class relies on a mary tts server rinning.
     """
 
     CACHING_DIR = "data/mtts_cache/"
-    TEMP_DIR = "/tmp"
-    TEMP_NAME = "tmp_tts_%s" % random.randint(1000, 10000)
 
     def __init__(
         self,
@@ -46,33 +41,29 @@ class MaryTTS:
         self.server_port = server_port
         self.caching = caching
 
-        self.wav_sample_rate = 44100  # 44100 sample rate / See ffmpeg
-        self.wav_codec = "pcm_s16le"  # 16-bit little endian codec / See ffmpeg
+        self.wav_sample_rate = 44100  # 44100 sample rate
+        self.wav_codec = "pcm_s16le"  # 16-bit little endian codec
 
-        # Create caching directory if it not already exists
-        if not os.path.exists(self.CACHING_DIR):
-            os.mkdir(self.CACHING_DIR)
+        self.cache = get_cache(self.CACHING_DIR) if caching else None
 
-    def get_cache_path(self, text):
+    def get_cache_key(self, text):
         """
-        Creates a hash of the given TTS settings and returns a unique path to the cached version of the synthesis.
-        This method does not check for the cached file to exist!
+        Returns the key of the synthesis of the given text with the TTS settings in the TTS cache.
 
         Args:
-            text (str): The text to synthesis (this is included in the hash that is used for the cache path)
+            text (str): The text to synthesis (this is included in the hash that is used for the cache key)
 
-        Returns (str): Path to a cached version of that synthesis.
+        Returns (str): The key of the synthesis.
 
         """
-        h = blake2b(digest_size=16)
-        h.update(bytes(text, "utf-8"))
-        h.update(bytes(self.voice_name, "utf-8"))
-        h.update(bytes(self.language_code, "utf-8"))
-        h.update(bytes(self.wav_codec, "utf-8"))
-        h.update(bytes(str(self.wav_sample_rate), "utf-8"))  # Does this make sense?
-        text_digest = h.hexdigest()
-
-        return os.path.join(self.CACHING_DIR, text_digest)
+        return self.cache.key(
+            "mary",
+            "%s/%s" % (self.language_code, self.voice_name),
+            self.wav_sample_rate,
+            2,
+            text,
+            codec=self.wav_codec,
+        )
 
     def tts(self, text):
         """
@@ -85,18 +76,14 @@ class MaryTTS:
 
         Returns (bytes): The synthesized text in raw PCM format.
         """
-        cache_path = self.get_cache_path(text)
-        if os.path.isfile(cache_path):
-            wav_audio = None
-            with open(cache_path, "rb") as cfile:
-                wav_audio = cfile.read()
-        else:
+        if self.cache is None:
+            return self.convert_audio(self.mary_tts_call(text))
+        key = self.get_cache_key(text)
+        entry = self.cache.get(key)
+        if entry is None:
             mtts_audio = self.mary_tts_call(text)
-            wav_audio = self.convert_audio(mtts_audio)
-            with open(cache_path, "wb") as cfile:
-                cfile.write(wav_audio)
-
-        return wav_audio
+            entry = self.cache.put(key, self.convert_audio(mtts_audio))
+        return entry[0]
 
     def mary_tts_call(self, text):
         """
@@ -121,8 +108,7 @@ class MaryTTS:
 
     def convert_audio(self, audio):
         """
-        Converts the given wav audio to the respecitve pcm data through ffmpeg.
-        This function assumes ffmpeg is installed and readily available.
+        Converts the given wav audio to the respecitve pcm data.
 
         Args:
             audio (bytes): The wav audio data as given by Mary TTS
@@ -131,40 +117,7 @@ class MaryTTS:
             contain the wave header (or any other header) but is just the raw audio data.
 
         """
-        tmp_mary_name = self.TEMP_NAME + "_mtts.wav"
-        tmp_wav_name = self.TEMP_NAME + ".wav"
-        tmp_mary_path = os.path.join(self.TEMP_DIR, tmp_mary_name)
-        tmp_wav_path = os.path.join(self.TEMP_DIR, tmp_wav_name)
-
-        with open(tmp_mary_path, "wb") as f:
-            f.write(audio)
-
-        subprocess.call(
-            [
-                "ffmpeg",
-                "-i",
-                tmp_mary_path,
-                "-acodec",
-                self.wav_codec,
-                "-ar",
-                str(self.wav_sample_rate),
-                tmp_wav_path,
-                "-y",
-            ],
-            stdout=subprocess.DEVNULL,
-            stderr=subprocess.DEVNULL,
-        )
-
-        wav_audio = None
-        with wave.open(tmp_wav_path, "rb") as wav_file:
-            w_length = wav_file.getnframes()
-            wav_audio = wav_file.readframes(w_length)
-
-        # Cleanup
-        os.remove(tmp_mary_path)
-        os.remove(tmp_wav_path)
-
-        return wav_audio
+        return convert.convert_wav(audio, self.wav_sample_rate, sample_width=2)
 
 
 class MaryTTSModule(abstract.AbstractModule):
@@ -193,10 +146,12 @@ class MaryTTSModule(abstract.AbstractModule):
         server_address="localhost",
         server_port=59125,
         caching=True,
+        streaming=False,
         **kwargs,
     ):
         super().__init__(**kwargs)
         self.language_code = language_code
+        self.streaming = streaming
         self.voice_name = voice_name
         self.server_address = server_address
         self.server_port = server_port
@@ -208,6 +163,18 @@ class MaryTTSModule(abstract.AbstractModule):
         self.rate = 44100
 
     def process_iu(self, input_iu):
+        if self.streaming and input_iu.dispatch and input_iu.get_text() != "":
+            # output every phrase as soon as it is synthesized
+            for output_iu in stream_speech(
+                self,
+                input_iu,
+                lambda text: (self.mtts.tts(text), {}),
+                self.rate,
+                self.sample_width,
+            ):
+                self.append(output_iu)
+            return None
+
         output_iu = self.create_iu(input_iu)
         raw_audio = self.mtts.tts(input_iu.get_text())
         nframes = len(raw_audio) / self.sample_width
@@ -2,7 +2,7 @@
 A module of degradations for a network.
 """
 
-import time
+from retico.core import clock
 
 class Degradation:
     """An abstract degradation class"""
@@ -49,5 +49,5 @@ class Delay(Degradation):
         d = self.delay - original_iu.age()
         # print("sleeping %.2f" % d)
         if d > 0:
-            time.sleep(d)
+            clock.get_clock().sleep(d)
         return iu
\ No newline at end of file
@@ -10,8 +10,13 @@ The database contains the following information:
 """
 
 import glob
+import os
 from os import path
 import csv
+import mmap
+import pickle
+import struct
+import threading
 import wave
 
 
@@ -53,7 +58,8 @@ class SimulationData():
         self.dialogue_act = None
         self.concepts = None
 
-        self.raw_audio = None
+        self._raw_audio = None
+        self._audio_source = None
         self.frame_rate = 0
         self.sample_width = 0
 
@@ -90,10 +96,33 @@ class SimulationData():
             frame_rate: The frame rate of the audio blob.
             sample_width: The width of one sample in bytes.
         """
-        self.raw_audio = raw_audio
+        self._raw_audio = raw_audio
+        self._audio_source = None
         self.frame_rate = frame_rate
         self.sample_width = sample_width
 
+    def set_audio_source(self, audio_source, frame_rate, sample_width):
+        """Set a function that returns the audio when it is accessed for the
+        first time.
+
+        Args:
+            audio_source (function): A function returning the raw audio.
+            frame_rate: The frame rate of the audio blob.
+            sample_width: The width of one sample in bytes.
+        """
+        self._raw_audio = None
+        self._audio_source = audio_source
+        self.frame_rate = frame_rate
+        self.sample_width = sample_width
+
+    @property
+    def raw_audio(self):
+        """The raw audio of the utterance. If the audio is given by an audio
+        source, it is only loaded when it is accessed."""
+        if self._raw_audio is None and self._audio_source is not None:
+            self._raw_audio = self._audio_source()
+        return self._raw_audio
+
     def set_transcription(self, transcription, confidence):
         """Set the transcription and the confidence.
 
@@ -105,8 +134,71 @@ class SimulationData():
         self.confidence = confidence
 
 
+def _wave_data_chunk(wav_path):
+    """Return the byte offset and size of the audio data in a wave file.
+
+    Args:
+        wav_path (str): The path to the wave file.
+
+    Returns:
+        (int, int): The offset and the size of the data chunk in bytes.
+    """
+    with open(wav_path, 'rb') as f:
+        header = f.read(12)
+        if header[:4] != b"RIFF" or header[8:12] != b"WAVE":
+            raise ValueError("%s is not a wave file" % wav_path)
+        while True:
+            chunk_header = f.read(8)
+            if len(chunk_header) < 8:
+                raise ValueError("%s has no data chunk" % wav_path)
+            chunk_id, size = struct.unpack("<4sI", chunk_header)
+            if chunk_id == b"data":
+                return f.tell(), size
+            f.seek(size + (size % 2), 1)
+
+
+_mapped_files = {}
+_mapped_lock = threading.Lock()
+
+
+def map_wave_file(wav_path):
+    """Return a read-only memoryview on a memory-mapped wave file.
+
+    Every file is mapped only once per process and the mapping is shared by all
+    databases. The mapping is backed by the page cache of the operating system,
+    so processes that map the same file share its memory as well.
+
+    Args:
+        wav_path (str): The path to the wave file.
+
+    Returns:
+        memoryview: The content of the wave file.
+    """
+    wav_path = path.abspath(wav_path)
+    with _mapped_lock:
+        buffer = _mapped_files.get(wav_path)
+        if buffer is None:
+            with open(wav_path, 'rb') as f:
+                buffer = memoryview(mmap.mmap(f.fileno(), 0,
+                                              access=mmap.ACCESS_READ))
+            _mapped_files[wav_path] = buffer
+        return buffer
+
+
 class SimulatioDB():
-    """A database for the Simulation modules."""
+    """A database for the Simulation modules.
+
+    The database is an index of all utterances of an agent type keyed by the
+    dialogue act and the set of concept names of each utterance. The index
+    only contains the position of the audio of each utterance inside its wave
+    file. The wave files are memory-mapped and the audio of an utterance is
+    only sliced when it is accessed.
+
+    The index is stored next to the data (or at the given cache path) and is
+    rebuilt when a data file was added, removed or changed.
+    """
+
+    INDEX_VERSION = 1
 
     @staticmethod
     def get_wave_data(wav_file, startpos, endpos):
@@ -134,38 +226,136 @@ class SimulatioDB():
         """Opens the csv and wav files contained in the given path and yields
         them."""
         glob_path = path.join(data_directory, "*.txt")
-        for csv_p in glob.glob(glob_path):
+        for csv_p in sorted(glob.glob(glob_path)):
             wav_p = csv_p.replace(".txt", ".wav")
             with open(csv_p, 'r') as csv_f, wave.open(wav_p, 'rb') as wav_f:
                 reader = csv.reader(csv_f, delimiter="\t")
                 yield reader, wav_f, csv_p, wav_p
 
-    def read_data(self, data_directory):
-        """Reads the data from file into a data structure."""
+    @staticmethod
+    def source_files(data_directory):
+        """Return the modification time and size of all data files, used to
+        detect whether a stored index is outdated."""
+        sources = {}
+        for csv_p in sorted(glob.glob(path.join(data_directory, "*.txt"))):
+            for p in [csv_p, csv_p.replace(".txt", ".wav")]:
+                if path.exists(p):
+                    stat = os.stat(p)
+                    sources[path.relpath(p, data_directory)] = (stat.st_mtime_ns,
+                                                                stat.st_size)
+        return sources
+
+    def build_index(self, data_directory):
+        """Build the index of all utterances of the agent type.
+
+        Returns:
+            dict: A dict mapping (dialogue act, frozenset of concept names) to
+            a list of entries (wav file, csv file, csv row, audio offset, audio
+            size, frame rate, sample width).
+        """
+        index = {}
         for csv_f, wav_f, csv_p, wav_p in self.csv_wav_pair(data_directory):
-            current_rate = wav_f.getframerate()
-            current_sample_width = wav_f.getsampwidth()
+            rate = wav_f.getframerate()
+            sample_width = wav_f.getsampwidth()
+            frame_width = sample_width * wav_f.getnchannels()
+            nframes = wav_f.getnframes()
+            data_offset, _ = _wave_data_chunk(wav_p)
             for row in csv_f:
                 if len(row) != 7:
                     continue
                 if row[1] != self.agent_type:
                     continue
                 data = SimulationData(wav_p, csv_p, row)
-                data.set_transcription(row[5], float(row[6]))
                 data.set_dialogue_act(row[4])
-                wav_data = self.get_wave_data(wav_f, int(row[2]), int(row[3]))
-                data.set_audio(wav_data, current_rate, current_sample_width)
-                yield data
+                # The same positions as in get_wave_data
+                startpos, endpos = int(row[2]), int(row[3])
+                start = min(int((startpos / 1000) * rate), nframes)
+                length = int(rate * ((endpos - startpos) / 1000))
+                length = max(min(length, nframes - start), 0)
+                key = (data.dialogue_act, frozenset(data.concepts))
+                index.setdefault(key, []).append((
+                    path.relpath(wav_p, data_directory),
+                    path.relpath(csv_p, data_directory),
+                    row,
+                    data_offset + start * frame_width,
+                    length * frame_width,
+                    rate,
+                    sample_width))
+        return index
+
+    def load_index(self):
+        """Load the index from the cache path or build and store it if it does
+        not exist or is outdated."""
+        sources = self.source_files(self.data_directory)
+        try:
+            with open(self.cache_path, 'rb') as f:
+                cached = pickle.load(f)
+            if cached["version"] == self.INDEX_VERSION \
+             and cached["agent_type"] == self.agent_type \
+             and cached["sources"] == sources:
+                return cached["index"]
+        except (OSError, EOFError, pickle.UnpicklingError, KeyError, TypeError):
+            pass
+        index = self.build_index(self.data_directory)
+        cached = {"version": self.INDEX_VERSION,
+                  "agent_type": self.agent_type,
+                  "sources": sources,
+                  "index": index}
+        try:
+            tmp_path = "%s.%d.tmp" % (self.cache_path, os.getpid())
+            with open(tmp_path, 'wb') as f:
+                pickle.dump(cached, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, self.cache_path)
+        except OSError:
+            pass  # The data directory may be read-only
+        return index
+
+    def __init__(self, data_directory, agent_type, cache_path=None):
+        """Initialize the database.
 
-    def __init__(self, data_directory, agent_type):
+        Args:
+            data_directory (str): The directory containing the csv and wav
+                files.
+            agent_type (str): The type of the agent (e.g. "caller").
+            cache_path (str): The path of the stored index. Defaults to a file
+                in the data directory.
+        """
         self.data_directory = data_directory
         self.agent_type = agent_type
-        self.act_db = {}
+        if cache_path is None:
+            cache_path = path.join(data_directory,
+                                   ".simulation_index_%s.pickle" % agent_type)
+        self.cache_path = cache_path
+        self.index = self.load_index()
 
-        for idata in self.read_data(data_directory):
-            if not self.act_db.get(idata.dialogue_act):
-                self.act_db[idata.dialogue_act] = []
-            self.act_db[idata.dialogue_act].append(idata)
+    def audio_buffer(self, wav_path):
+        """Return a memoryview on the memory-mapped wave file.
+
+        Args:
+            wav_path (str): The path of the wave file relative to the data
+                directory.
+        """
+        return map_wave_file(path.join(self.data_directory, wav_path))
+
+    def _create_data(self, entry):
+        wav_p, csv_p, row, offset, size, rate, sample_width = entry
+        data = SimulationData(path.join(self.data_directory, wav_p),
+                              path.join(self.data_directory, csv_p), row)
+        data.set_transcription(row[5], float(row[6]))
+        data.set_dialogue_act(row[4])
+        data.set_audio_source(
+            lambda: bytes(self.audio_buffer(wav_p)[offset:offset + size]),
+            rate, sample_width)
+        return data
+
+    @property
+    def act_db(self):
+        """dict: All utterances grouped by their dialogue act."""
+        act_db = {}
+        for (act, _), entries in self.index.items():
+            act_db.setdefault(act, []).extend(self._create_data(e)
+                                              for e in entries)
+        return act_db
 
     def query(self, dialogue_act, concepts):
         """Queries the database and returns a list of candiates having the same
@@ -184,13 +374,37 @@ class SimulatioDB():
             SimulationData: Data structures that have the same dialogue_act and
             the same concept types as given in the arguments.
         """
-        candidates = []
-        if not self.act_db.get(dialogue_act):
-            return []
-        for idata in self.act_db[dialogue_act]:
-            if set(concepts.keys()) == set(idata.concepts.keys()):
-                candidates.append(idata)
-        return candidates
+        entries = self.index.get((dialogue_act, frozenset(concepts.keys())), [])
+        return [self._create_data(entry) for entry in entries]
+
+
+_databases = {}
+_databases_lock = threading.Lock()
+
+
+def get_database(data_directory, agent_type, cache_path=None):
+    """Return the database of the given data directory and agent type that is
+    shared by all modules of the process.
+
+    The database is only created (or its index loaded) the first time it is
+    requested. The database is read-only, so it may be queried by several
+    modules concurrently.
+
+    Args:
+        data_directory (str): The directory containing the csv and wav files.
+        agent_type (str): The type of the agent (e.g. "caller").
+        cache_path (str): The path of the stored index.
+
+    Returns:
+        SimulatioDB: The shared database.
+    """
+    key = (path.abspath(data_directory), agent_type, cache_path)
+    with _databases_lock:
+        db = _databases.get(key)
+        if db is None:
+            db = SimulatioDB(data_directory, agent_type, cache_path)
+            _databases[key] = db
+        return db
 
 
 if __name__ == '__main__':
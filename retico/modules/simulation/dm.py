@@ -29,12 +29,11 @@ are not installed:
         the TurnTakingDialogueManagerModule).
 """
 
-import time
 import threading
 import random
 import math
 
-from retico.core import abstract
+from retico.core import abstract, clock
 from retico.core.dialogue.common import DialogueActIU, DispatchableActIU
 from retico.core.audio.common import DispatchedAudioIU
 from retico.core.prosody.common import EndOfTurnIU
@@ -82,7 +81,7 @@ class DialogueState:
             flaot: The time since the current utterance started.
 
         """
-        return time.time() - self.utter_start
+        return clock.get_clock().time() - self.utter_start
 
     @property
     def ts_utter_end(self):
@@ -92,7 +91,7 @@ class DialogueState:
             float: The time since the last utterance ended.
 
         """
-        return time.time() - self.utter_end
+        return clock.get_clock().time() - self.utter_end
 
     @property
     def in_middle_of_turn(self):
@@ -292,7 +291,7 @@ class TurnTakingDialogueManagerModule(abstract.AbstractModule):
         This method is used in the begining of the dialogue to avoid strange
         behavior when no utterance has preceeded.
         """
-        now = time.time()
+        now = clock.get_clock().time()
         self.me.utter_start = now
         self.me.utter_end = now
         self.other.utter_start = now
@@ -338,12 +337,12 @@ class TurnTakingDialogueManagerModule(abstract.AbstractModule):
                 AudioDispatcherModule.
         """
         if self.me.is_speaking and not input_iu.is_dispatching:
-            self.me.utter_end = time.time()
+            self.me.utter_end = clock.get_clock().time()
             self.me.last_act = self.me.current_act
             self.me.current_act = None
             self.suspended = False
         elif not self.me.is_speaking and input_iu.is_dispatching:
-            self.me.utter_start = time.time()
+            self.me.utter_start = clock.get_clock().time()
             self.suspended = False
             self.reset_random()
         self.me.is_speaking = input_iu.is_dispatching
@@ -363,9 +362,9 @@ class TurnTakingDialogueManagerModule(abstract.AbstractModule):
                 interlocutor.
         """
         if self.other.is_speaking and not input_iu.is_speaking:
-            self.other.utter_end = time.time()
+            self.other.utter_end = clock.get_clock().time()
         elif not self.other.is_speaking and input_iu.is_speaking:
-            self.other.utter_start = time.time()
+            self.other.utter_start = clock.get_clock().time()
             self.reset_random()
         self.other.is_speaking = input_iu.is_speaking
         self.other.completion = input_iu.probability
@@ -630,42 +629,52 @@ class TurnTakingDialogueManagerModule(abstract.AbstractModule):
         gando-model of the other agent determine if a turn is passed over or if
         the agent continues speaking.
         """
-        while not self.dialogue_finished:
-
-            # Suspend execution until something happens
-            while self.suspended:
-                time.sleep(self.SLEEP_TIME)
-
-            if not self.dialogue_started:
-                if self.first_utterance:
-                    self.reset_utterance_timers()
-                    self.speak()
-                    self.dialogue_started = True
-                continue
-
-            if self.i_speak:
-                pass  # Do nothing.
-            elif self.they_speak:
-                if self.should_interrupt():
-                    self.speak()
-            elif self.both_silent:
-                if not self.i_spoke_last() and self.should_speak():
-                    self.speak()
-                elif self.i_spoke_last() and self.should_continue():
-                    self.speak()
-            elif self.both_speak:
-                if self.double_talk_detected():
-                    if random.random() < 0.1:
-                        self.event_call(
-                            self.EVENT_DOUBLE_TALK,
-                            {
-                                "my_iu": self.me.current_act,
-                                "other_iu": self.other.current_act,
-                            },
-                        )
-                        self.silence()
-
-            time.sleep(self.SLEEP_TIME)
+        timer = clock.get_clock()
+        timer.register()
+        try:
+            while not self.dialogue_finished:
+
+                # Suspend execution until something happens
+                while self.suspended and not self.dialogue_finished:
+                    timer.sleep(self.SLEEP_TIME)
+                if self.dialogue_finished:
+                    break
+
+                if not self.dialogue_started:
+                    if self.first_utterance:
+                        self.reset_utterance_timers()
+                        self.speak()
+                        self.dialogue_started = True
+                    else:
+                        # Wait for the interlocutor to start the dialogue
+                        timer.sleep(self.SLEEP_TIME)
+                    continue
+
+                if self.i_speak:
+                    pass  # Do nothing.
+                elif self.they_speak:
+                    if self.should_interrupt():
+                        self.speak()
+                elif self.both_silent:
+                    if not self.i_spoke_last() and self.should_speak():
+                        self.speak()
+                    elif self.i_spoke_last() and self.should_continue():
+                        self.speak()
+                elif self.both_speak:
+                    if self.double_talk_detected():
+                        if random.random() < 0.1:
+                            self.event_call(
+                                self.EVENT_DOUBLE_TALK,
+                                {
+                                    "my_iu": self.me.current_act,
+                                    "other_iu": self.other.current_act,
+                                },
+                            )
+                            self.silence()
+
+                timer.sleep(self.SLEEP_TIME)
+        finally:
+            timer.unregister()
 
     def setup(self):
         """Sets the dialogue_finished flag to false. This may be overwritten
@@ -682,8 +691,9 @@ class TurnTakingDialogueManagerModule(abstract.AbstractModule):
 
     def shutdown(self):
         """Sets the dialogue_finished flag that eventually terminates the
-        dialogue_loop."""
+        dialogue_loop (even if it is suspended)."""
         self.dialogue_finished = True
+        self.suspended = False
 
     def __repr__(self):
         return super().__repr__() + " " + self.role
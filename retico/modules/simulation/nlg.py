@@ -12,7 +12,7 @@ import random
 from retico.core import abstract
 from retico.core.text.common import GeneratedTextIU
 from retico.core.dialogue.common import DispatchableActIU
-from retico.modules.simulation.database.simulation import SimulatioDB
+from retico.modules.simulation.database.simulation import get_database
 
 
 class SimulatedNLGModule(abstract.AbstractModule):
@@ -74,7 +74,7 @@ class SimulatedNLGModule(abstract.AbstractModule):
         return output_iu
 
     def setup(self):
-        self.db = SimulatioDB(self.data_directory, self.agent_type)
+        self.db = get_database(self.data_directory, self.agent_type)
 
     def shutdown(self):
         pass
@@ -1,64 +1,239 @@
 import time
 import os
-import shutil
+import json
+import random
+import threading
 import argparse
+import multiprocessing
+
+import numpy as np
 
 from retico.headless import load
-from retico.core.audio.io import SpeakerModule, StreamingSpeakerModule
+from retico.core import clock, events
+from retico.core.audio.io import (
+    AudioDispatcherModule,
+    SpeakerModule,
+    StreamingSpeakerModule,
+)
+
+DRAIN_TIME = 10.0
+"""The maximum time (on the clock of the network) that a run waits after the
+end event for the last utterance to be dispatched."""
+
+DRAIN_QUIET_TIME = 0.5
+"""The time (on the clock of the network) that no audio has to be dispatched
+before the network is stopped."""
+
+JOIN_TIMEOUT = 10.0
+"""The maximum time in seconds to wait for the threads of a run to finish."""
+
+
+def wait_for_drain(modules, timer, max_time=DRAIN_TIME):
+    """Wait until the audio dispatchers of the network are quiet.
+
+    The dialogue ends when the last dialogue act is created, so its audio has
+    yet to be produced and dispatched. This waits (on the clock of the
+    network) until no audio dispatcher dispatched anything for
+    DRAIN_QUIET_TIME, so that the last utterance is in the recordings and the
+    transcript.
+
+    Args:
+        modules (list): The modules of the network.
+        timer (WallClock): The clock of the network.
+        max_time (float): The maximum time to wait.
+
+    Returns:
+        bool: Whether the dispatchers became quiet before max_time passed.
+    """
+    dispatchers = [m for m in modules if isinstance(m, AudioDispatcherModule)]
+    deadline = timer.time() + max_time
+    quiet_since = timer.time()
+    while timer.time() < deadline:
+        if any(d.is_dispatching() or d.audio_buffer for d in dispatchers):
+            quiet_since = timer.time()
+        elif timer.time() - quiet_since >= DRAIN_QUIET_TIME:
+            return True
+        timer.sleep(0.05)
+    return False
+
+
+def run_simulation(file, index, output_folder, seed=None, audio_output=False,
+                   end_sim_event="dialogue_end", log_files=(),
+                   virtual_clock=False, timeout=None):
+    """Runs a single simulation and returns a summary of the run.
+
+    This function is executed in its own process by the AutomatedExecution.
+    The working directory is not changed, so relative paths to the resources of
+    the network (e.g. databases and models loaded in `setup`) still work. Only
+    the relative file names of the recording modules (their `filename`) are
+    moved into the output directory of the run, so that all log files of the
+    network are written there.
+
+    Args:
+        file (str): The path to the .rtc file containing the network.
+        index (int): The number of the run.
+        output_folder (str): The folder in which the output directory of the
+            run is created.
+        seed (int): The seed for the random number generators of the run.
+        audio_output (bool): Whether the speaker modules should be kept.
+        end_sim_event (str): The event that ends the simulation.
+        log_files (list): The names of the log files written by the network.
+        virtual_clock (bool): Whether the network runs with a VirtualClock
+            instead of the wall clock.
+        timeout (float): The maximum duration of the run in seconds (wall
+            clock). If None, the run waits for the end event indefinitely.
+
+    Returns:
+        dict: A summary of the run.
+    """
+    if seed is not None:
+        random.seed(seed)
+        np.random.seed(seed)
+    if virtual_clock:
+        clock.set_clock(clock.VirtualClock())
+    timer = clock.get_clock()
+
+    run_folder = os.path.abspath(os.path.join(output_folder, "iteration%d" % index))
+    os.makedirs(run_folder, exist_ok=True)
+
+    modules, _ = load(file)
+    for module in modules:
+        filename = getattr(module, "filename", None)
+        if isinstance(filename, str) and not os.path.isabs(filename):
+            module.filename = os.path.join(run_folder, filename)
+
+    ended = threading.Event()
+
+    def end_sim(module, event_name, data):
+        ended.set()
+
+    new_modules = []
+    for module in modules:
+        if isinstance(module, (SpeakerModule, StreamingSpeakerModule)) \
+         and not audio_output:
+            module.remove()
+            continue
+        module.event_subscribe(end_sim_event, end_sim)
+        module.setup()
+        new_modules.append(module)
+    modules = new_modules
+
+    start_wall = time.time()
+    start_time = timer.time()
+    for module in modules:
+        module.run(run_setup=False)
+    finished = ended.wait(timeout)
+    drained = wait_for_drain(modules, timer) if finished else False
+    duration = timer.time() - start_time
+    for module in modules:
+        module.stop()
+
+    # Wait for the modules to shut down, so that all log files are written
+    deadline = time.time() + JOIN_TIMEOUT
+    unfinished = []
+    for thread in threading.enumerate():
+        if thread is threading.main_thread() or thread.daemon \
+         or thread.name.startswith(events.THREAD_NAME_PREFIX):
+            continue
+        thread.join(max(deadline - time.time(), 0))
+        if thread.is_alive():
+            unfinished.append(thread.name)
+    if unfinished:
+        print("Simulation %d: threads did not finish: %s" % (index, unfinished))
+    events.get_dispatcher().shutdown(wait=not unfinished)
+
+    return {
+        "index": index,
+        "seed": seed,
+        "folder": run_folder,
+        "finished": finished,
+        "drained": drained,
+        "unfinished_threads": unfinished,
+        "duration": duration,
+        "wall_duration": time.time() - start_wall,
+        "log_files": [f for f in log_files
+                      if os.path.exists(os.path.join(run_folder, f))],
+    }
+
+
+def _run_simulation(kwargs):
+    return run_simulation(**kwargs)
+
 
 class AutomatedExecution():
 
     def __init__(self, file, num_runs=10, audio_output=False,
                  end_sim_event="dialogue_end", output_folder="sims/auto_sims",
-                 log_files=["recording_caller.wav", "recording_callee.wav", "transcript.txt", "acts.txt"]):
-        self.file = file
+                 log_files=["recording_caller.wav", "recording_callee.wav", "transcript.txt", "acts.txt"],
+                 workers=1, seed=0, virtual_clock=False, timeout=None):
+        self.file = os.path.abspath(file)
         self.num_runs = num_runs
         self.audio_output = audio_output
         self.end_sim_event = end_sim_event
-        self.output_folder = output_folder
+        self.output_folder = os.path.abspath(output_folder)
         self.log_files = log_files
+        if audio_output and workers > 1:
+            # Concurrent runs would play their audio at the same time
+            print("Audio output is enabled, running the simulations one by one")
+            workers = 1
+        self.workers = workers
+        self.seed = seed
+        self.virtual_clock = virtual_clock
+        self.timeout = timeout
 
-        self.is_running = False
+    def run_sims(self):
+        """Runs all simulations and writes a summary index of the runs.
 
-    def end_sim(self, module, event_name, data):
-        print("SIMULATION ENDS HERE")
-        self.is_running = False
+        Every simulation runs in its own process with its own output directory
+        ("iteration<i>" in the output folder) and its own seed (the seed of the
+        execution plus the number of the run). Up to `workers` simulations run
+        concurrently.
 
-    def run_sims(self):
-        if not os.path.exists(self.output_folder):
-            os.mkdir(self.output_folder)
-        print("Running %d simulations..." % self.num_runs)
-        for i in range(self.num_runs):
-            print("Running simulation %d" % i)
-            modules, _ = load(self.file)
-
-            new_modules = []
-            for module in modules:
-                if isinstance(module, (SpeakerModule, StreamingSpeakerModule)) \
-                 and not self.audio_output:
-                    print("Removed speaker %s" % module)
-                    module.remove()
-                    continue
-                module.event_subscribe(self.end_sim_event, self.end_sim)
-                module.setup()
-                new_modules.append(module)
-            modules = new_modules
-
-            self.is_running = True
-            for module in modules:
-                module.run(run_setup=False)
-            while self.is_running:
-                time.sleep(0.01)
-            time.sleep(2)
-            for module in modules:
-                module.stop()
-            time.sleep(2)
-            print("Simulation %d finished" % i)
-            current_path = os.path.join(self.output_folder, "iteration%d" % i)
-            print("Saving into folder: %s" % current_path)
-            os.mkdir(current_path)
-            for log_file in self.log_files:
-                shutil.move(log_file, current_path)
+        Returns:
+            list: The summaries of all runs.
+        """
+        os.makedirs(self.output_folder, exist_ok=True)
+        print("Running %d simulations with %d workers..."
+              % (self.num_runs, self.workers))
+        runs = [dict(file=self.file,
+                     index=i,
+                     output_folder=self.output_folder,
+                     seed=None if self.seed is None else self.seed + i,
+                     audio_output=self.audio_output,
+                     end_sim_event=self.end_sim_event,
+                     log_files=self.log_files,
+                     virtual_clock=self.virtual_clock,
+                     timeout=self.timeout)
+                for i in range(self.num_runs)]
+
+        start = time.time()
+        summaries = []
+        # Every simulation gets a fresh process, so that no state (threads,
+        # clock, random generators) is shared between runs.
+        context = multiprocessing.get_context("spawn")
+        with context.Pool(self.workers, maxtasksperchild=1) as pool:
+            for summary in pool.imap_unordered(_run_simulation, runs):
+                print("Simulation %d finished (%s)"
+                      % (summary["index"], summary["folder"]))
+                summaries.append(summary)
+        duration = time.time() - start
+        summaries.sort(key=lambda s: s["index"])
+
+        index = {
+            "file": self.file,
+            "num_runs": self.num_runs,
+            "workers": self.workers,
+            "virtual_clock": self.virtual_clock,
+            "duration": duration,
+            "dialogues_per_minute": self.num_runs / duration * 60,
+            "runs": summaries,
+        }
+        index_path = os.path.join(self.output_folder, "index.json")
+        with open(index_path, "w") as f:
+            json.dump(index, f, indent=2)
+        print("%.1f dialogues per minute, index saved to %s"
+              % (index["dialogues_per_minute"], index_path))
+        return summaries
 
 def parse_arguments():
     p = argparse.ArgumentParser(description='Automatically executes a '
@@ -81,6 +256,16 @@ def parse_arguments():
                             transcript.txt, acts.txt',
                    help='The log files that should be saved in the output \
                          folder')
+    p.add_argument('-j', '--workers', type=int, default=1,
+                   help='Number of simulations that run concurrently (only \
+                         one with audio output)')
+    p.add_argument('-s', '--seed', type=int, default=0,
+                   help='The seed of the first run (run i uses seed + i)')
+    p.add_argument('-v', '--virtual-clock', action="store_true",
+                   help='Run the simulations with a virtual clock as fast as \
+                         possible instead of in real time')
+    p.add_argument('-t', '--timeout', type=float, default=None,
+                   help='Maximum duration of a single run in seconds')
     return p.parse_args()
 
 
@@ -92,5 +277,9 @@ if __name__ == '__main__':
                             audio_output=arguments.audio_output,
                             end_sim_event=arguments.event,
                             output_folder=arguments.output_folder,
-                            log_files=log_files)
+                            log_files=log_files,
+                            workers=arguments.workers,
+                            seed=arguments.seed,
+                            virtual_clock=arguments.virtual_clock,
+                            timeout=arguments.timeout)
     ae.run_sims()
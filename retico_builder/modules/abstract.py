@@ -9,9 +9,21 @@ class AbstractModule(flx.PyComponent):
     PARAMETERS = {}
 
     def update_running_info(self):
+        info = self.metrics_info()
         latest_iu = self.retico_module.latest_iu()
         if latest_iu:
-            self.gui.update_info("Latest IU:<br>%s" % latest_iu)
+            info = "Latest IU:<br>%s<br>%s" % (latest_iu, info)
+        self.gui.update_info(info)
+
+    def metrics_info(self):
+        m = self.retico_module.metrics()
+        return "In: %.1f/s, out: %.1f/s<br>Queue: %d, dropped: %d<br>p95: %.1f ms" % (
+            m["in_per_second"],
+            m["out_per_second"],
+            m["queue_depth"],
+            m["dropped"],
+            m["processing"]["p95"] * 1000,
+        )
 
     def set_content(self):
         pass